@@ -1,86 +1,359 @@
 #!/usr/bin/env python3
 """
 映画詳細ページの構造を解析するスクリプト
+
+1ページを解析してタイトル・原題・製作年・公式サイト・メタデータの候補を表示します。
+--batch を指定すると、複数のURL・保存済みHTMLファイルを並行して取得・解析し、
+ページをまたいで安定して現れるセレクタと dt のラベルを集計して、抽出仕様の下書きを出力します
+（新しい映画館のスパイダーを作るときの調査用）。
+
+使い方:
+    python analyze_movie_detail.py [URL]
+    python analyze_movie_detail.py --batch URL|FILE.html|DIR|LIST.txt ... [--workers 8]
+        [--threshold 0.8] [-o spec.json]
 """
 
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import json
+import re
 import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import median
+
+import lxml.html
+import requests
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+DEFAULT_URL = "https://qualite.musashino-k.jp/movies/4695/"
+
+ORIGINAL_TITLE_KEYWORDS = ('原題', 'Original Title', 'English Title', '英題')
+OFFICIAL_KEYWORDS = ('公式', 'official', 'オフィシャル')
+ENGLISH_PATTERN = re.compile(r'^[A-Za-z\s\-\':,\.!?]+$')
+YEAR_PATTERN = re.compile(r'(19\d{2}|20\d{2})年')
+WHITESPACE = re.compile(r'\s+')
+
+# dt のラベルから推定する項目（ラベルに含まれる語）
+DT_FIELDS = {
+    'original_title': ('原題', '英題'),
+    'release_year': ('製作年', '制作年', '公開年'),
+    'official_website': ('公式',),
+    'showing_period': ('上映期間',),
+    'runtime': ('上映時間',),
+    'director': ('監督',),
+    'cast': ('出演', 'キャスト'),
+}
+
+# あらすじの候補とする要素のテキスト長と子孫要素数の上限
+SYNOPSIS_MIN_LENGTH = 80
+SYNOPSIS_MAX_LENGTH = 3000
+SYNOPSIS_MAX_DESCENDANTS = 30
+
+
+def _text(element):
+    return WHITESPACE.sub(' ', element.text_content()).strip()
+
+
+def _is_latin(text):
+    """ラテン文字（アクセント付きを含む）と記号だけの文字列か"""
+    return all(ord(char) < 0x250 or char.isspace() for char in text)
+
+
+def _selector(element):
+    """要素のCSSセレクタ（タグ名と最初のクラス、クラスが無ければタグ名）"""
+    classes = (element.get('class') or '').split()
+    return f"{element.tag}.{classes[0]}" if classes else element.tag
+
+
+def parse_page(source, body):
+    """ページから解析に使う情報を抽出（本文のテキストは1回だけ取り出す）"""
+    root = lxml.html.fromstring(body)
+    page_text = root.text_content()
+
+    features = {
+        'source': source,
+        'h1': [_text(h1) for h1 in root.iter('h1')],
+        # 見出しの子要素 {セレクタ: テキスト}（タイトルと原題を分けて書いているサイトがある）
+        'h1_parts': {},
+        'h2': [text for text in (_text(h2) for h2 in root.iter('h2')) if len(text) < 100],
+        'original_title_hints': [],
+        'english_texts': [],
+        'years': [],
+        'official_links': [],
+        'external_links': [],
+        'meta': {},
+        'dt_labels': {},
+        # {セレクタ: [テキスト長, 子孫要素数]}（ページ内でテキストが最も長い要素）
+        'selectors': {},
+    }
+
+    for element in root.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            # コメント・処理命令
+            continue
+        text = None
+        if tag in ('p', 'div', 'span'):
+            text = _text(element)
+            if 10 < len(text) < 100 and ENGLISH_PATTERN.match(text):
+                features['english_texts'].append(text)
+        if tag == 'dt':
+            label = _text(element)
+            dd = element.getnext()
+            if label and dd is not None and dd.tag == 'dd':
+                features['dt_labels'].setdefault(label, _text(dd))
+        elif tag == 'a' and element.get('href'):
+            link_text = _text(element)
+            href = element.get('href')
+            if any(keyword in link_text.lower() for keyword in OFFICIAL_KEYWORDS):
+                features['official_links'].append((link_text, href))
+            elif ('official' in href or 'movie' in href) and not href.startswith('/'):
+                features['external_links'].append((link_text, href))
+        elif tag == 'meta':
+            name = element.get('property') or element.get('name')
+            content = element.get('content', '')
+            if name and content and len(content) < 200:
+                features['meta'][name] = content
+
+        if tag not in ('html', 'body', 'head', 'script', 'style'):
+            selector = _selector(element)
+            text = text if text is not None else _text(element)
+            shape = features['selectors'].get(selector)
+            if text and (shape is None or len(text) > shape[0]):
+                features['selectors'][selector] = [len(text), sum(1 for _ in element.iterdescendants())]
+
+        if element.text and any(keyword in element.text for keyword in ORIGINAL_TITLE_KEYWORDS):
+            features['original_title_hints'].append(_text(element)[:200])
+
+    for h1 in root.iter('h1'):
+        for child in h1.iterchildren():
+            if isinstance(child.tag, str) and _text(child):
+                features['h1_parts'].setdefault(f"h1 {_selector(child)}", _text(child))
+
+    for match in YEAR_PATTERN.finditer(page_text):
+        context = page_text[max(0, match.start() - 20):match.end() + 20]
+        features['years'].append((int(match.group(1)), WHITESPACE.sub(' ', context).strip()))
+    return features
+
+
+def print_report(features):
+    """1ページの解析結果を表示"""
+    print("=== タイトル情報 ===")
+    for text in features['h1']:
+        print(f"h1: {text}")
+    for text in features['h2']:
+        print(f"h2: {text}")
+
+    print("\n=== 原題の可能性がある要素 ===")
+    for text in features['original_title_hints']:
+        print(f"原題付近: {text}")
+    for text in features['english_texts']:
+        print(f"英語テキスト: {text}")
+
+    print("\n=== 製作年情報 ===")
+    for _, context in features['years']:
+        print(f"年情報: ...{context}...")
+
+    print("\n=== 公式サイトリンク ===")
+    for text, href in features['official_links']:
+        print(f"リンクテキスト: {text}")
+        print(f"URL: {href}")
+    for text, href in features['external_links']:
+        print(f"外部リンク: {href} (テキスト: {text})")
+
+    print("\n=== dt のラベル ===")
+    for label, value in features['dt_labels'].items():
+        print(f"{label}: {value[:100]}")
+
+    print("\n=== メタデータ ===")
+    for name, content in features['meta'].items():
+        print(f"{name}: {content}")
+
+
+def expand_sources(sources):
+    """URL・HTMLファイル・ディレクトリ（*.html）・URL一覧のテキストファイルを展開"""
+    expanded = []
+    for source in sources:
+        path = Path(source)
+        if source.startswith(('http://', 'https://')):
+            expanded.append(source)
+        elif path.is_dir():
+            expanded.extend(str(p) for p in sorted(path.glob('*.html')))
+        elif path.suffix == '.txt':
+            expanded.extend(
+                line.strip() for line in path.read_text(encoding='utf-8').splitlines()
+                if line.strip() and not line.startswith('#')
+            )
+        else:
+            expanded.append(source)
+    return expanded
+
+
+def load_page(source, session, timeout=30):
+    """URLまたはファイルからHTMLを読み込んで解析"""
+    if source.startswith(('http://', 'https://')):
+        response = session.get(source, timeout=timeout)
+        response.raise_for_status()
+        body = response.content
+    else:
+        body = Path(source).read_bytes()
+    return parse_page(source, body)
+
+
+def load_pages(sources, workers=8):
+    """複数のページを並行して取得・解析し、(解析結果の一覧, 失敗の一覧) を返す"""
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def load(source):
+        try:
+            return load_page(source, session), None
+        except Exception as e:
+            return None, (source, f"{type(e).__name__}: {e}")
+
+    pages, failures = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for features, failure in executor.map(load, sources):
+            if failure:
+                failures.append(failure)
+            else:
+                pages.append(features)
+    return pages, failures
+
+
+def _field_from_labels(label_coverage, samples_by_label, keywords):
+    """キーワードを含むdtのラベルのうち、最も多くのページに現れるもの"""
+    labels = [label for label in label_coverage if any(keyword in label for keyword in keywords)]
+    if not labels:
+        return None
+    label = max(labels, key=lambda name: label_coverage[name])
+    return {'dt_label': label, 'coverage': label_coverage[label], 'samples': samples_by_label[label][:3]}
+
+
+def build_spec(pages, threshold=0.8):
+    """ページをまたいで安定して現れるセレクタとdtのラベルから抽出仕様の下書きを作成"""
+    count = len(pages)
+    selector_pages = Counter()
+    selector_shapes = defaultdict(list)
+    label_pages = Counter()
+    label_samples = defaultdict(list)
+    for features in pages:
+        for selector, shape in features['selectors'].items():
+            selector_pages[selector] += 1
+            selector_shapes[selector].append(shape)
+        for label, value in features['dt_labels'].items():
+            label_pages[label] += 1
+            label_samples[label].append(value[:100])
+
+    selector_coverage = {selector: n / count for selector, n in selector_pages.most_common()}
+    label_coverage = {label: n / count for label, n in label_pages.most_common()}
+    stable_selectors = {selector: c for selector, c in selector_coverage.items() if c >= threshold}
+    stable_labels = {label: c for label, c in label_coverage.items() if c >= threshold}
+
+    part_pages = Counter()
+    part_samples = defaultdict(list)
+    for features in pages:
+        for selector, text in features['h1_parts'].items():
+            part_pages[selector] += 1
+            part_samples[selector].append(text)
+
+    fields = {}
+    titles = [features['h1'][0] for features in pages if features['h1']]
+    if titles:
+        fields['title'] = {'css': 'h1', 'coverage': len(titles) / count, 'samples': titles[:3]}
+    for selector, n in part_pages.most_common():
+        samples = part_samples[selector]
+        if n / count < threshold:
+            continue
+        # ラテン文字が中心の子要素は原題、それ以外はタイトル本体とみなす
+        latin = sum(1 for text in samples if _is_latin(text)) * 2 >= len(samples)
+        if latin:
+            fields.setdefault('original_title', {'css': selector, 'coverage': n / count, 'samples': samples[:3]})
+        elif fields.get('title', {}).get('css') == 'h1':
+            fields['title'] = {'css': selector, 'coverage': n / count, 'samples': samples[:3]}
+    for name, keywords in DT_FIELDS.items():
+        field = _field_from_labels(label_coverage, label_samples, keywords)
+        if field:
+            fields[name] = field
+
+    # あらすじ: 安定して現れ、十分な長さのテキストを持ち、子孫要素の少ない要素
+    synopsis_candidates = []
+    for selector in stable_selectors:
+        shapes = selector_shapes[selector]
+        length = median(shape[0] for shape in shapes)
+        descendants = median(shape[1] for shape in shapes)
+        if SYNOPSIS_MIN_LENGTH <= length <= SYNOPSIS_MAX_LENGTH and descendants <= SYNOPSIS_MAX_DESCENDANTS:
+            synopsis_candidates.append((stable_selectors[selector], -descendants, length, selector))
+    if synopsis_candidates:
+        coverage, _, length, selector = max(synopsis_candidates)
+        fields['synopsis'] = {'css': selector, 'coverage': coverage, 'median_length': length}
+
+    official = [href for features in pages for _, href in features['official_links']]
+    if official and 'official_website' in fields:
+        fields['official_website']['samples'] = official[:3]
+
+    return {
+        'pages': count,
+        'threshold': threshold,
+        'fields': fields,
+        'dt_labels': stable_labels,
+        'selectors': stable_selectors,
+    }
+
 
 def analyze_movie_detail(url):
     """映画詳細ページを解析して情報を抽出"""
     print(f"解析中: {url}\n")
-    
     try:
-        response = requests.get(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # タイトル情報を探す
-        print("=== タイトル情報 ===")
-        for h1 in soup.find_all('h1'):
-            print(f"h1: {h1.get_text(strip=True)}")
-        for h2 in soup.find_all('h2'):
-            text = h2.get_text(strip=True)
-            if len(text) < 100:  # 長すぎるテキストは除外
-                print(f"h2: {text}")
-        
-        # 原題を探す（英語タイトル）
-        print("\n=== 原題の可能性がある要素 ===")
-        # 一般的なパターン
-        for pattern in ['原題', 'Original Title', 'English Title', '英題']:
-            elements = soup.find_all(text=lambda t: pattern in str(t))
-            for elem in elements:
-                parent = elem.parent
-                if parent:
-                    print(f"{pattern}付近: {parent.get_text(strip=True)[:200]}")
-        
-        # 英語っぽいタイトルを探す
-        import re
-        english_pattern = re.compile(r'^[A-Za-z\s\-\':,\.!?]+$')
-        for elem in soup.find_all(['p', 'div', 'span']):
-            text = elem.get_text(strip=True)
-            if 10 < len(text) < 100 and english_pattern.match(text):
-                print(f"英語テキスト: {text}")
-        
-        # 製作年を探す
-        print("\n=== 製作年情報 ===")
-        year_pattern = re.compile(r'(19\d{2}|20\d{2})年')
-        for match in year_pattern.finditer(soup.get_text()):
-            context_start = max(0, match.start() - 20)
-            context_end = min(len(soup.get_text()), match.end() + 20)
-            context = soup.get_text()[context_start:context_end]
-            print(f"年情報: ...{context}...")
-        
-        # 公式サイトリンクを探す
-        print("\n=== 公式サイトリンク ===")
-        for a in soup.find_all('a', href=True):
-            text = a.get_text(strip=True).lower()
-            href = a['href']
-            if any(keyword in text for keyword in ['公式', 'official', 'オフィシャル']):
-                print(f"リンクテキスト: {a.get_text(strip=True)}")
-                print(f"URL: {href}")
-            elif 'official' in href or 'movie' in href:
-                if not href.startswith('/'):  # 内部リンクを除外
-                    print(f"外部リンク: {href} (テキスト: {a.get_text(strip=True)})")
-        
-        # メタデータを探す
-        print("\n=== メタデータ ===")
-        for meta in soup.find_all('meta'):
-            if meta.get('property') or meta.get('name'):
-                content = meta.get('content', '')
-                if content and len(content) < 200:
-                    print(f"{meta.get('property') or meta.get('name')}: {content}")
-        
+        session = requests.Session()
+        session.headers['User-Agent'] = USER_AGENT
+        print_report(load_page(url, session))
     except Exception as e:
         print(f"エラー: {e}")
 
+
+def run_batch(sources, workers, threshold, output):
+    sources = expand_sources(sources)
+    if not sources:
+        raise SystemExit("解析するページがありません")
+    started = time.perf_counter()
+    pages, failures = load_pages(sources, workers)
+    elapsed = time.perf_counter() - started
+    for source, error in failures:
+        print(f"✗ {source}: {error}", file=sys.stderr)
+    if not pages:
+        raise SystemExit("解析できたページがありません")
+
+    spec = build_spec(pages, threshold)
+    spec['failed'] = len(failures)
+    text = json.dumps(spec, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).write_text(text + '\n', encoding='utf-8')
+        print(f"抽出仕様の下書きを保存しました: {output}", file=sys.stderr)
+    else:
+        print(text)
+    print(f"{len(pages)}ページを{elapsed:.2f}秒で解析しました（失敗 {len(failures)}件）", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources', nargs='*', help='URL（--batch では HTMLファイル・ディレクトリ・URL一覧も可）')
+    parser.add_argument('--batch', action='store_true', help='複数ページを解析して抽出仕様の下書きを出力')
+    parser.add_argument('--workers', type=int, default=8, help='同時に取得・解析するページ数')
+    parser.add_argument('--threshold', type=float, default=0.8, help='安定して現れるとみなすページの割合')
+    parser.add_argument('-o', '--output', help='抽出仕様の下書きの保存先（省略時は標準出力）')
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(args.sources, args.workers, args.threshold, args.output)
+    else:
+        analyze_movie_detail(args.sources[0] if args.sources else DEFAULT_URL)
+
+
 if __name__ == "__main__":
-    # デフォルトURL（最新の映画詳細ページ）
-    default_url = "https://qualite.musashino-k.jp/movies/4695/"
-    
-    url = sys.argv[1] if len(sys.argv) > 1 else default_url
-    analyze_movie_detail(url)
\ No newline at end of file
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+映画詳細ページ抽出のマイクロベンチマーク
+
+fixtures/ の詳細ページHTMLを使い、従来のCSSセレクタによる抽出と
+extract_movie_detail（コンパイル済みXPathによる1回走査）の
+1秒あたりの処理ページ数を比較します。
+
+使い方:
+    python benchmarks/bench_detail_extractor.py [--seconds 3] [fixture.html ...]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトのパスを追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'theater_scraper'))
+
+from scrapy.http import HtmlResponse
+
+from theater_scraper.extractors import extract_movie_detail
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+DETAIL_URL = 'https://qualite.musashino-k.jp/movies/4695/'
+
+
+def legacy_extract(response):
+    """変更前の parse_movie_detail と同じセレクタで抽出（比較用）"""
+    title = response.css('h1 b::text').get()
+    if not title:
+        title = response.css('h1::text').get()
+
+    movie_info = {}
+    for dl in response.css('dl'):
+        dt_text = dl.css('dt b::text').get()
+        if not dt_text:
+            dt_text = dl.css('dt::text').get()
+
+        dd_text = dl.css('dd p::text').get()
+        if not dd_text:
+            dd_text = dl.css('dd::text').get()
+
+        if dt_text and dd_text:
+            movie_info[dt_text.strip()] = dd_text.strip()
+
+    official_website = None
+    if '公式HP' in movie_info:
+        official_link = response.xpath('//dt[contains(text(), "公式HP")]/following-sibling::dd//a/@href').get()
+        if official_link:
+            official_website = official_link
+
+    release_year = None
+    if '制作年／制作国' in movie_info:
+        year_match = re.search(r'(\d{4})年', movie_info['制作年／制作国'])
+        if year_match:
+            release_year = int(year_match.group(1))
+
+    synopsis_texts = []
+    for text_block in response.css('.module-text'):
+        if text_block.css('.text.is-meta'):
+            continue
+        for p in text_block.css('.text p'):
+            text = p.css('::text').get()
+            if text and text.strip():
+                if not any(keyword in text for keyword in ['上映期間:', '上映時間:', '©', '(C)']):
+                    synopsis_texts.append(text.strip())
+
+    synopsis = ' '.join(synopsis_texts)
+    if len(synopsis) > 200:
+        synopsis = synopsis[:200] + "..."
+
+    return {
+        'title': title,
+        'movie_info': movie_info,
+        'official_website': official_website,
+        'release_year': release_year,
+        'synopsis': synopsis,
+        'showing_period': movie_info.get('上映期間', ''),
+    }
+
+
+def optimized_extract(response):
+    return extract_movie_detail(response.selector.root)
+
+
+def measure(extract, bodies, seconds):
+    """指定秒数の間、レスポンス生成（HTMLパース込み）と抽出を繰り返す"""
+    pages = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for body in bodies:
+            extract(HtmlResponse(DETAIL_URL, body=body, encoding='utf-8'))
+            pages += 1
+    return pages / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fixtures', nargs='*', type=Path, help='詳細ページのHTMLファイル')
+    parser.add_argument('--seconds', type=float, default=3.0, help='各実装の計測時間（秒）')
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(FIXTURES_DIR.glob('movie_detail*.html'))
+    bodies = [path.read_bytes() for path in paths]
+
+    # 両実装の抽出結果が一致することを確認してから計測する（スケジュール表は変更前の実装に無いため除く）
+    for path, body in zip(paths, bodies):
+        before = legacy_extract(HtmlResponse(DETAIL_URL, body=body, encoding='utf-8'))
+        after = optimized_extract(HtmlResponse(DETAIL_URL, body=body, encoding='utf-8'))
+        after = {key: value for key, value in after.items() if key in before}
+        if before != after:
+            print(f"✗ 抽出結果が一致しません: {path}")
+            print(f"  before: {before}")
+            print(f"  after:  {after}")
+            sys.exit(1)
+
+    print(f"fixtures: {', '.join(path.name for path in paths)}")
+    legacy_rate = measure(legacy_extract, bodies, args.seconds)
+    print(f"before (CSS selectors):    {legacy_rate:10.1f} pages/sec")
+    optimized_rate = measure(optimized_extract, bodies, args.seconds)
+    print(f"after  (single-pass lxml): {optimized_rate:10.1f} pages/sec")
+    print(f"speedup: {optimized_rate / legacy_rate:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
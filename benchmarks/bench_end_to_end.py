@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+オフラインのエンドツーエンドベンチマーク
+
+fixtures/ の映画館トップページと詳細ページHTMLから作品数Nの合成アーカイブを作り、
+ARCHIVE_REPLAY でネットワークへ出ずに cinema_qualite スパイダーと全パイプラインを実行します。
+TMDb APIはローカルのモックサーバー（遅延・429を注入可能）、DynamoDBはインメモリ実装に
+置き換えるため、TMDbトークンやDynamoDB Localは不要です（-s DYNAMODB_ENDPOINT=sqlite:<パス> で
+組み込みSQLiteに保存することもできます）。--posters を指定すると
+ポスター画像の保存（PosterPipeline）もローカルの画像サーバーに対して実行します。
+
+作品数ごとに別プロセスで実行し、次の値を表示します。
+
+- items/sec: スクレイピングしたアイテム数 / クロール時間
+- p50 / p99: 詳細ページのレスポンス受信からアイテムが全パイプラインを通過するまでの時間
+- peak RSS: クロールしたプロセスの最大常駐メモリ
+
+使い方:
+    python benchmarks/bench_end_to_end.py [--sizes 10 100 1000 10000]
+        [--tmdb-latency 0.005] [--rate-limit-every 50] [-o results.json]
+        [--cassette tmdb.cassette.jsonl.gz --cassette-mode record|replay] [--posters]
+        [-s CHANGE_LOG_ENABLED=True ...]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent / 'theater_scraper'
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+SPIDER_NAME = 'cinema_qualite'
+SITE_URL = 'https://qualite.musashino-k.jp/'
+BENCHMARK_TOKEN = 'benchmark'
+
+
+def percentile(values, percent):
+    """最近傍順位法によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_bytes():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def build_listing_page(count):
+    """トップページのフィクスチャの作品リンクを count 件に増やしたHTML"""
+    import lxml.html
+
+    doc = lxml.html.fromstring((FIXTURES_DIR / 'theater_top.html').read_bytes())
+    entries = doc.xpath('//ul[contains(@class, "list-movies")]/li')
+    template = entries[0]
+    container = template.getparent()
+    for entry in entries:
+        container.remove(entry)
+    for index in range(count):
+        entry = deepcopy(template)
+        entry.find('a').set('href', f"/movies/{index + 1}/")
+        entry.find_class('title')[0].text = f"作品{index + 1}"
+        container.append(entry)
+    return lxml.html.tostring(doc, encoding='utf-8', doctype='<!DOCTYPE html>')
+
+
+def build_detail_page(template, title):
+    """詳細ページのフィクスチャのタイトルを差し替えたHTML"""
+    import lxml.html
+
+    doc = lxml.html.fromstring(template)
+    heading = doc.find('.//h1')
+    target = heading.find('b') if heading.find('b') is not None else heading
+    target.text = title
+    return lxml.html.tostring(doc, encoding='utf-8', doctype='<!DOCTYPE html>')
+
+
+def build_archive(path, count):
+    """作品数 count の合成アーカイブを作成（詳細ページは各フィクスチャを順に使う）"""
+    from theater_scraper.archive import ArchiveWriter
+
+    templates = [p.read_bytes() for p in sorted(FIXTURES_DIR.glob('movie_detail*.html'))]
+    headers = {'Content-Type': 'text/html; charset=UTF-8'}
+    writer = ArchiveWriter(path)
+    try:
+        writer.write(SITE_URL, build_listing_page(count), headers=headers, kind='listing', spider=SPIDER_NAME)
+        for index in range(count):
+            body = build_detail_page(templates[index % len(templates)], f"ベンチマーク作品{index + 1}")
+            writer.write(f"{SITE_URL}movies/{index + 1}/", body, headers=headers, kind='detail', spider=SPIDER_NAME)
+    finally:
+        writer.close()
+
+
+class ItemLatencyRecorder:
+    """レスポンス受信からアイテムが全パイプラインを通過するまでの時間を記録する拡張機能"""
+
+    def __init__(self):
+        self.received = {}
+        self.latencies = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy import signals
+
+        ext = cls()
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        return ext
+
+    def response_received(self, response, request, spider):
+        self.received[response.url] = time.perf_counter()
+
+    def item_scraped(self, item, response, spider):
+        started = self.received.pop(response.url, None)
+        if started is not None:
+            self.latencies.append(time.perf_counter() - started)
+
+
+def count_items(table):
+    count = 0
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        count += response['Count']
+        if 'LastEvaluatedKey' not in response:
+            return count
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def run_single(args):
+    """子プロセス: 作品数 args.run のクロールを1回実行して結果をJSONで出力"""
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ['SCRAPY_SETTINGS_MODULE'] = 'theater_scraper.settings'
+    os.environ['TMDB_ACCESS_TOKEN'] = BENCHMARK_TOKEN
+    os.environ['TMDB_API_BASE_URL'] = args.tmdb_url
+    if args.cassette:
+        os.environ['TMDB_CASSETTE'] = str(args.cassette)
+        os.environ['TMDB_CASSETTE_MODE'] = args.cassette_mode
+        os.environ['TMDB_CASSETTE_LATENCY'] = str(args.tmdb_latency if args.cassette_mode == 'replay' else 0)
+
+    import logging
+
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from stand_ins import InMemoryDynamoDB
+    from theater_scraper import resources
+    from theater_scraper.commands.reparse import OFFLINE_SETTINGS
+    from theater_scraper.storage import is_sqlite_endpoint
+
+    # TMDb APIの詳細ログ（ファイル出力）は計測対象から外す
+    logging.getLogger('tmdb_api').setLevel(args.tmdb_log_level)
+
+    with tempfile.TemporaryDirectory(prefix='bench-e2e-') as tmp:
+        archive_path = Path(tmp) / f"{SPIDER_NAME}.arc"
+        build_archive(archive_path, args.run)
+
+        settings = get_project_settings()
+        settings.setdict(OFFLINE_SETTINGS, priority='cmdline')
+        settings.setdict({
+            # FilmTable・ShowingTable・ShowtimeTableへの保存とTMDb詳細情報の取得も計測する（-s で変更可）
+            'MOVIE_STORAGE': 'canonical',
+            # TMDbはモックサーバーまたはカセットに向けている
+            'TMDB_ENABLED': True,
+            'SHOWTIMES_ENABLED': True,
+            'ARCHIVE_REPLAY': str(archive_path),
+            'LOG_LEVEL': args.log_level,
+            'TELNETCONSOLE_ENABLED': False,
+        }, priority='cmdline')
+        settings.setdict(dict(value.split('=', 1) for value in args.set), priority='cmdline')
+        poster_store = Path(tmp) / 'posters'
+        if args.image_url:
+            settings.setdict({
+                'POSTERS_ENABLED': True,
+                'POSTER_STORE': str(poster_store),
+                'POSTER_BASE_URL': args.image_url,
+            }, priority='cmdline')
+        extensions = dict(settings.getdict('EXTENSIONS'))
+        extensions[ItemLatencyRecorder] = 0
+        settings.set('EXTENSIONS', extensions, priority='cmdline')
+
+        # -s DYNAMODB_ENDPOINT=sqlite:<パス> の場合は組み込みSQLiteに保存する
+        endpoint = settings.get('DYNAMODB_ENDPOINT')
+        if not is_sqlite_endpoint(endpoint):
+            resources.set_dynamodb_resource(endpoint, InMemoryDynamoDB(latency=args.dynamodb_latency))
+        dynamodb = resources.get_dynamodb_resource(endpoint)
+        # モックに対してはクライアント側の間隔調整を行わない（--tmdb-delayで変更可）
+        resources.get_tmdb_client(BENCHMARK_TOKEN).request_delay = args.tmdb_delay
+
+        process = CrawlerProcess(settings, install_root_handler=args.log_level != 'CRITICAL')
+        crawler = process.create_crawler(SPIDER_NAME)
+        process.crawl(crawler)
+        started = time.perf_counter()
+        process.start()
+        elapsed = time.perf_counter() - started
+        poster_files = sum(1 for path in poster_store.rglob('*') if path.is_file()) if args.image_url else 0
+
+    recorder = next(
+        ext for ext in crawler.extensions.middlewares if isinstance(ext, ItemLatencyRecorder)
+    )
+    stats = crawler.stats.get_stats()
+    items = stats.get('item_scraped_count', 0)
+    result = {
+        'films': args.run,
+        'items': items,
+        'elapsed_seconds': elapsed,
+        'items_per_second': items / elapsed if elapsed > 0 else 0.0,
+        'p50_seconds': percentile(recorder.latencies, 50),
+        'p99_seconds': percentile(recorder.latencies, 99),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'tmdb_requests': stats.get('tmdb/requests', 0),
+        'tmdb_retries': stats.get('tmdb/retries', 0),
+        'tmdb_details_requests': stats.get('tmdb/details_requests', 0),
+        'tmdb_cassette_misses': stats.get('tmdb/cassette_misses', 0),
+        'posters_downloaded': stats.get('posters/downloaded', 0),
+        'posters_deduplicated': stats.get('posters/deduplicated', 0),
+        'posters_failed': stats.get('posters/failed', 0),
+        'poster_files': poster_files,
+        'dynamodb_writes': stats.get('dynamodb/writes', 0),
+        'early_filter_items': stats.get('early_filter/items_avoided', 0),
+        'early_filter_requests': stats.get('early_filter/duplicate_requests', 0),
+        'stored_films': count_items(dynamodb.Table('FilmTable')),
+        'stored_showings': count_items(dynamodb.Table('ShowingTable')),
+        'errors': stats.get('log_count/ERROR', 0),
+    }
+    print(json.dumps(result))
+
+
+def run_benchmark(size, args, tmdb_url, image_url=None):
+    """作品数 size のクロールを別プロセスで実行し、結果を返す"""
+    command = [
+        sys.executable, __file__, '--run', str(size),
+        '--tmdb-url', tmdb_url,
+        '--tmdb-delay', str(args.tmdb_delay),
+        '--dynamodb-latency', str(args.dynamodb_latency),
+        '--log-level', args.log_level,
+        '--tmdb-log-level', args.tmdb_log_level,
+    ]
+    if args.cassette:
+        command += ['--cassette', str(args.cassette), '--cassette-mode', args.cassette_mode]
+    if image_url:
+        command += ['--image-url', image_url]
+    for value in args.set:
+        command += ['--set', value]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise SystemExit(f"✗ ベンチマークが失敗しました (films={size})")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:8.2f}" if seconds is not None else f"{'-':>8}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES), help='作品数（複数指定可）')
+    parser.add_argument('--tmdb-latency', type=float, default=0.0, help='モックTMDbの応答遅延（秒）')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='モックTMDbがN件ごとに429を返す（0で無効）')
+    parser.add_argument('--retry-after', type=int, default=0, help='429応答のRetry-After（秒）')
+    parser.add_argument('--tmdb-delay', type=float, default=0.0, help='TMDbClientのリクエスト間隔（秒）')
+    parser.add_argument('--dynamodb-latency', type=float, default=0.0, help='インメモリDynamoDBの書き込み遅延（秒）')
+    parser.add_argument('--log-level', default='CRITICAL', help='ScrapyのLOG_LEVEL')
+    parser.add_argument('--tmdb-log-level', default='WARNING', help='tmdb_apiロガーのレベル')
+    parser.add_argument('--cassette', type=Path, help='TMDbカセット（record: モックへの通信を記録、replay: カセットから応答）')
+    parser.add_argument('--cassette-mode', choices=('record', 'replay'), default='replay', help='カセットのモード')
+    parser.add_argument('--posters', action='store_true', help='ローカルの画像サーバーに対してポスター画像も保存する')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='Scrapyの設定を上書き（複数指定可）')
+    parser.add_argument('-o', '--output', type=Path, help='結果をJSONファイルに保存（リリース間の比較用）')
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--tmdb-url', help=argparse.SUPPRESS)
+    parser.add_argument('--image-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        run_single(args)
+        return
+
+    from stand_ins import LocalImageHost, MockTMDbServer
+
+    server = MockTMDbServer(
+        latency=args.tmdb_latency,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+    ).start()
+    print(f"mock TMDb: {server.base_url} (latency={args.tmdb_latency}s, 429 every={args.rate_limit_every or '-'})")
+    image_host = LocalImageHost(latency=args.tmdb_latency).start() if args.posters else None
+    if image_host:
+        print(f"image host: {image_host.base_url}")
+    print(f"{'films':>7} {'items':>7} {'elapsed s':>10} {'items/sec':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'peak RSS MB':>12} {'tmdb req':>9} {'retries':>8}")
+
+    results = []
+    try:
+        for size in args.sizes:
+            result = run_benchmark(size, args, server.base_url, image_host.base_url if image_host else None)
+            results.append(result)
+            print(f"{result['films']:>7} {result['items']:>7} {result['elapsed_seconds']:>10.2f} "
+                  f"{result['items_per_second']:>10.1f} {_ms(result['p50_seconds'])} {_ms(result['p99_seconds'])} "
+                  f"{result['peak_rss_bytes'] / 1024 / 1024:>12.1f} {result['tmdb_requests']:>9} "
+                  f"{result['tmdb_retries']:>8}")
+            if result['tmdb_cassette_misses']:
+                print(f"  ⚠ カセットに無いTMDbリクエスト {result['tmdb_cassette_misses']}件")
+            if args.posters:
+                print(f"  ポスター: ダウンロード {result['posters_downloaded']}件 / 重複 {result['posters_deduplicated']}件 / "
+                      f"失敗 {result['posters_failed']}件 / 保存ファイル {result['poster_files']}件")
+            if result['early_filter_items'] or result['early_filter_requests']:
+                print(f"  早期に破棄: アイテム {result['early_filter_items']}件 / "
+                      f"詳細ページのリクエスト {result['early_filter_requests']}件")
+            if result['errors']:
+                print(f"  ⚠ エラーログ {result['errors']}件")
+    finally:
+        server.stop()
+        if image_host:
+            image_host.stop()
+
+    if args.output:
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': {
+                'tmdb_latency': args.tmdb_latency,
+                'rate_limit_every': args.rate_limit_every,
+                'retry_after': args.retry_after,
+                'tmdb_delay': args.tmdb_delay,
+                'dynamodb_latency': args.dynamodb_latency,
+                'cassette': str(args.cassette) if args.cassette else None,
+                'cassette_mode': args.cassette_mode if args.cassette else None,
+                'posters': args.posters,
+                'settings': args.set,
+            },
+            'results': results,
+        }
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+静的JSONフィード書き出しのベンチマーク
+
+インメモリDynamoDBに映画館数 × 作品数の上映を登録し、FeedExportPipelineの書き出しを
+次の3通りで計測します。
+
+- cold: フィードが無い状態から全シャードを書き出す
+- unchanged: 全映画館を再クロールしたが内容が変わっていない（書き換え0件）
+- one changed: 1つの映画館の作品が1件変わった（その映画館と全作品の一覧だけを書き換え）
+
+使い方:
+    python benchmarks/bench_feeds.py [--theaters 50] [--films 200]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# プロジェクトのパスを追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'theater_scraper'))
+
+from stand_ins import InMemoryDynamoDB
+from theater_scraper import feeds
+from theater_scraper.films import film_id_for
+from theater_scraper.pipelines import FeedExportPipeline
+
+
+def populate(dynamodb, theaters, films):
+    """映画館ごとに films 件の上映を登録（作品の半分は全映画館で共通）"""
+    now = datetime.now().isoformat()
+    details = json.dumps({'runtime': 120, 'genres': ['ドラマ'], 'directors': ['Director']}, ensure_ascii=False)
+    for t in range(theaters):
+        theater_id = f"theater_{t:03d}"
+        dynamodb.Table('TheaterTable').put_item(Item={
+            'theater_id': theater_id, 'name': f"映画館{t}", 'official_url': f"https://example.com/{t}/",
+        })
+        for f in range(films):
+            tmdb_id = f + 1 if f % 2 == 0 else 100_000 * (t + 1) + f
+            film_id = film_id_for(tmdb_id)
+            dynamodb.Table('FilmTable').put_item(Item={
+                'film_id': film_id, 'title': f"作品{tmdb_id}", 'tmdb_id': tmdb_id,
+                'synopsis': 'あらすじ' * 40, 'tmdb_poster_path': f"/{tmdb_id}.jpg", 'tmdb_details': details,
+                'updated_at': now,
+            })
+            dynamodb.Table('ShowingTable').put_item(Item={
+                'detail_url': f"https://example.com/{t}/movies/{f}/", 'film_id': film_id,
+                'theater_id': theater_id, 'tmdb_id': tmdb_id, 'updated_at': now,
+            })
+
+
+def export(pipeline, dynamodb, theater_ids):
+    pipeline.theater_ids = set(theater_ids)
+    started = time.perf_counter()
+    writer = pipeline._export(dynamodb)
+    return time.perf_counter() - started, writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--theaters', type=int, default=50, help='映画館数')
+    parser.add_argument('--films', type=int, default=200, help='映画館あたりの上映数')
+    args = parser.parse_args()
+
+    dynamodb = InMemoryDynamoDB()
+    populate(dynamodb, args.theaters, args.films)
+    theater_ids = [f"theater_{t:03d}" for t in range(args.theaters)]
+    print(f"映画館 {args.theaters}件 × 上映 {args.films}件 "
+          f"(JSON: {'orjson' if feeds.orjson else 'json'}, brotli: {'あり' if feeds.brotli else 'なし'})")
+
+    with tempfile.TemporaryDirectory(prefix='bench-feeds-') as tmp:
+        pipeline = FeedExportPipeline(feed_dir=tmp, movie_storage='canonical', max_age=0)
+        results = [('cold', *export(pipeline, dynamodb, theater_ids))]
+        results.append(('unchanged', *export(pipeline, dynamodb, theater_ids)))
+
+        # 1つの映画館だけで上映している作品を1件変更して、その映画館だけを再クロールした場合
+        film_table = dynamodb.Table('FilmTable')
+        changed = film_table.get_item(Key={'film_id': film_id_for(100_000 + 1)})['Item']
+        film_table.put_item(Item={**changed, 'synopsis': '変更後のあらすじ'})
+        results.append(('one changed', *export(pipeline, dynamodb, theater_ids[:1])))
+
+        total_bytes = sum(path.stat().st_size for path in Path(tmp).rglob('*.json'))
+        print(f"{'run':>12} {'seconds':>9} {'written':>8} {'unchanged':>10} {'MB written':>11}")
+        for name, elapsed, writer in results:
+            print(f"{name:>12} {elapsed:>9.3f} {len(writer.written):>8} {len(writer.unchanged):>10} "
+                  f"{writer.bytes_written / 1024 / 1024:>11.2f}")
+        print(f"フィード合計（非圧縮）: {total_bytes / 1024 / 1024:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
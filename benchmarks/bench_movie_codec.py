@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+MovieTableの保存形式（MOVIE_CODEC）のベンチマーク
+
+DynamoDBPipelineと同じ属性を持つMovieTableのレコードを合成し、保存形式ごとに
+次の値を表示します。
+
+- bytes/item: DynamoDBのアイテムサイズ（属性名＋値）の平均。theater_id-indexは全属性を
+  射影するため、GSIへの書き込み量も同じだけ変わる
+- WCU/item・RCU/item: 1件ずつ書き込み（1KB単位）・強い整合性で読み込み（4KB単位）した場合の平均ユニット数
+- encode/decode µs: 1件あたりの変換時間
+
+あらすじは日本語の文の断片をランダムに組み合わせた --synopsis-min〜--synopsis-max 文字の文章です。
+保存済みのデータでの値は scrapy moviecodec migrate --dry-run で確認できます。
+
+使い方:
+    python benchmarks/bench_movie_codec.py [--items 5000] [--synopsis-min 120] [--synopsis-max 600]
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# プロジェクトのパスを追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'theater_scraper'))
+
+from theater_scraper import movie_codec
+from theater_scraper.movie_codec import decode_movie, encode_movie, item_size
+
+PHRASES = (
+    'パリ郊外の小さな町で暮らす少女は', '祖母の遺した古い日記を見つける', 'そこに記された秘密をたどる旅が始まる',
+    '戦争で離ればなれになった兄弟が', '三十年ぶりに故郷の港町へ戻ってくる', '失われた時間を取り戻そうとするが',
+    '若き映画監督は資金難に苦しみながら', '最後の撮影に挑む', '家族の誰にも言えない過去が明らかになるとき',
+    '雪深い山村に一人の教師が赴任する', '子どもたちとの交流を通して', '閉ざされていた心が少しずつ開いていく',
+    '実話をもとに', '国際映画祭で最高賞を受賞した', '監督の長編デビュー作', '4Kデジタルリマスター版で上映',
+    '音楽を担当するのは', '撮影はすべてフィルムで行われ', '主演俳優の繊細な演技が光る', '人生の意味を静かに問いかける',
+    'ある夜、見知らぬ男が店を訪れ', '古いレコードを一枚置いていった', '母と娘の三日間の旅路を描く',
+    '移民の青年が', '大都市の片隅で夢を追う', 'ユーモアと哀しみに満ちた', '傑作ドキュメンタリー',
+    '嵐の夜に起きた事件をきっかけに', '村人たちの関係が揺らぎはじめる', '美しい風景とともに綴られる',
+)
+
+
+def make_synopsis(rng, min_chars, max_chars):
+    target = rng.randint(min_chars, max_chars)
+    sentences = []
+    length = 0
+    while length < target:
+        sentence = '、'.join(rng.sample(PHRASES, rng.randint(2, 4))) + '。'
+        sentences.append(sentence)
+        length += len(sentence)
+    return ''.join(sentences)[:target]
+
+
+def make_records(count, min_chars, max_chars, seed=0):
+    """DynamoDBPipeline._save_movie_itemと同じ形のレコード"""
+    rng = random.Random(seed)
+    now = datetime(2025, 6, 20, 9, 0)
+    records = []
+    for index in range(count):
+        created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+        record = {
+            'detail_url': f"https://qualite.musashino-k.jp/movies/{4000 + index}/",
+            'theater_id': 'cinema_qualite',
+            'title': f"夏の日記 {index}",
+            'synopsis': make_synopsis(rng, min_chars, max_chars),
+            'created_at': created.isoformat(),
+            'updated_at': (created + timedelta(hours=rng.randint(0, 48))).isoformat(),
+        }
+        if rng.random() < 0.7:
+            record['original_title'] = f"Le journal d'été {index}"
+        if rng.random() < 0.6:
+            record['official_website'] = f"https://example.com/films/{index}/"
+        if rng.random() < 0.8:
+            tmdb_id = rng.randint(1, 1_300_000)
+            record['tmdb_id'] = tmdb_id
+            record['tmdb_poster_path'] = f"/{tmdb_id}abcdefghijklmnop.jpg"
+        records.append(record)
+    return records
+
+
+def summarize(records):
+    count = len(records)
+    sizes = [item_size(record) for record in records]
+    return {
+        'bytes': sum(sizes) / count,
+        'wcu': sum(max(1, math.ceil(size / 1024)) for size in sizes) / count,
+        'rcu': sum(max(1, math.ceil(size / 4096)) for size in sizes) / count,
+    }
+
+
+def per_item_us(func, records):
+    started = time.perf_counter()
+    results = [func(record) for record in records]
+    return (time.perf_counter() - started) / len(records) * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5000, help='レコード数')
+    parser.add_argument('--synopsis-min', type=int, default=120, help='あらすじの最小文字数')
+    parser.add_argument('--synopsis-max', type=int, default=600, help='あらすじの最大文字数')
+    args = parser.parse_args()
+
+    records = make_records(args.items, args.synopsis_min, args.synopsis_max)
+    compressions = ['zlib'] + (['zstd'] if movie_codec.zstandard is not None else [])
+
+    plain = summarize(records)
+    print(f"{args.items} records, synopsis {args.synopsis_min}-{args.synopsis_max} chars"
+          f" (zstandard: {'あり' if movie_codec.zstandard is not None else 'なし'})")
+    print(f"{'codec':<16} {'bytes/item':>11} {'vs plain':>9} {'WCU/item':>9} {'RCU/item':>9} "
+          f"{'encode µs':>10} {'decode µs':>10}")
+    print(f"{'plain':<16} {plain['bytes']:>11.1f} {'':>9} {plain['wcu']:>9.2f} {plain['rcu']:>9.2f} "
+          f"{'-':>10} {'-':>10}")
+
+    for compression in compressions:
+        encode_us, encoded = per_item_us(lambda record: encode_movie(record, compression), records)
+        decode_us, decoded = per_item_us(decode_movie, encoded)
+        # 日時は秒単位に丸めて保存するため、それ以外の属性が元に戻ることを確認する
+        for original, restored in zip(records, decoded):
+            assert {k: v for k, v in restored.items() if not k.endswith('_at')} == \
+                   {k: v for k, v in original.items() if not k.endswith('_at')}
+            assert restored['updated_at'] == original['updated_at'][:19]
+        compact = summarize(encoded)
+        print(f"{'compact/' + compression:<16} {compact['bytes']:>11.1f} "
+              f"{compact['bytes'] / plain['bytes']:>8.0%} {compact['wcu']:>9.2f} {compact['rcu']:>9.2f} "
+              f"{encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
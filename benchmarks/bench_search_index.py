@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+全文検索インデックスのベンチマーク
+
+タイトル・原題・あらすじを持つ合成の作品を documents 件作成してインデックスを作り、
+次の値を表示します。
+
+- 作成: 文書のbigram分割（docs.sqlite3への保存）と検索用インデックスの書き出し時間
+- 差分更新: 1%の作品のあらすじが変わった場合の更新時間
+- 検索: タイトルの一部・あらすじの語句・キーワード・1文字の検索の p50 / p99（目標 1ms 未満）
+
+語彙は出現頻度がZipf分布に従う合成の漢字語で、検索語も同じ分布から選びます。
+
+使い方:
+    python benchmarks/bench_search_index.py [--documents 20000] [--queries 2000]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトのパスを追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'theater_scraper'))
+
+from bench_end_to_end import percentile
+from theater_scraper.search_index import INDEX_FILE, SearchIndex, update_search_index
+
+TARGET_SECONDS = 0.001
+
+PARTICLES = ('の', 'が', 'を', 'に', 'と', 'で', 'は', 'から', 'まで', 'へ')
+ORIGINAL_TITLES = ('Summer Diary', 'Winter Traveler', 'Paris, Texas', 'Mission: Impossible', 'Seven Samurai')
+
+
+def build_vocabulary(rng, size):
+    """漢字2〜3文字の語彙（出現頻度は順位に反比例、Zipf分布）"""
+    words = {''.join(chr(0x4E00 + rng.randrange(3000)) for _ in range(rng.randint(2, 3))) for _ in range(size)}
+    words = sorted(words)
+    rng.shuffle(words)
+    return words, [1 / (rank + 1) for rank in range(len(words))]
+
+
+def build_documents(count, seed=0, vocabulary_size=5000):
+    """合成の作品（タイトルは語彙2〜3語、あらすじは20〜60語）と、検索に使う語彙・あらすじの語句"""
+    rng = random.Random(seed)
+    words, weights = build_vocabulary(rng, vocabulary_size)
+    documents = {}
+    phrases = []
+    for index in range(count):
+        title_words = rng.choices(words, weights, k=rng.randint(2, 3))
+        pieces = [word + rng.choice(PARTICLES) for word in rng.choices(words, weights, k=rng.randint(20, 60))]
+        synopsis = ''.join(pieces) + '物語。'
+        documents[f"https://example.com/theater_{index % 50}/movies/{index}/"] = {
+            'title': 'の'.join(title_words),
+            'original_title': rng.choice(ORIGINAL_TITLES) if index % 3 == 0 else None,
+            'synopsis': synopsis,
+        }
+        position = rng.randrange(len(pieces) - 1)
+        phrases.append(pieces[position] + pieces[position + 1])
+    return documents, (words, weights), phrases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=20000, help='作品数')
+    parser.add_argument('--queries', type=int, default=2000, help='種類ごとの検索回数')
+    args = parser.parse_args()
+
+    documents, (words, weights), phrases = build_documents(args.documents)
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory(prefix='bench-search-') as tmp:
+        started = time.perf_counter()
+        update_search_index(tmp, documents)
+        build_seconds = time.perf_counter() - started
+        size = (Path(tmp) / INDEX_FILE).stat().st_size
+
+        for detail_url in rng.sample(sorted(documents), max(1, args.documents // 100)):
+            documents[detail_url] = {**documents[detail_url], 'synopsis': '変更後のあらすじ。' + rng.choice(words)}
+        started = time.perf_counter()
+        changed, _ = update_search_index(tmp, documents)
+        update_seconds = time.perf_counter() - started
+
+        print(f"作品 {args.documents}件: 作成 {build_seconds:.2f}秒 / 差分更新（{changed}件）{update_seconds:.2f}秒 / "
+              f"search.idx {size / 1024 / 1024:.1f} MB")
+
+        titles = [fields['title'] for fields in documents.values()]
+        query_sets = (
+            ('タイトルの一部', [title[1:5] for title in rng.choices(titles, k=args.queries)]),
+            ('あらすじの語句', rng.choices(phrases, k=args.queries)),
+            ('キーワード', rng.choices(words, weights, k=args.queries)),
+            ('1文字', [word[0] for word in rng.choices(words, weights, k=args.queries)]),
+        )
+        failed = False
+        with SearchIndex(Path(tmp) / INDEX_FILE) as index:
+            print(f"  例: {titles[0][1:5]!r} -> {index.search(titles[0][1:5], 3)}")
+            print(f"{'':3}{'query':<14} {'p50 ms':>8} {'p99 ms':>8} {'hits':>8}")
+            for name, queries in query_sets:
+                latencies = []
+                hits = 0
+                for query in queries:
+                    started = time.perf_counter()
+                    hits += len(index.search(query))
+                    latencies.append(time.perf_counter() - started)
+                p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+                mark = '✓' if p50 < TARGET_SECONDS else '✗'
+                print(f"{mark:3}{name:<14} {p50 * 1000:>8.3f} {p99 * 1000:>8.3f} {hits / len(queries):>8.1f}")
+                failed |= name != '1文字' and p50 >= TARGET_SECONDS
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+起動時間のベンチマーク
+
+新しいPythonプロセスで次の段階までの時間を --runs 回ずつ計測し、中央値を表示します。
+
+- interpreter: Pythonの起動のみ
+- scrapy: Scrapy・Twistedの読み込み（プロジェクトに関係なく必要な部分）
+- project: settings.py に登録したパイプライン・ミドルウェア・拡張機能とスパイダーの読み込み
+- first use: DynamoDBリソースとTMDbクライアントの作成（最初に使うときに行う処理）
+
+project の段階は -X importtime の結果から、scrapy の段階で読み込み済みのモジュールを除いて
+パッケージごとに集計した内訳も表示します。--ref を指定すると、そのリビジョンのプロジェクト
+（git archive で取り出したもの）も同じ方法で計測して比較します。
+
+使い方:
+    python benchmarks/bench_startup.py [--runs 10] [--top 12] [--ref HEAD~1]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from statistics import median
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+PROJECT_DIR = REPO_DIR / 'theater_scraper'
+
+# クロールでは必ず読み込まれるScrapyのモジュール（responsetypes はダウンローダーが読み込む）
+SCRAPY_IMPORTS = 'import scrapy, scrapy.crawler, scrapy.spiders.crawl, scrapy.responsetypes, twisted.internet.reactor'
+# settings.py に登録したクラスとスパイダーを、クロールの開始時と同じく load_object で読み込む
+PROJECT_IMPORTS = '''
+from scrapy.utils.misc import load_object, walk_modules
+from theater_scraper import settings
+for name in ('ITEM_PIPELINES', 'SPIDER_MIDDLEWARES', 'DOWNLOADER_MIDDLEWARES', 'EXTENSIONS'):
+    for path in getattr(settings, name, {}):
+        load_object(path)
+for module in settings.SPIDER_MODULES:
+    walk_modules(module)
+'''
+FIRST_USE = '''
+from theater_scraper import resources
+resources.get_dynamodb_resource('http://localhost:8000')
+resources.get_tmdb_client('benchmark')
+'''
+
+STAGES = (
+    ('interpreter', 'pass'),
+    ('scrapy', SCRAPY_IMPORTS),
+    ('project', SCRAPY_IMPORTS + PROJECT_IMPORTS),
+    ('first use', SCRAPY_IMPORTS + PROJECT_IMPORTS + FIRST_USE),
+)
+
+
+def _environment(project_dir):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(project_dir), env.get('PYTHONPATH')]))
+    # TMDb APIのログファイルを作らない
+    env['TMDB_LOG_FILE'] = ''
+    return env
+
+
+def time_stage(code, project_dir, runs):
+    """新しいプロセスで code を実行するまでの時間（秒）の中央値"""
+    env = _environment(project_dir)
+    # 1回目はバイトコードの作成を含むため計測しない
+    subprocess.run([sys.executable, '-c', code], env=env, check=True, cwd=project_dir)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True, cwd=project_dir)
+        timings.append(time.perf_counter() - started)
+    return median(timings)
+
+
+def import_times(code, project_dir):
+    """-X importtime の結果 {モジュール: 自身の読み込み時間（マイクロ秒）}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=_environment(project_dir), cwd=project_dir, check=True, capture_output=True, text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def project_breakdown(project_dir):
+    """project の段階で読み込むモジュールのパッケージごとの時間（ミリ秒、大きい順）"""
+    before = import_times(SCRAPY_IMPORTS, project_dir)
+    after = import_times(SCRAPY_IMPORTS + PROJECT_IMPORTS, project_dir)
+    packages = defaultdict(int)
+    for name, self_us in after.items():
+        if name not in before:
+            package = name.split('.')[0]
+            if package == 'theater_scraper':
+                package = '.'.join(name.split('.')[:2])
+            packages[package] += self_us
+    return sorted(((us / 1000, package) for package, us in packages.items()), reverse=True)
+
+
+def measure(project_dir, runs, top):
+    timings = {name: time_stage(code, project_dir, runs) for name, code in STAGES}
+    previous = 0
+    print(f"{'stage':<14} {'total ms':>9} {'stage ms':>9}")
+    for name, _ in STAGES:
+        print(f"{name:<14} {timings[name] * 1000:>9.1f} {(timings[name] - previous) * 1000:>9.1f}")
+        previous = timings[name]
+
+    breakdown = project_breakdown(project_dir)
+    print(f"\nproject の内訳（-X importtime、合計 {sum(ms for ms, _ in breakdown):.1f} ms）")
+    for ms, package in breakdown[:top]:
+        print(f"  {ms:>7.1f} ms  {package}")
+    return timings
+
+
+def extract_revision(ref, directory):
+    """リビジョン ref の theater_scraper/ を directory に取り出し、プロジェクトのパスを返す"""
+    archive = subprocess.run(
+        ['git', 'archive', ref, 'theater_scraper'], cwd=REPO_DIR, check=True, capture_output=True,
+    ).stdout
+    subprocess.run(['tar', '-x', '-C', str(directory)], input=archive, check=True)
+    return Path(directory) / 'theater_scraper'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='段階ごとの計測回数')
+    parser.add_argument('--top', type=int, default=12, help='内訳に表示するパッケージ数')
+    parser.add_argument('--ref', help='比較するgitのリビジョン')
+    args = parser.parse_args()
+
+    print(f"== 作業ツリー ({PROJECT_DIR})")
+    current = measure(PROJECT_DIR, args.runs, args.top)
+    if not args.ref:
+        return
+
+    with tempfile.TemporaryDirectory(prefix='bench-startup-') as tmp:
+        print(f"\n== {args.ref}")
+        baseline = measure(extract_revision(args.ref, tmp), args.runs, args.top)
+
+    def project_ms(timings):
+        return (timings['project'] - timings['scrapy']) * 1000
+
+    print(f"\nproject の段階: {args.ref} {project_ms(baseline):.1f} ms -> 作業ツリー {project_ms(current):.1f} ms "
+          f"({project_ms(baseline) / max(project_ms(current), 0.1):.1f}倍)")
+
+
+if __name__ == '__main__':
+    main()
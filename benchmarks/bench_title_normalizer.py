@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+作品タイトル正規化のマイクロベンチマーク
+
+表記揺れ（全角半角、『』、副題、【字幕版】・4Kリマスターなど）を組み合わせた
+タイトルを生成し、キャッシュを使わない場合の title_key / search_variants の
+1秒あたりの処理件数を計測します。目標は 100,000 titles/sec 以上です。
+
+使い方:
+    python benchmarks/bench_title_normalizer.py [--seconds 3] [--titles 10000]
+"""
+
+import argparse
+import itertools
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトのパスを追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'theater_scraper'))
+
+from theater_scraper.titles import normalize_title, search_variants, title_key
+
+TARGET_RATE = 100_000
+
+BASE_TITLES = (
+    '夏の日記', '冬の旅人', 'パリ、テキサス', 'ミッション:インポッシブル', '劇場版『名探偵の休日』',
+    'ボヘミアン・ラプソディ', 'ＳＵＭＭＥＲ　ＤＩＡＲＹ', 'ｻﾏｰ ﾀﾞｲｱﾘｰ', '2001年宇宙の旅', 'ゴジラ-1.0',
+    'ショーシャンクの空に', '「桐島、部活やめるってよ」', 'THE FIRST SLAM DUNK', '七人の侍', '花様年華',
+)
+PREFIXES = ('', '【字幕版】', '【吹替版】', '[IMAX] ', 'IMAX ')
+SUFFIXES = ('', '（字幕版）', ' 4Kリマスター', ' ～4Kデジタルリマスター版～', ' ～ある夏の物語～', ' ― 特別編', ' 応援上映')
+
+
+def build_titles(count):
+    """表記揺れを組み合わせたタイトルを count 件生成（番号を付けて全件異なる文字列にする）"""
+    combinations = list(itertools.product(PREFIXES, BASE_TITLES, SUFFIXES))
+    titles = []
+    for index in range(count):
+        prefix, base, suffix = combinations[index % len(combinations)]
+        titles.append(f"{prefix}{base}{index // len(combinations) or ''}{suffix}")
+    return titles
+
+
+def measure(func, titles, seconds):
+    processed = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for title in titles:
+            func(title)
+        processed += len(titles)
+    return processed / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=3.0, help='各関数の計測時間（秒）')
+    parser.add_argument('--titles', type=int, default=10000, help='生成するタイトル数')
+    args = parser.parse_args()
+
+    titles = build_titles(args.titles)
+    for title in titles[:len(PREFIXES) * len(SUFFIXES):len(SUFFIXES) - 1]:
+        print(f"  {title!r:45} -> {title_key(title)!r}  {search_variants(title)}")
+
+    # lru_cacheを通さない関数本体を計測する
+    benchmarks = (
+        ('normalize_title', normalize_title),
+        ('title_key', title_key.__wrapped__),
+        ('search_variants', search_variants.__wrapped__),
+    )
+    failed = False
+    for name, func in benchmarks:
+        rate = measure(func, titles, args.seconds)
+        mark = '✓' if rate >= TARGET_RATE else '✗'
+        print(f"{mark} {name:16} {rate:12,.0f} titles/sec")
+        failed |= name == 'title_key' and rate < TARGET_RATE
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+"""
+ベンチマーク用の外部サービスの代替実装
+
+- MockTMDbServer: TMDb APIの検索・詳細エンドポイントを返すローカルHTTPサーバー
+  （応答遅延と429 Too Many Requestsを注入できる）
+- LocalImageHost: TMDbの画像サーバー（/t/p/<サイズ>/<ファイル名>）を模したローカルHTTPサーバー
+- InMemoryDynamoDB: DynamoDBPipelineとDetailPriorityMiddlewareが使う範囲の
+  boto3 DynamoDBリソース互換のインメモリ実装
+"""
+
+import json
+import math
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class MockTMDbServer:
+    """TMDb APIのモックサーバー
+
+    latency 秒だけ待ってから応答し、rate_limit_every 件ごとに
+    Retry-After付きの429を返す。検索結果はクエリ文字列から決まるIDを持つ1件。
+    """
+
+    def __init__(self, latency=0.0, rate_limit_every=0, retry_after=0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-tmdb', daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/3"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count_request(self):
+        """リクエスト数を数え、429を返すべきかどうかを判定"""
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return True
+        return False
+
+    @staticmethod
+    def movie_id(query):
+        return zlib.crc32(query.encode('utf-8')) % 1_000_000 + 1
+
+    def search_result(self, query, year=None):
+        movie_id = self.movie_id(query)
+        return {
+            'page': 1,
+            'total_results': 1,
+            'total_pages': 1,
+            'results': [{
+                'id': movie_id,
+                'title': query,
+                'original_title': query,
+                'release_date': f"{year or 2020}-01-01",
+                'poster_path': f"/{movie_id}.jpg",
+                'overview': '',
+            }],
+        }
+
+    def movie_details(self, movie_id, append_to_response=()):
+        details = {
+            'id': movie_id,
+            'title': f"Movie {movie_id}",
+            'original_title': f"Movie {movie_id}",
+            'poster_path': f"/{movie_id}.jpg",
+            'release_date': '2020-01-01',
+            'runtime': 120,
+            'vote_average': 7.2,
+            'genres': [{'id': 18, 'name': 'ドラマ'}],
+            'production_countries': [{'iso_3166_1': 'FR', 'name': 'France'}],
+        }
+        if 'credits' in append_to_response:
+            details['credits'] = {
+                'cast': [{'name': f"Actor {i}", 'character': f"Role {i}"} for i in range(20)],
+                'crew': [{'name': 'Director', 'job': 'Director'}, {'name': 'Writer', 'job': 'Screenplay'}],
+            }
+        if 'images' in append_to_response:
+            details['images'] = {
+                'posters': [{'file_path': f"/{movie_id}-{i}.jpg"} for i in range(8)],
+                'backdrops': [{'file_path': f"/{movie_id}-b{i}.jpg"} for i in range(8)],
+            }
+        return details
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # ヘッダーと本文をまとめて送る（Nagle＋遅延ACKによる40ms待ちを避ける）
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._count_request():
+                    self._send(429, {'status_code': 25, 'status_message': 'Too Many Requests'},
+                               {'Retry-After': str(server.retry_after)})
+                    return
+
+                url = urlsplit(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path == '/3/search/movie':
+                    year = params.get('year')
+                    self._send(200, server.search_result(params.get('query', ''), int(year) if year else None))
+                    return
+                match = re.fullmatch(r'/3/movie/(\d+)', url.path)
+                if match:
+                    append = params.get('append_to_response', '')
+                    self._send(200, server.movie_details(int(match.group(1)), append.split(',') if append else ()))
+                    return
+                self._send(404, {'status_code': 34, 'status_message': 'The resource could not be found.'})
+
+            def _send(self, status, data, headers=None):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@lru_cache(maxsize=256)
+def solid_png(width, height, color):
+    """単色のPNG画像"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    row = b'\x00' + bytes(color) * width
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(row * height))
+        + chunk(b'IEND', b'')
+    )
+
+
+class LocalImageHost:
+    """TMDbの画像サーバーの代替
+
+    /t/p/<サイズ>/<ファイル名> に対して、ファイル名から決まる色の単色PNG（縦横比2:3）を返す。
+    色は colors 種類しか無いため、別のファイル名でも内容が同じ画像になる（重複排除の確認用）。
+    """
+
+    def __init__(self, latency=0.0, colors=64, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.colors = colors
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='image-host', daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/t/p/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def image(self, size, name):
+        width = 780 if size == 'original' else int(size[1:])
+        shade = zlib.crc32(name.encode('utf-8')) % self.colors
+        return solid_png(width, width * 3 // 2, (shade * 4 % 256, 128, 255 - shade * 4 % 256))
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.requests += 1
+                match = re.fullmatch(r'/t/p/(original|w\d+)/([\w.-]+)', urlsplit(self.path).path)
+                if not match:
+                    self.send_error(404)
+                    return
+                body = server.image(*match.groups())
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+# テーブル名 -> (キー, {インデックス名: キー})
+# キーはパーティションキー、または (パーティションキー, ソートキー)
+DEFAULT_TABLES = {
+    'TheaterTable': ('theater_id', {}),
+    'MovieTable': ('detail_url', {'theater_id-index': 'theater_id'}),
+    'FilmTable': ('film_id', {}),
+    'ShowingTable': ('detail_url', {'film_id-index': 'film_id', 'theater_id-index': 'theater_id'}),
+    'ShowtimeTable': (('theater_id', 'start_key'), {'show_date-index': ('show_date', 'start_key')}),
+}
+
+_KEY_CONDITION = re.compile(
+    r'^\s*(\w+)\s*=\s*(:\w+)'
+    r'(?:\s+AND\s+(\w+)\s*(?:BETWEEN\s+(:\w+)\s+AND\s+(:\w+)|(=|<=|<|>=|>)\s*(:\w+)))?\s*$'
+)
+_COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _key_names(key):
+    return key if isinstance(key, tuple) else (key,)
+
+
+class InMemoryTable:
+    """boto3のTable互換（put_item / get_item / query / scan）のインメモリテーブル"""
+
+    def __init__(self, name, key, indexes=None, latency=0.0):
+        self.name = name
+        self.key = key
+        self.key_names = _key_names(key)
+        self.indexes = indexes or {}
+        self.latency = latency
+        self.items = {}
+        self.write_units = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _capacity_units(item):
+        """書き込みユニット（1KBごとに1）"""
+        # プロジェクトのパスはInMemoryDynamoDBを使う側で追加する（モックサーバーだけなら不要）
+        from theater_scraper.movie_codec import item_size
+        return max(1, math.ceil(item_size(item) / 1024))
+
+    def put_item(self, Item, ReturnConsumedCapacity='NONE', **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        item = dict(Item)
+        units = self._capacity_units(item)
+        with self._lock:
+            self.items[self._item_key(item)] = item
+            self.write_units += units
+        response = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if ReturnConsumedCapacity != 'NONE':
+            response['ConsumedCapacity'] = {'TableName': self.name, 'CapacityUnits': float(units)}
+        return response
+
+    def _item_key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def delete_item(self, Key, **kwargs):
+        with self._lock:
+            self.items.pop(self._item_key(Key), None)
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    @contextmanager
+    def batch_writer(self):
+        """batch_writer互換（put_item / delete_itemをそのまま実行する）"""
+        yield self
+
+    def get_item(self, Key, ProjectionExpression=None, **kwargs):
+        item = self.items.get(self._item_key(Key))
+        return {'Item': self._project([item], ProjectionExpression)[0]} if item is not None else {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              ProjectionExpression=None, **kwargs):
+        """パーティションキーの等価条件（"attr = :value"）と、ソートキーのBETWEEN・比較のみ対応"""
+        match = _KEY_CONDITION.match(KeyConditionExpression)
+        if match is None:
+            raise NotImplementedError(f"Unsupported KeyConditionExpression: {KeyConditionExpression}")
+        attribute, placeholder, sort_attribute, low, high, operator, operand = match.groups()
+        key_names = _key_names(self.indexes[IndexName] if IndexName else self.key)
+        if attribute != key_names[0]:
+            raise ValueError(f"{attribute} is not the partition key of {IndexName or self.name}")
+        if sort_attribute and sort_attribute not in key_names[1:]:
+            raise ValueError(f"{sort_attribute} is not the sort key of {IndexName or self.name}")
+        value = ExpressionAttributeValues[placeholder]
+        items = [item for item in self.items.values() if item.get(attribute) == value]
+        if sort_attribute:
+            if low:
+                low, high = ExpressionAttributeValues[low], ExpressionAttributeValues[high]
+                items = [item for item in items if low <= item[sort_attribute] <= high]
+            else:
+                compare, operand = _COMPARISONS[operator], ExpressionAttributeValues[operand]
+                items = [item for item in items if compare(item[sort_attribute], operand)]
+        if len(key_names) > 1:
+            items.sort(key=lambda item: item[key_names[1]])
+        return {'Items': self._project(items, ProjectionExpression), 'Count': len(items)}
+
+    def scan(self, ProjectionExpression=None, **kwargs):
+        items = list(self.items.values())
+        return {'Items': self._project(items, ProjectionExpression), 'Count': len(items)}
+
+    @staticmethod
+    def _project(items, projection):
+        if not projection:
+            return [dict(item) for item in items]
+        names = [name.strip() for name in projection.split(',')]
+        return [{name: item[name] for name in names if name in item} for item in items]
+
+
+class InMemoryDynamoDB:
+    """boto3のDynamoDBリソース互換（Tableのみ）"""
+
+    def __init__(self, tables=None, latency=0.0):
+        self.tables = {
+            name: InMemoryTable(name, key, indexes, latency=latency)
+            for name, (key, indexes) in (tables or DEFAULT_TABLES).items()
+        }
+
+    def Table(self, name):
+        return self.tables[name]
@@ -2,6 +2,7 @@
 """
 DynamoDB Local用テーブル作成スクリプト
 要件定義書に基づいてTheaterTableとMovieTableを作成
+作品単位のFilmTableと映画館ごとの上映を表すShowingTable、上映回のShowtimeTableも作成
 """
 
 import boto3
@@ -9,7 +10,7 @@ from botocore.exceptions import ClientError
 
 
 def create_dynamodb_tables():
-    """DynamoDB LocalにTheaterTableとMovieTableを作成"""
+    """DynamoDB LocalにTheaterTable・MovieTable・FilmTable・ShowingTable・ShowtimeTableを作成"""
 
     # DynamoDB Local接続設定
     dynamodb = boto3.resource(
@@ -94,6 +95,162 @@ def create_dynamodb_tables():
         else:
             print(f"MovieTable作成エラー: {e}")
 
+    # FilmTable作成 (作品ごとに1件、film_idをプライマリキーとして使用)
+    try:
+        film_table = dynamodb.create_table(
+            TableName='FilmTable',
+            KeySchema=[
+                {
+                    'AttributeName': 'film_id',
+                    'KeyType': 'HASH'  # Partition key
+                }
+            ],
+            AttributeDefinitions=[
+                {
+                    'AttributeName': 'film_id',
+                    'AttributeType': 'S'
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        print("FilmTable作成中...")
+        film_table.wait_until_exists()
+        print("FilmTable作成完了")
+
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceInUseException':
+            print("FilmTableは既に存在します")
+        else:
+            print(f"FilmTable作成エラー: {e}")
+
+    # ShowingTable作成 (映画館ごとの上映、detail_urlをプライマリキーとして使用)
+    try:
+        showing_table = dynamodb.create_table(
+            TableName='ShowingTable',
+            KeySchema=[
+                {
+                    'AttributeName': 'detail_url',
+                    'KeyType': 'HASH'  # Partition key
+                }
+            ],
+            AttributeDefinitions=[
+                {
+                    'AttributeName': 'detail_url',
+                    'AttributeType': 'S'
+                },
+                {
+                    'AttributeName': 'film_id',
+                    'AttributeType': 'S'
+                },
+                {
+                    'AttributeName': 'theater_id',
+                    'AttributeType': 'S'
+                }
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    # 作品を上映している映画館の一覧
+                    'IndexName': 'film_id-index',
+                    'KeySchema': [
+                        {
+                            'AttributeName': 'film_id',
+                            'KeyType': 'HASH'
+                        }
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'ALL'
+                    }
+                },
+                {
+                    # 映画館の上映作品の一覧
+                    'IndexName': 'theater_id-index',
+                    'KeySchema': [
+                        {
+                            'AttributeName': 'theater_id',
+                            'KeyType': 'HASH'
+                        }
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'ALL'
+                    }
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        print("ShowingTable作成中...")
+        showing_table.wait_until_exists()
+        print("ShowingTable作成完了")
+
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceInUseException':
+            print("ShowingTableは既に存在します")
+        else:
+            print(f"ShowingTable作成エラー: {e}")
+
+    # ShowtimeTable作成 (上映回、映画館ごとに開始日時の順で並べる)
+    try:
+        showtime_table = dynamodb.create_table(
+            TableName='ShowtimeTable',
+            KeySchema=[
+                {
+                    'AttributeName': 'theater_id',
+                    'KeyType': 'HASH'  # Partition key
+                },
+                {
+                    'AttributeName': 'start_key',
+                    'KeyType': 'RANGE'  # Sort key ('<開始日時>#<スクリーン>#<detail_url>')
+                }
+            ],
+            AttributeDefinitions=[
+                {
+                    'AttributeName': 'theater_id',
+                    'AttributeType': 'S'
+                },
+                {
+                    'AttributeName': 'start_key',
+                    'AttributeType': 'S'
+                },
+                {
+                    'AttributeName': 'show_date',
+                    'AttributeType': 'S'
+                }
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    # 全映画館の上映回を日付ごとに開始日時の順で引く
+                    'IndexName': 'show_date-index',
+                    'KeySchema': [
+                        {
+                            'AttributeName': 'show_date',
+                            'KeyType': 'HASH'
+                        },
+                        {
+                            'AttributeName': 'start_key',
+                            'KeyType': 'RANGE'
+                        }
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'ALL'
+                    }
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        print("ShowtimeTable作成中...")
+        showtime_table.wait_until_exists()
+        # 終了した上映回は expires_at を過ぎると自動的に削除する
+        showtime_table.meta.client.update_time_to_live(
+            TableName='ShowtimeTable',
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+        print("ShowtimeTable作成完了")
+
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceInUseException':
+            print("ShowtimeTableは既に存在します")
+        else:
+            print(f"ShowtimeTable作成エラー: {e}")
+
 
 def delete_table(table_name):
     """指定されたテーブルを削除"""
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+レスポンスアーカイブ（archive）とオフライン再処理（reparse）のテスト
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.settings import Settings
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper import resources
+from theater_scraper.archive import ArchiveIndex, ArchiveWriter, iter_records
+from theater_scraper.commands.reparse import OFFLINE_SETTINGS, replaying_tmdb_cassette
+from theater_scraper.pipelines import TMDbEnrichmentPipeline, TMDbPipeline
+
+URL = 'https://qualite.musashino-k.jp/movies/4000/'
+
+
+def _write(path, records):
+    writer = ArchiveWriter(path)
+    try:
+        for url, body, fetched_at in records:
+            writer.write(url, body, headers={'Content-Type': 'text/html'}, kind='detail',
+                         spider='cinema_qualite', fetched_at=fetched_at)
+    finally:
+        writer.close()
+    return writer
+
+
+def test_round_trip(tmp_path):
+    body = '<html>夏の日記</html>'.encode('utf-8') * 50
+    writer = _write(tmp_path / 'a.arc', [(URL, body, 100.0), ('https://qualite.musashino-k.jp/', b'top', 101.0)])
+    assert writer.records == 2
+    assert writer.stored_bytes == (tmp_path / 'a.arc').stat().st_size
+
+    records = list(iter_records(tmp_path / 'a.arc'))
+    assert [record.url for record in records] == [URL, 'https://qualite.musashino-k.jp/']
+    assert records[0].header['headers'] == {'Content-Type': 'text/html'}
+    assert records[0].read_body() == body
+    assert records[1].read_body() == b'top'
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    """書き込み途中で終了したファイルは、完全に書けたレコードまでを返す"""
+    path = tmp_path / 'a.arc'
+    first_size = _write(path, [(URL, b'first', 100.0)]).stored_bytes
+    _write(path, [(URL, b'second', 200.0)])
+    for cut in (first_size + 12, first_size + 3):  # ヘッダーの途中・フレームの途中
+        with open(path, 'r+b') as f:
+            f.truncate(cut)
+        records = list(iter_records(path))
+        assert len(records) == 1
+        assert records[0].read_body() == b'first'
+
+
+def test_index_picks_latest_until(tmp_path):
+    _write(tmp_path / 'day1.arc', [(URL, b'old', 100.0)])
+    _write(tmp_path / 'sub' / 'day2.arc', [(URL, b'new', 200.0)])
+
+    index = ArchiveIndex(tmp_path)
+    assert len(index) == 1
+    assert index.get(URL).read_body() == b'new'
+    assert index.spiders() == ['cinema_qualite']
+
+    assert ArchiveIndex(tmp_path, until=150.0).get(URL).read_body() == b'old'
+    assert ArchiveIndex(tmp_path).get('https://example.com/') is None
+
+
+def test_offline_settings_disable_tmdb():
+    """オフライン再処理ではTMDbのパイプラインを読み込まない"""
+    crawler = SimpleNamespace(settings=Settings({**OFFLINE_SETTINGS, 'MOVIE_STORAGE': 'canonical'}))
+    for pipeline in (TMDbPipeline, TMDbEnrichmentPipeline):
+        with pytest.raises(NotConfigured):
+            pipeline.from_crawler(crawler)
+
+
+def test_replaying_tmdb_cassette(monkeypatch):
+    monkeypatch.setattr(resources, '_env_loaded', True)
+    monkeypatch.delenv('TMDB_CASSETTE', raising=False)
+    monkeypatch.delenv('TMDB_CASSETTE_MODE', raising=False)
+    assert not replaying_tmdb_cassette()
+    monkeypatch.setenv('TMDB_CASSETTE', 'tmdb.cassette.jsonl.gz')
+    assert replaying_tmdb_cassette()
+    # 記録モードは実際のAPIへリクエストする
+    monkeypatch.setenv('TMDB_CASSETTE_MODE', 'record')
+    assert not replaying_tmdb_cassette()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+クロールごとの変更ログ（changes.ChangeLog）のテスト
+"""
+
+import json
+import os
+import sys
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.changes import ChangeLog
+from theater_scraper.shards import in_shard
+
+THEATER = 'cinema_qualite'
+URLS = [f"https://qualite.musashino-k.jp/movies/{4000 + index}/" for index in range(12)]
+
+
+def _crawl(directory, urls, titles=None, **kwargs):
+    """urls の上映を出力した1回のクロールを記録し、(件数, 変更ログの行) を返す"""
+    change_log = ChangeLog(directory, 'test', **kwargs)
+    try:
+        for url in urls:
+            title = (titles or {}).get(url, f"title {url}")
+            change_log.observe(THEATER, url, f"title:{url}", {'title': title, 'synopsis': None})
+        counts = change_log.commit()
+    finally:
+        change_log.close()
+    lines = []
+    if counts:
+        lines = [json.loads(line) for line in change_log.path.read_text(encoding='utf-8').splitlines()]
+    return counts, lines
+
+
+def test_added_modified_removed(tmp_path):
+    counts, lines = _crawl(tmp_path, URLS[:3])
+    assert counts == {'added': 3}
+    assert [line['seq'] for line in lines] == [1, 2, 3]
+    assert lines[0]['fields'] == {'title': f"title {URLS[0]}"}
+
+    counts, lines = _crawl(tmp_path, URLS[:2], titles={URLS[1]: 'renamed'})
+    assert counts == {'modified': 1, 'removed': 1}
+    assert {line['op']: line['detail_url'] for line in lines} == {'modified': URLS[1], 'removed': URLS[2]}
+    assert [line['seq'] for line in lines] == [4, 5]
+
+    counts, lines = _crawl(tmp_path, URLS[:2], titles={URLS[1]: 'renamed'})
+    assert counts == {} and lines == []
+
+
+def test_shards_only_remove_their_own_pages(tmp_path):
+    """シャードごとのクロールが他のシャードの上映を削除として記録しない"""
+    _crawl(tmp_path, URLS)
+    for shard_index in range(3):
+        shard_urls = [url for url in URLS if in_shard(url, shard_index, 3)]
+        counts, _ = _crawl(tmp_path, shard_urls, shard_index=shard_index, shard_count=3)
+        assert counts == {}
+
+    # シャード2の担当から1件なくなった場合は、その1件だけを削除とする
+    shard_urls = [url for url in URLS if in_shard(url, 2, 3)]
+    counts, lines = _crawl(tmp_path, shard_urls[1:], shard_index=2, shard_count=3)
+    assert counts == {'removed': 1}
+    assert lines[0]['detail_url'] == shard_urls[0]
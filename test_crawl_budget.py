@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+クロール予算と詳細ページの優先度（CrawlBudgetMiddleware / DetailPriorityMiddleware）のテスト
+"""
+
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import IgnoreRequest
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper import resources
+from theater_scraper.middlewares import CrawlBudgetMiddleware, DetailPriorityMiddleware
+from theater_scraper.movie_state import FRESH, MISSING_TMDB, STALE, UNSEEN, classify
+
+SPIDER = SimpleNamespace(name='cinema_qualite', theater_id='cinema_qualite', logger=logging.getLogger('test'))
+STALE_AFTER = 24 * 60 * 60
+
+
+class _Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+    def set_value(self, key, value):
+        self.values[key] = value
+
+
+def parse_movie_detail(response):
+    pass
+
+
+def _detail(url, **kwargs):
+    return Request(url, callback=parse_movie_detail, **kwargs)
+
+
+def test_classify():
+    now = datetime(2025, 6, 20, 12, 0)
+    recent = (now - timedelta(hours=1)).isoformat()
+    old = (now - timedelta(days=2)).isoformat()
+    assert classify(None, STALE_AFTER, now) == UNSEEN
+    assert classify({'tmdb_id': None, 'updated_at': recent}, STALE_AFTER, now) == MISSING_TMDB
+    assert classify({'tmdb_id': 1, 'updated_at': old}, STALE_AFTER, now) == STALE
+    assert classify({'tmdb_id': 1, 'updated_at': 'broken'}, STALE_AFTER, now) == STALE
+    assert classify({'tmdb_id': 1, 'updated_at': recent}, STALE_AFTER, now) == FRESH
+
+
+def test_detail_priority_order(tmp_path):
+    """未保存 > TMDb情報が無い > 古くなった > 最近更新した の順に優先度が高い"""
+    endpoint = f"sqlite:{tmp_path / 'theater.sqlite3'}"
+    now = datetime.now()
+    saved = {
+        'https://example.com/movies/fresh/': {'tmdb_id': 1, 'updated_at': now.isoformat()},
+        'https://example.com/movies/stale/': {'tmdb_id': 2, 'updated_at': (now - timedelta(days=2)).isoformat()},
+        'https://example.com/movies/no-tmdb/': {'updated_at': now.isoformat()},
+    }
+    try:
+        table = resources.get_dynamodb_resource(endpoint).Table('MovieTable')
+        for detail_url, attributes in saved.items():
+            table.put_item(Item={'detail_url': detail_url, 'theater_id': 'cinema_qualite', **attributes})
+
+        stats = _Stats()
+        middleware = DetailPriorityMiddleware(endpoint, STALE_AFTER, stats=stats, table_name='MovieTable')
+        urls = [*saved, 'https://example.com/movies/unseen/']
+        output = [_detail(url) for url in urls] + [Request('https://example.com/')]
+        result = list(middleware.process_spider_output(None, output, SPIDER))
+    finally:
+        resources.clear()
+
+    requests = {request.url: request for request in result}
+    ordered = sorted(urls, key=lambda url: -requests[url].priority)
+    assert [requests[url].meta['budget_class'] for url in ordered] == [UNSEEN, MISSING_TMDB, STALE, FRESH]
+    assert len({requests[url].priority for url in urls}) == 4
+    # 詳細ページ以外のリクエストはそのまま通す
+    assert requests['https://example.com/'].priority == 0
+    assert 'budget_class' not in requests['https://example.com/'].meta
+    assert stats.values['budget/scheduled/unseen'] == 1
+
+
+def test_crawl_budget_defers_detail_requests():
+    stats = _Stats()
+    middleware = CrawlBudgetMiddleware(request_budget=2, stats=stats)
+    middleware.spider_opened(SPIDER)
+    for index in range(2):
+        assert middleware.process_request(_detail(f"https://example.com/movies/{index}/"), SPIDER) is None
+    assert middleware.process_request(Request('https://example.com/'), SPIDER) is None
+    with pytest.raises(IgnoreRequest):
+        middleware.process_request(_detail('https://example.com/movies/9/'), SPIDER)
+    middleware.spider_closed(SPIDER)
+    assert stats.values['budget/exhausted'] == 'requests'
+    assert stats.values['budget/deferred_urls'] == ['https://example.com/movies/9/']
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+クロールデーモンのスケジュールとヘルス情報のテスト
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.daemon import CrawlDaemon, CronSchedule, IntervalSchedule, build_schedule
+
+
+def test_cron_next_run():
+    schedule = CronSchedule('*/20 9-22 * * *')
+    assert schedule.next_run(datetime(2025, 6, 20, 9, 5)) == datetime(2025, 6, 20, 9, 20)
+    assert schedule.next_run(datetime(2025, 6, 20, 22, 45)) == datetime(2025, 6, 21, 9, 0)
+
+
+def test_cron_weekday():
+    # 2025-06-20は金曜日、次の月曜日の6:00
+    schedule = CronSchedule('0 6 * * 1')
+    assert schedule.next_run(datetime(2025, 6, 20, 12, 0)) == datetime(2025, 6, 23, 6, 0)
+
+
+def test_build_schedule():
+    assert isinstance(build_schedule(600), IntervalSchedule)
+    assert isinstance(build_schedule({'cron': '0 * * * *'}), CronSchedule)
+    assert build_schedule({'interval': '30'}).seconds == 30.0
+
+
+class _FailingRunner:
+    def create_crawler(self, name):
+        raise KeyError(f"Spider not found: {name}")
+
+
+def test_failed_start_is_recorded_and_rescheduled():
+    daemon = CrawlDaemon(_FailingRunner(), {'missing': IntervalSchedule(60)})
+    scheduled = []
+    daemon._call_later = lambda name, delay: scheduled.append((name, delay))
+
+    daemon._run('missing')
+
+    health = daemon.health['missing']
+    assert health['running'] is False
+    assert health['failures'] == 1
+    assert health['consecutive_failures'] == 1
+    assert 'Spider not found' in health['last_error']
+    assert scheduled and scheduled[0][0] == 'missing'
+    assert daemon.snapshot()['status'] == 'degraded'
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+映画詳細ページの抽出処理（extractors.extract_movie_detail）のテスト
+"""
+
+import os
+import sys
+
+from lxml import html
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.extractors import extract_movie_detail
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'benchmarks', 'fixtures')
+
+PAGE = """
+<html><body>
+<h1><b>夏の日記</b></h1>
+<dl><dt>制作年／制作国</dt><dd>2024年／フランス</dd></dl>
+<dl><dt>公式HP</dt><dd>公式サイト <a href="https://example.com/natsu/">こちら</a></dd></dl>
+<div class="module-text text is-meta"><p>監督: 山田太郎</p></div>
+<div class="module-text"><div class="text is-meta"><p>上映時間: 118分</p></div></div>
+<div class="module-text"><div class="text"><p>祖母の日記をたどる旅が始まる。</p></div></div>
+<div class="module-schedule"><table>
+<tr><th>6/20(金)</th><td>10:00～11:58</td><td>14:30</td></tr>
+</table></div>
+</body></html>
+"""
+
+
+def test_extract_fields():
+    detail = extract_movie_detail(html.fromstring(PAGE))
+    assert detail['title'] == '夏の日記'
+    assert detail['release_year'] == 2024
+    assert detail['official_website'] == 'https://example.com/natsu/'
+    assert detail['schedule'] == [('6/20(金)', ['10:00～11:58', '14:30'])]
+
+
+def test_skips_meta_blocks_including_self():
+    """.module-text 自身が .text.is-meta の場合もあらすじに含めない"""
+    detail = extract_movie_detail(html.fromstring(PAGE))
+    assert detail['synopsis'] == '祖母の日記をたどる旅が始まる。'
+    assert '山田太郎' not in detail['synopsis']
+
+
+def test_fixture_page_has_title():
+    with open(os.path.join(FIXTURES, 'movie_detail.html'), 'rb') as f:
+        detail = extract_movie_detail(html.fromstring(f.read()))
+    assert detail['title']
+
+
+def test_synopsis_paragraphs_led_by_inline_elements():
+    """<span>・<a> で始まる段落は従来の p::text と同じく最初のテキストを使う"""
+    page = """
+    <html><body><h1>夏の日記</h1>
+    <div class="module-text"><div class="text">
+    <p><span>強調された冒頭のあらすじ</span></p>
+    <p><a href="/movies/1/">祖母</a>の物語</p>
+    </div></div>
+    </body></html>
+    """
+    detail = extract_movie_detail(html.fromstring(page))
+    assert detail['synopsis'] == '強調された冒頭のあらすじ 祖母'
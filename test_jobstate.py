@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+中断・再開用のジョブ状態（jobstate）のテスト
+"""
+
+import os
+import sys
+from argparse import Namespace
+from types import SimpleNamespace
+
+import pytest
+from scrapy import signals
+from scrapy.exceptions import UsageError
+from scrapy.settings import Settings
+from scrapy.signalmanager import SignalManager
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.commands import jobs
+from theater_scraper.items import MovieItem, ShowtimeItem, TheaterItem
+from theater_scraper.jobstate import JobState, item_key
+from theater_scraper.middlewares import JobStateMiddleware
+
+DETAIL_URL = 'https://qualite.musashino-k.jp/movies/4000/'
+
+
+def _showtime(starts_at, screen=None):
+    return ShowtimeItem(theater_id='cinema_qualite', detail_url=DETAIL_URL, title='夏の日記',
+                        starts_at=starts_at, ends_at=None, screen=screen)
+
+
+def test_item_keys():
+    assert item_key(TheaterItem(theater_id='cinema_qualite')) == 'TheaterItem:cinema_qualite'
+    assert item_key(MovieItem(theater_id='cinema_qualite', detail_url=DETAIL_URL)) == f"MovieItem:{DETAIL_URL}"
+    keys = {
+        item_key(_showtime('2025-06-20T10:00')),
+        item_key(_showtime('2025-06-20T14:30')),
+        item_key(_showtime('2025-06-20T14:30', 'シアター2')),
+    }
+    assert len(keys) == 3
+
+
+def test_pending_showtimes_survive_partial_completion(tmp_path):
+    """同じ作品の上映回が1件書き込まれても、残りの上映回は再開時に出力し直す"""
+    state = JobState(tmp_path)
+    movie = MovieItem(theater_id='cinema_qualite', title='夏の日記', detail_url=DETAIL_URL)
+    showtimes = [_showtime('2025-06-20T10:00'), _showtime('2025-06-20T14:30'), _showtime('2025-06-20T18:00')]
+    try:
+        state.add_pending(movie)
+        for showtime in showtimes:
+            state.add_pending(showtime)
+        state.remove_pending(showtimes[0])
+        state.remove_pending(movie)
+
+        restored = state.pending_items()
+        assert [type(item) for item in restored] == [ShowtimeItem, ShowtimeItem]
+        assert [item['starts_at'] for item in restored] == ['2025-06-20T14:30', '2025-06-20T18:00']
+        assert state.counts()['pending_items'] == 2
+    finally:
+        state.close()
+
+
+def test_search_results_share_title_key(tmp_path):
+    state = JobState(tmp_path)
+    try:
+        assert state.get_search('夏の日記', 2024) == (False, None)
+        state.put_search('夏の日記【字幕版】', 2024, {'id': 1})
+        assert state.get_search('夏の日記', 2024) == (True, {'id': 1})
+        state.put_search('存在しない作品', None, None)
+        assert state.get_search('存在しない作品', None) == (True, None)
+    finally:
+        state.close()
+
+
+def test_item_error_clears_pending(tmp_path):
+    """パイプラインで例外となったアイテムは再開時に出力し直さない"""
+    crawler = SimpleNamespace(settings=Settings({'JOBDIR': str(tmp_path)}), stats=None, signals=SignalManager())
+    middleware = JobStateMiddleware.from_crawler(crawler)
+    movie = MovieItem(theater_id='cinema_qualite', title='夏の日記', detail_url=DETAIL_URL)
+    list(middleware.process_spider_output(None, [movie], None))
+    assert middleware.job_state.counts()['pending_items'] == 1
+    crawler.signals.send_catch_log(signals.item_error, item=movie, response=None, spider=None,
+                                   failure=None)
+    assert middleware.job_state.counts()['pending_items'] == 0
+    middleware.spider_closed(None)
+
+
+def _clean(jobs_dir, names=(), **options):
+    command = jobs.Command()
+    command.settings = Settings({'JOBS_DIR': str(jobs_dir)})
+    opts = Namespace(jobs_dir=None, older_than=None, all=False, dry_run=False)
+    vars(opts).update(options)
+    command.run(['clean', *names], opts)
+
+
+def test_jobs_clean_requires_explicit_scope(tmp_path):
+    jobs_dir = tmp_path / 'jobs'
+    (jobs_dir / 'cinema_qualite-1').mkdir(parents=True)
+    (jobs_dir / 'cinema_qualite-2').mkdir()
+    with pytest.raises(UsageError):
+        _clean(jobs_dir)
+    for name in ('..', '.', '../jobs', 'cinema_qualite-1/../..'):
+        with pytest.raises(UsageError):
+            _clean(jobs_dir, [name])
+    assert sorted(p.name for p in jobs_dir.iterdir()) == ['cinema_qualite-1', 'cinema_qualite-2']
+
+    _clean(jobs_dir, ['cinema_qualite-1'])
+    assert [p.name for p in jobs_dir.iterdir()] == ['cinema_qualite-2']
+    _clean(jobs_dir, all=True)
+    assert list(jobs_dir.iterdir()) == []
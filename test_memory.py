@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+使用メモリを抑えるモードとメモリ使用量レポート（memory）のテスト
+"""
+
+import os
+import sys
+import tracemalloc
+from types import SimpleNamespace
+
+import scrapy
+from scrapy.utils.request import request_from_dict
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.memory import LRUSet, MemoryReport, seen_set
+
+
+class _Spider(scrapy.Spider):
+    name = 'test'
+
+    def parse(self, response):
+        yield scrapy.Request('https://example.com/movies/1/', callback=self.parse_movie_detail)
+
+    def parse_movie_detail(self, response):
+        yield {'body': [response] * 100}
+
+
+def test_lru_set_forgets_least_recently_used():
+    seen = LRUSet(2)
+    seen.add('a')
+    seen.add('b')
+    assert 'a' in seen  # a を最近参照したことにする
+    seen.add('c')
+    assert 'a' in seen and 'c' in seen and 'b' not in seen
+    assert len(seen) == 2
+
+
+def test_seen_set():
+    assert isinstance(seen_set(), set)
+    assert isinstance(seen_set(10), LRUSet)
+
+
+def test_report_keeps_callbacks_serializable():
+    """計測用に差し替えたコールバックのRequestもJOBDIRのディスクキューに入れられる"""
+    def process_item(item, spider):
+        return item
+
+    methods = {'process_item': [process_item], 'close_spider': []}
+    crawler = SimpleNamespace(engine=SimpleNamespace(scraper=SimpleNamespace(itemproc=SimpleNamespace(methods=methods))))
+    report = MemoryReport(crawler)
+    spider = _Spider()
+
+    tracemalloc.start()
+    try:
+        report._install(spider)
+        request = next(iter(spider.parse(None)))
+        restored = request_from_dict(request.to_dict(spider=spider), spider=spider)
+        items = list(restored.callback('body'))
+        methods['process_item'][0](items[0], spider)
+    finally:
+        tracemalloc.stop()
+
+    assert restored.callback.__name__ == 'parse_movie_detail'
+    assert report.stages['spider.parse'].calls >= 1
+    assert report.stages['spider.parse_movie_detail'].calls >= 1
+    assert report.stages[process_item.__qualname__].calls == 1
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+処理段階ごとのメトリクスとコールバックの差し替え（metrics / callbacks / profiling）のテスト
+"""
+
+import os
+import sys
+
+import scrapy
+from scrapy.utils.request import request_from_dict
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.callbacks import wrap_spider_callbacks
+from theater_scraper.metrics import record_latency, summarize_stats
+from theater_scraper.profiling import _FocusGate
+
+
+class _Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+
+class _Spider(scrapy.Spider):
+    name = 'test'
+
+    def parse(self, response):
+        yield scrapy.Request('https://example.com/movies/1/', callback=self.parse_movie_detail)
+
+    def parse_movie_detail(self, response):
+        yield {'url': response}
+
+
+def test_record_latency_buckets():
+    stats = _Stats()
+    record_latency(stats, 'tmdb', 0.003)
+    record_latency(stats, 'tmdb', 60)
+    assert stats.values['metrics/latency/tmdb/bucket/0.005'] == 1
+    assert stats.values['metrics/latency/tmdb/bucket/+Inf'] == 1
+    assert stats.values['metrics/latency/tmdb/count'] == 2
+
+
+def test_summarize_stats():
+    summary = summarize_stats({'item_scraped_count': 20, 'tmdb/items': 10, 'tmdb/requests': 5,
+                               'tmdb/cache_hits': 3, 'tmdb/cache_misses': 1}, 10.0)
+    assert summary['metrics/items_per_second'] == 2.0
+    assert summary['metrics/tmdb_calls_per_item'] == 0.5
+    assert summary['metrics/tmdb_cache_hit_ratio'] == 0.75
+
+
+def test_wrapped_callbacks_stay_serializable():
+    """差し替えたコールバックのRequestもJOBDIRのディスクキューに入れられる"""
+    spider = _Spider()
+    calls = []
+
+    def wrap(func):
+        def wrapper(*args, **kwargs):
+            calls.append(func.__name__)
+            return func(*args, **kwargs)
+        return wrapper
+
+    wrap_spider_callbacks(spider, wrap)
+    request = next(iter(spider.parse(None)))
+    assert request.callback.__name__ == 'parse_movie_detail'
+
+    data = request.to_dict(spider=spider)
+    assert data['callback'] == 'parse_movie_detail'
+    restored = request_from_dict(data, spider=spider)
+    assert list(restored.callback('body')) == [{'url': 'body'}]
+    assert calls == ['parse', 'parse_movie_detail']
+
+
+def test_focus_gate_covers_generator_iteration():
+    events = []
+    gate = _FocusGate(lambda: events.append('on'), lambda: events.append('off'))
+    spider = _Spider()
+    wrap_spider_callbacks(spider, gate.wrap)
+    list(spider.parse_movie_detail('body'))
+    assert events and events[0] == 'on' and events[-1] == 'off'
+    assert gate.depth == 0
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+スパイダー・ダウンローダーミドルウェア（middlewares）のテスト
+"""
+
+import logging
+import os
+import sys
+from types import SimpleNamespace
+
+from scrapy import Request
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.items import MovieItem, ShowtimeItem, TheaterItem
+from theater_scraper.middlewares import TheaterScraperSpiderMiddleware
+
+SPIDER = SimpleNamespace(logger=logging.getLogger('test'))
+
+
+class _Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+    def set_value(self, key, value):
+        self.values[key] = value
+
+
+def parse_movie_detail(response):
+    pass
+
+
+def _detail(url, **kwargs):
+    return Request(url, callback=parse_movie_detail, **kwargs)
+
+
+def test_early_filter_drops_invalid_and_duplicates():
+    stats = _Stats()
+    middleware = TheaterScraperSpiderMiddleware(stats=stats)
+    movie = dict(theater_id='cinema_qualite', title='夏の日記', detail_url='https://example.com/movies/1/')
+    output = [
+        _detail('https://example.com/movies/1/'),
+        _detail('https://example.com/movies/1/'),
+        _detail('https://example.com/movies/1/', dont_filter=True),
+        Request('https://example.com/'),
+        Request('https://example.com/'),  # 詳細ページ以外はScrapyの重複除外に任せる
+        TheaterItem(theater_id='cinema_qualite', name='新宿シネマカリテ', official_url='https://example.com/'),
+        MovieItem(**movie),
+        MovieItem(**movie),
+        MovieItem(**{**movie, 'title': ''}),
+        ShowtimeItem(theater_id='cinema_qualite', detail_url=movie['detail_url'], starts_at='2025-06-20T10:00'),
+        ShowtimeItem(theater_id='cinema_qualite', detail_url=movie['detail_url'], starts_at='2025-06-20T10:00',
+                     screen='シアター2'),
+        {'other': 'item'},
+    ]
+    kept = list(middleware.process_spider_output(None, output, SPIDER))
+
+    assert len(kept) == len(output) - 3
+    assert stats.values['early_filter/duplicate_requests'] == 1
+    assert stats.values['early_filter/duplicate/MovieItem'] == 1
+    assert stats.values['early_filter/invalid/MovieItem'] == 1
+
+    middleware.spider_closed(SPIDER)
+    assert stats.values['early_filter/items_avoided'] == 2
+
+
+def test_early_filter_bounded_memory():
+    middleware = TheaterScraperSpiderMiddleware(cache_size=1)
+    requests = [_detail(f"https://example.com/movies/{index}/") for index in (1, 2, 1)]
+    # 上限を超えて忘れたURLはもう一度通す（Scrapyの重複除外が最終的に弾く）
+    assert len(list(middleware.process_spider_output(None, requests, SPIDER))) == 3
+
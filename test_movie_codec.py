@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+MovieTableのコンパクトな保存形式（movie_codec）のテスト
+"""
+
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper import movie_codec
+from theater_scraper.movie_codec import decode_movie, encode_movie, is_compact, item_size, projection
+
+RECORD = {
+    'detail_url': 'https://qualite.musashino-k.jp/movies/4000/',
+    'theater_id': 'cinema_qualite',
+    'title': '夏の日記',
+    'original_title': "Le journal d'été",
+    'synopsis': 'パリ郊外の小さな町で暮らす少女は、祖母の遺した古い日記を見つける。' * 5,
+    'tmdb_id': 12345,
+    'created_at': '2025-06-20T09:00:00',
+    'updated_at': '2025-06-20T09:30:15.123456',
+}
+
+
+def test_round_trip_zlib():
+    encoded = encode_movie(RECORD, 'zlib')
+    assert is_compact(encoded) and not is_compact(RECORD)
+    # 主キーとGSIのキーは別名にしない
+    assert encoded['detail_url'] == RECORD['detail_url']
+    assert encoded['theater_id'] == RECORD['theater_id']
+    assert 'synopsis' not in encoded and bytes(encoded['z'][:1]) == b'z'
+    assert item_size(encoded) < item_size(RECORD)
+
+    decoded = decode_movie(encoded)
+    # 日時は秒単位で保存する
+    assert decoded['updated_at'] == '2025-06-20T09:30:15'
+    assert {k: v for k, v in decoded.items() if not k.endswith('_at')} == \
+           {k: v for k, v in RECORD.items() if not k.endswith('_at')}
+
+
+def test_decode_boto3_values():
+    """boto3が返す Binary（.value）と Decimal の属性も元に戻す"""
+    encoded = encode_movie(RECORD)
+    boto3_like = {**encoded, 'z': type('Binary', (), {'value': encoded['z']})(),
+                  'c': Decimal(encoded['c']), 'i': Decimal(12345)}
+    decoded = decode_movie(boto3_like)
+    assert decoded['synopsis'] == RECORD['synopsis']
+    assert decoded['created_at'] == RECORD['created_at']
+
+
+def test_short_synopsis_stays_text():
+    encoded = encode_movie({**RECORD, 'synopsis': '短い'})
+    assert encoded['s'] == '短い' and 'z' not in encoded
+    assert decode_movie(encoded)['synopsis'] == '短い'
+
+
+def test_plain_records_pass_through():
+    assert decode_movie(RECORD) is RECORD
+
+
+@pytest.mark.skipif(movie_codec.zstandard is None, reason='zstandard is not installed')
+def test_round_trip_zstd():
+    encoded = encode_movie(RECORD, 'zstd')
+    assert bytes(encoded['z'][:1]) == b's'
+    assert decode_movie(encoded)['synopsis'] == RECORD['synopsis']
+
+
+def test_projection_reads_both_formats():
+    assert projection(['detail_url', 'title', 'synopsis']) == 'detail_url, title, t, synopsis, s, z'
+
+
+def test_item_size():
+    # 属性名＋値（文字列はUTF-8のバイト数、数値は有効数字2桁ごとに1バイト＋1バイト）
+    assert item_size({'id': 'abc'}) == 5
+    assert item_size({'n': 12345}) == 1 + 4
+    assert item_size({'b': b'\x00' * 10}) == 11
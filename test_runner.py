@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+multicrawlのstats集計（runner.merge_stats）のテスト
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.runner import build_jobs, merge_stats
+
+
+def test_merge_numbers_and_times():
+    merged = merge_stats([
+        {'item_scraped_count': 3, 'elapsed_time_seconds': 10.0, 'memusage/max': 100,
+         'start_time': datetime(2025, 6, 20, 9, 0), 'finish_time': datetime(2025, 6, 20, 9, 5)},
+        {'item_scraped_count': 4, 'elapsed_time_seconds': 12.5, 'memusage/max': 80,
+         'start_time': datetime(2025, 6, 20, 8, 59), 'finish_time': datetime(2025, 6, 20, 9, 7)},
+    ])
+    assert merged['item_scraped_count'] == 7
+    assert merged['elapsed_time_seconds'] == 12.5
+    assert merged['memusage/max'] == 100
+    assert merged['start_time'] == datetime(2025, 6, 20, 8, 59)
+    assert merged['finish_time'] == datetime(2025, 6, 20, 9, 7)
+
+
+def test_merge_strings_counts_values():
+    merged = merge_stats([{'finish_reason': 'finished'}, {'finish_reason': 'finished'},
+                          {'finish_reason': 'shutdown'}])
+    assert merged['finish_reason/finished'] == 2
+    assert merged['finish_reason/shutdown'] == 1
+
+
+def test_merge_concatenates_lists():
+    """シャードごとの budget/deferred_urls が失われない"""
+    merged = merge_stats([
+        {'budget/deferred_urls': ['https://example.com/movies/1/']},
+        {},
+        {'budget/deferred_urls': ['https://example.com/movies/2/', 'https://example.com/movies/3/']},
+    ])
+    assert merged['budget/deferred_urls'] == [
+        'https://example.com/movies/1/', 'https://example.com/movies/2/', 'https://example.com/movies/3/',
+    ]
+
+
+def test_merge_dicts_by_key():
+    merged = merge_stats([
+        {'memory/stages': {'parse': 10, 'tmdb': 5}},
+        {'memory/stages': {'parse': 2, 'feeds': 1}},
+    ])
+    assert merged['memory/stages'] == {'parse': 12, 'tmdb': 5, 'feeds': 1}
+
+
+def test_merge_logs_skipped_keys(caplog):
+    merged = merge_stats([{'item_scraped_count': 1, 'odd': object()}])
+    assert 'odd' not in merged
+    assert 'odd' in caplog.text
+
+
+def test_build_jobs_shards():
+    jobs = build_jobs(['cinema_qualite'], shard_count=2)
+    assert [job.name for job in jobs] == ['cinema_qualite[0/2]', 'cinema_qualite[1/2]']
+    assert jobs[1].spider_args == {'shard_index': 1, 'shard_count': 2}
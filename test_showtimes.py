@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+上映スケジュールの解析（showtimes）と上映回の保存・削除（DynamoDBPipeline）のテスト
+"""
+
+import logging
+import os
+import sys
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper import resources
+from theater_scraper.items import MovieItem, ShowtimeItem
+from theater_scraper.pipelines import DynamoDBPipeline
+from theater_scraper.showtimes import (
+    SHOWTIME_TABLE,
+    build_showtime_record,
+    format_time,
+    parse_cell,
+    parse_runtime,
+    parse_schedule,
+    resolve_date,
+    showtimes_between,
+    start_key,
+)
+from theater_scraper.spiders.cinema_qualite import CinemaQualiteSpider
+
+TODAY = date(2025, 6, 20)
+
+
+def test_resolve_date_nearest_year():
+    assert resolve_date('6/20(金)', TODAY) == date(2025, 6, 20)
+    assert resolve_date('6月21日', TODAY) == date(2025, 6, 21)
+    # 年末にクロールした翌年1月の日付
+    assert resolve_date('1/3(土)', date(2025, 12, 28)) == date(2026, 1, 3)
+    assert resolve_date('2024/12/31', TODAY) == date(2024, 12, 31)
+    assert resolve_date('2/30', TODAY) is None
+    assert resolve_date('近日公開', TODAY) is None
+
+
+def test_parse_cell():
+    assert parse_cell('10:00～11:58 シアター1', TODAY) == (
+        datetime(2025, 6, 20, 10, 0), datetime(2025, 6, 20, 11, 58), 'シアター1',
+    )
+    # 終了時刻が無ければ上映時間から計算する
+    assert parse_cell('14：30', TODAY, runtime=118) == (
+        datetime(2025, 6, 20, 14, 30), datetime(2025, 6, 20, 16, 28), None,
+    )
+    # 日付をまたぐ上映・25時表記
+    assert parse_cell('23:30～1:10', TODAY)[1] == datetime(2025, 6, 21, 1, 10)
+    assert parse_cell('25:30', TODAY)[0] == datetime(2025, 6, 21, 1, 30)
+    assert parse_cell('満席', TODAY) is None
+
+
+def test_parse_runtime():
+    assert parse_runtime('118分') == 118
+    assert parse_runtime(None) is None
+
+
+def test_parse_schedule_sorts_and_dedups():
+    rows = [
+        ('6/21(土)', ['10:00', '10:00']),
+        ('6/20(金)', ['18:00', '12:30～14:28']),
+        ('休映', ['10:00']),
+    ]
+    showtimes = parse_schedule(rows, runtime=100, today=TODAY)
+    assert [format_time(starts_at) for starts_at, _, _ in showtimes] == [
+        '2025-06-20T12:30', '2025-06-20T18:00', '2025-06-21T10:00',
+    ]
+
+
+def test_showtime_record():
+    record = build_showtime_record({
+        'theater_id': 'cinema_qualite', 'detail_url': 'https://example.com/movies/1/', 'title': '夏の日記',
+        'starts_at': '2025-06-20T18:00', 'ends_at': '2025-06-20T19:58', 'screen': 'シアター2',
+    }, now='2025-06-20T09:00:00')
+    assert record['start_key'] == '2025-06-20T18:00#シアター2#https://example.com/movies/1/'
+    assert record['show_date'] == '2025-06-20'
+    assert record['expires_at'] > datetime(2025, 6, 20, 19, 58).timestamp()
+
+
+class _Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+
+def _spider():
+    return SimpleNamespace(logger=logging.getLogger('test'), crawler=SimpleNamespace(stats=_Stats()))
+
+
+def _showtime(detail_url, starts_at):
+    return ShowtimeItem(theater_id='cinema_qualite', detail_url=detail_url, title='夏の日記',
+                        starts_at=format_time(starts_at), ends_at=None, screen=None)
+
+
+def _movie(detail_url, showtimes_parsed):
+    item = MovieItem(theater_id='cinema_qualite', title='夏の日記', detail_url=detail_url,
+                     created_at='2025-06-20T09:00:00', updated_at='2025-06-20T09:00:00')
+    if showtimes_parsed:
+        item['showtimes_parsed'] = True
+    return item
+
+
+def test_stale_showtimes_only_for_parsed_pages(tmp_path):
+    endpoint = f"sqlite:{tmp_path / 'theater.sqlite3'}"
+    soon = datetime.now() + timedelta(hours=1)
+    parsed, unparsed = 'https://example.com/movies/1/', 'https://example.com/movies/2/'
+    try:
+        first = DynamoDBPipeline(dynamodb_endpoint=endpoint, showtimes_enabled=True)
+        spider = _spider()
+        for detail_url in (parsed, unparsed):
+            first.process_item(_showtime(detail_url, soon), spider)
+            first.process_item(_showtime(detail_url, soon + timedelta(hours=3)), spider)
+        first.close_spider(spider)
+
+        # 2回目: 解析できたページでは1件が消え、もう1件はスケジュール表を取得できなかった
+        second = DynamoDBPipeline(dynamodb_endpoint=endpoint, showtimes_enabled=True)
+        spider = _spider()
+        second.process_item(_movie(parsed, True), spider)
+        second.process_item(_showtime(parsed, soon), spider)
+        second.process_item(_movie(unparsed, False), spider)
+        second.close_spider(spider)
+
+        dynamodb = resources.get_dynamodb_resource(endpoint)
+        remaining = showtimes_between(dynamodb, 'cinema_qualite', soon, soon + timedelta(hours=4))
+        assert sorted(item['start_key'] for item in remaining) == sorted([
+            start_key(format_time(soon), None, parsed),
+            start_key(format_time(soon), None, unparsed),
+            start_key(format_time(soon + timedelta(hours=3)), None, unparsed),
+        ])
+        assert spider.crawler.stats.values['dynamodb/showtimes_deleted'] == 1
+    finally:
+        resources.clear()
+
+
+def test_showtimes_disabled_skips_deletion():
+    """SHOWTIMES_ENABLED = False では ShowtimeTable を参照しない"""
+    class _NoTables:
+        def Table(self, name):
+            assert name != SHOWTIME_TABLE
+            raise AssertionError(f"unexpected table access: {name}")
+
+    pipeline = DynamoDBPipeline(dynamodb_endpoint='sqlite::memory:', showtimes_enabled=False)
+    pipeline._dynamodb = _NoTables()
+    pipeline.crawled_details['cinema_qualite'].add('https://example.com/movies/1/')
+    try:
+        pipeline.close_spider(_spider())
+    finally:
+        resources.clear()
+
+
+def _parse_detail(schedule_cells, showtimes_enabled=True):
+    spider = CinemaQualiteSpider()
+    spider.settings = Settings({'SHOWTIMES_ENABLED': showtimes_enabled})
+    cells = ''.join(f"<td>{cell}</td>" for cell in schedule_cells)
+    body = (f"<html><body><h1>夏の日記</h1><div class=\"module-schedule\"><table>"
+            f"<tr><th>{datetime.now():%m/%d}</th>{cells}</tr></table></div></body></html>")
+    response = HtmlResponse('https://example.com/movies/1/', body=body.encode('utf-8'), encoding='utf-8')
+    return list(spider.parse_movie_detail(response))
+
+
+def test_spider_marks_parsed_schedules_only():
+    """上映回を1件も解析できなかったスケジュール表は解析済みにしない（保存済みの上映回を削除しない）"""
+    movie, *showtimes = _parse_detail(['23:58'])
+    assert movie.get('showtimes_parsed') is True
+    assert [type(item) for item in showtimes] == [ShowtimeItem]
+
+    movie, *showtimes = _parse_detail(['23時58分開映'])
+    assert 'showtimes_parsed' not in movie and showtimes == []
+
+    movie, *showtimes = _parse_detail(['23:58'], showtimes_enabled=False)
+    assert 'showtimes_parsed' not in movie and showtimes == []
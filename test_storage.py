@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+組み込みSQLiteの保存先（storage.SQLiteStorage）のテスト
+"""
+
+import os
+import sqlite3
+import sys
+import time
+from decimal import Decimal
+
+import pytest
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper import storage
+from theater_scraper.storage import SQLiteStorage, decode_item, encode_item, is_sqlite_endpoint
+
+
+def test_endpoint_scheme():
+    assert is_sqlite_endpoint('sqlite:data/theater.sqlite3')
+    assert not is_sqlite_endpoint('http://localhost:8000')
+    assert not is_sqlite_endpoint(None)
+
+
+def test_item_round_trip():
+    item = {'title': '夏の日記', 'tmdb_id': 42, 'rating': 7.5, 's': b'\x00z', 'genres': {'drama'}, 'empty': None}
+    restored = decode_item(encode_item(item))
+    assert restored == {'title': '夏の日記', 'tmdb_id': Decimal(42), 'rating': Decimal('7.5'),
+                        's': b'\x00z', 'genres': {'drama'}, 'empty': None}
+
+
+def test_put_get_query_delete(tmp_path):
+    db = SQLiteStorage(tmp_path / 'theater.sqlite3')
+    try:
+        table = db.Table('ShowingTable')
+        for index in range(3):
+            response = table.put_item(Item={
+                'detail_url': f"https://example.com/movies/{index}/",
+                'theater_id': 'cinema_qualite' if index < 2 else 'other',
+                'film_id': f"tmdb:{index}",
+            }, ReturnConsumedCapacity='TOTAL')
+        assert response['ConsumedCapacity']['CapacityUnits'] == 1.0
+        assert table.get_item(Key={'detail_url': 'https://example.com/movies/1/'})['Item']['film_id'] == 'tmdb:1'
+        assert table.get_item(Key={'detail_url': 'missing'}) == {}
+
+        response = table.query(IndexName='theater_id-index',
+                               KeyConditionExpression='theater_id = :theater_id',
+                               ExpressionAttributeValues={':theater_id': 'cinema_qualite'},
+                               ProjectionExpression='detail_url')
+        assert sorted(item['detail_url'] for item in response['Items']) == [
+            'https://example.com/movies/0/', 'https://example.com/movies/1/',
+        ]
+
+        table.delete_item(Key={'detail_url': 'https://example.com/movies/0/'})
+        assert table.get_item(Key={'detail_url': 'https://example.com/movies/0/'}) == {}
+    finally:
+        db.close()
+
+
+def test_sort_key_range_and_ttl(tmp_path):
+    path = tmp_path / 'theater.sqlite3'
+    db = SQLiteStorage(path)
+    table = db.Table('ShowtimeTable')
+    with table.batch_writer() as batch:
+        for hour, expires_at in ((10, 1), (12, 2**40), (14, 2**40), (16, 2**40)):
+            batch.put_item(Item={
+                'theater_id': 'cinema_qualite', 'start_key': f"2025-06-20T{hour}:00#", 'show_date': '2025-06-20',
+                'expires_at': expires_at,
+            })
+    response = table.query(
+        KeyConditionExpression='theater_id = :t AND start_key BETWEEN :start AND :end',
+        ExpressionAttributeValues={':t': 'cinema_qualite', ':start': '2025-06-20T12:00', ':end': '2025-06-20T15:00'},
+    )
+    assert [item['start_key'] for item in response['Items']] == ['2025-06-20T12:00#', '2025-06-20T14:00#']
+    db.close()
+
+    # 開いたときにTTLを過ぎたレコードを削除する
+    db = SQLiteStorage(path)
+    try:
+        response = db.Table('ShowtimeTable').query(
+            IndexName='show_date-index',
+            KeyConditionExpression='show_date = :d AND start_key >= :start',
+            ExpressionAttributeValues={':d': '2025-06-20', ':start': ''},
+        )
+        assert response['Count'] == 3
+    finally:
+        db.close()
+
+
+def test_scan_paginates(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'SCAN_PAGE_SIZE', 2)
+    db = SQLiteStorage(tmp_path / 'theater.sqlite3')
+    try:
+        table = db.Table('FilmTable')
+        for index in range(5):
+            table.put_item(Item={'film_id': f"tmdb:{index}"})
+        seen, kwargs = [], {}
+        while True:
+            response = table.scan(**kwargs)
+            seen.extend(item['film_id'] for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        assert seen == [f"tmdb:{index}" for index in range(5)]
+    finally:
+        db.close()
+
+
+def test_idle_writer_releases_lock(tmp_path):
+    """書き込みが途切れたら COMMIT_INTERVAL 秒で書き込みロックを手放し、他のプロセスが書き込める"""
+    path = tmp_path / 'theater.sqlite3'
+    db = SQLiteStorage(path, commit_interval=0.1)
+    try:
+        db.Table('TheaterTable').put_item(Item={'theater_id': 'cinema_qualite', 'name': '新宿シネマカリテ'})
+        other = sqlite3.connect(path, timeout=0, isolation_level=None)
+        try:
+            time.sleep(0.3)
+            # ロックを待たずに書き込みを始められる（待つ場合は database is locked）
+            other.execute('BEGIN IMMEDIATE')
+            assert other.execute('SELECT COUNT(*) FROM TheaterTable').fetchone()[0] == 1
+            other.execute('COMMIT')
+        finally:
+            other.close()
+    finally:
+        db.close()
+
+
+def test_failed_first_write_rolls_back(tmp_path):
+    """バッチの最初の書き込みが失敗してもトランザクションを開いたままにしない"""
+    path = tmp_path / 'theater.sqlite3'
+    db = SQLiteStorage(path)
+    try:
+        table = db.Table('TheaterTable')
+        with pytest.raises(sqlite3.Error):
+            table.put_item(Item={'theater_id': {'x': 1}})
+        assert not db._connection.in_transaction
+        # 以降の書き込みは通常どおり行え、他の接続からも書き込める
+        table.put_item(Item={'theater_id': 'cinema_qualite'})
+        db.flush()
+        other = sqlite3.connect(path, timeout=0, isolation_level=None)
+        try:
+            other.execute('BEGIN IMMEDIATE')
+            other.execute('COMMIT')
+        finally:
+            other.close()
+    finally:
+        db.close()
+
+
+def test_put_item_requires_key(tmp_path):
+    db = SQLiteStorage(tmp_path / 'theater.sqlite3')
+    try:
+        with pytest.raises(ValueError):
+            db.Table('TheaterTable').put_item(Item={'name': 'no key'})
+        with pytest.raises(ValueError):
+            db.Table('ShowtimeTable').put_item(Item={'theater_id': 'cinema_qualite'})
+    finally:
+        db.close()
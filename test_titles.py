@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+作品タイトルの正規化（titles）のテスト
+"""
+
+import os
+import sys
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper.titles import normalize_title, search_variants, title_key
+
+
+def test_normalize_folds_width_and_strips_tags():
+    assert normalize_title('ＳＵＭＭＥＲ　ＤＩＡＲＹ') == 'SUMMER DIARY'
+    assert normalize_title('ｻﾏｰ ﾀﾞｲｱﾘｰ') == 'サマー ダイアリー'
+    assert normalize_title('夏の日記【字幕版】') == '夏の日記'
+    assert normalize_title('夏の日記 (4Kリマスター版)') == '夏の日記'
+    assert normalize_title('4K') == '4K'
+    assert normalize_title('夏の日記〔吹替版〕') == '夏の日記'
+
+
+def test_brackets_in_title_are_kept():
+    """上映形態の語を含まない括弧はタイトルの一部として残す"""
+    assert normalize_title('劇場版【推しの子】') == '劇場版【推しの子】'
+    assert normalize_title('【推しの子】-The Final Act-【字幕版】') == '【推しの子】-The Final Act-'
+    assert title_key('劇場版【推しの子】') != title_key('劇場版【名探偵の休日】') != title_key('劇場版')
+
+
+def test_key_ignores_notation_differences():
+    assert title_key('ボヘミアン・ラプソディ') == title_key('ボヘミアン ラプソディ【字幕版】')
+    assert title_key('『夏の日記』') == title_key('「夏の日記」') == title_key('夏の日記')
+    assert title_key('SUMMER DIARY') == title_key('Summer Diary')
+
+
+def test_key_keeps_numeric_punctuation():
+    """数字の前の - と数字の間の . で別の作品を区別する"""
+    assert title_key('『ゴジラ－１.０』【字幕版】') == title_key('ゴジラ-1.0') == 'ゴジラ-1.0'
+    assert title_key('ゴジラ-1.0') != title_key('ゴジラ10')
+    assert title_key('X-MEN') == 'xmen'
+    assert title_key('Mr. & Mrs. Smith') == 'mrmrssmith'
+
+
+def test_search_variants_strip_enclosing_brackets():
+    assert search_variants('『ゴジラ－１.０』【字幕版】') == ('ゴジラ-1.0',)
+    assert search_variants('"Aftersun"') == ('Aftersun',)
+    # タイトルの一部を囲む括弧は残す
+    assert search_variants('劇場版『名探偵の休日』') == ('劇場版「名探偵の休日」',)
+
+
+def test_search_variants_drop_subtitle():
+    assert search_variants('夏の日記 ～祖母の秘密～') == ('夏の日記 ~祖母の秘密~', '夏の日記')
+    assert search_variants('') == ()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+TMDb APIのログ出力（tmdb_client.configure_logging）のテスト
+"""
+
+import logging
+import os
+import sys
+
+# プロジェクトのパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'theater_scraper'))
+
+from theater_scraper import tmdb_client
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _configure(monkeypatch, **env):
+    monkeypatch.delenv('TMDB_LOG_PROPAGATE', raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    tmdb_client.configure_logging(log_file='', console_level=logging.CRITICAL)
+
+
+def test_logs_propagate_to_root_by_default(monkeypatch):
+    """従来どおりScrapyのログ（ルートロガー）にもTMDbのログが出る"""
+    collect = _Collect()
+    logging.getLogger().addHandler(collect)
+    try:
+        _configure(monkeypatch)
+        tmdb_client.logger.critical('TMDb検索: 夏の日記')
+    finally:
+        tmdb_client.shutdown_logging()
+        logging.getLogger().removeHandler(collect)
+    assert tmdb_client.logger.propagate
+    assert collect.messages == ['TMDb検索: 夏の日記']
+
+
+def test_propagation_can_be_disabled(monkeypatch):
+    collect = _Collect()
+    logging.getLogger().addHandler(collect)
+    try:
+        _configure(monkeypatch, TMDB_LOG_PROPAGATE='false')
+        tmdb_client.logger.critical('TMDb検索: 夏の日記')
+    finally:
+        tmdb_client.shutdown_logging()
+        logging.getLogger().removeHandler(collect)
+        tmdb_client.logger.propagate = True
+    assert collect.messages == []
@@ -0,0 +1,130 @@
+"""
+取得したレスポンスの圧縮アーカイブ
+
+1レコードは「ヘッダー長・本文長（各4バイト）＋ヘッダーJSON＋zlib圧縮した本文」。
+ヘッダーにはURL・取得時刻・ステータス・レスポンスヘッダー・種別（listing/detail）を
+保存する。ヘッダーは非圧縮のため、本文を展開せずにURLの索引を作成できる。
+"""
+
+import json
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+
+ARCHIVE_SUFFIX = '.arc'
+_FRAME = struct.Struct('>II')
+
+
+class ArchiveWriter:
+    """レスポンスをアーカイブファイルへ追記する"""
+
+    def __init__(self, path, compression_level=6):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compression_level = compression_level
+        self._file = open(self.path, 'ab')
+        self.records = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def write(self, url, body, status=200, headers=None, kind=None, spider=None, fetched_at=None):
+        header = json.dumps({
+            'url': url,
+            'fetched_at': fetched_at if fetched_at is not None else time.time(),
+            'status': status,
+            'headers': headers or {},
+            'kind': kind,
+            'spider': spider,
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        compressed = zlib.compress(body, self.compression_level)
+        self._file.write(_FRAME.pack(len(header), len(compressed)))
+        self._file.write(header)
+        self._file.write(compressed)
+        self.records += 1
+        self.raw_bytes += len(body)
+        self.stored_bytes += _FRAME.size + len(header) + len(compressed)
+
+    def close(self):
+        self._file.close()
+
+
+class ArchiveRecord:
+    """アーカイブ内の1レスポンス（本文は必要になった時点で読み込む）"""
+
+    __slots__ = ('header', 'path', 'offset', 'length')
+
+    def __init__(self, header, path, offset, length):
+        self.header = header
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    @property
+    def url(self):
+        return self.header['url']
+
+    @property
+    def fetched_at(self):
+        return self.header['fetched_at']
+
+    def read_body(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            return zlib.decompress(f.read(self.length))
+
+
+def find_archive_files(paths):
+    """ファイルまたはディレクトリ（再帰）からアーカイブファイルを列挙"""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.rglob(f'*{ARCHIVE_SUFFIX}')))
+        elif path.exists():
+            files.append(path)
+    return files
+
+
+def iter_records(path):
+    """アーカイブファイルのレコードを先頭から順に返す（本文は読まない）"""
+    with open(path, 'rb') as f:
+        while True:
+            frame = f.read(_FRAME.size)
+            if len(frame) < _FRAME.size:
+                # 書き込み途中で終了したファイルの末尾は無視する
+                return
+            header_length, body_length = _FRAME.unpack(frame)
+            header_bytes = f.read(header_length)
+            if len(header_bytes) < header_length:
+                return
+            offset = f.tell()
+            f.seek(body_length, os.SEEK_CUR)
+            yield ArchiveRecord(json.loads(header_bytes), path, offset, body_length)
+
+
+class ArchiveIndex:
+    """URLごとに最新（または指定時刻以前で最新）のレコードを引く索引"""
+
+    def __init__(self, paths, until=None):
+        self.files = find_archive_files(paths)
+        self.records = {}
+        for path in self.files:
+            for record in iter_records(path):
+                if until is not None and record.fetched_at > until:
+                    continue
+                current = self.records.get(record.url)
+                if current is None or record.fetched_at >= current.fetched_at:
+                    self.records[record.url] = record
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, url):
+        return self.records.get(url)
+
+    def spiders(self):
+        """アーカイブに含まれるスパイダー名"""
+        return sorted({r.header['spider'] for r in self.records.values() if r.header.get('spider')})
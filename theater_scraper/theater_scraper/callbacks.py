@@ -0,0 +1,46 @@
+"""
+スパイダーのコールバックとパイプラインのメソッドの差し替え
+
+プロファイリング（PROFILE_FOCUS）とメモリ使用量レポート（MEMORY_REPORT_ENABLED）が、
+スパイダーのコールバック（parse*）とパイプラインの処理の実行中だけを計測するために使う。
+"""
+
+import functools
+import inspect
+import types
+
+
+def wrap_spider_callbacks(spider, wrap):
+    """スパイダーのparse*メソッドを wrap(メソッド) が返す関数で包んだメソッドに差し替える
+
+    差し替え後もスパイダーのバウンドメソッド（__func__ を持つ）にしておくことで、
+    JOBDIRのディスクキューに入れるRequestのcallbackを Request.to_dict が名前で解決できる。
+    """
+    for name in dir(type(spider)):
+        method = getattr(spider, name, None)
+        if not (name.startswith('parse') and inspect.ismethod(method)):
+            continue
+        setattr(spider, name, types.MethodType(_spider_callback(method, wrap(method)), spider))
+
+
+def _spider_callback(method, wrapped):
+    @functools.wraps(method)
+    def callback(spider, *args, **kwargs):
+        return wrapped(*args, **kwargs)
+    return callback
+
+
+def wrap_pipeline_methods(crawler, method_names, wrap):
+    """有効なパイプラインの method_names のメソッドを wrap(メソッド) が返す関数に差し替える
+
+    Scrapy 2.13 の内部構造（crawler.engine.scraper.itemproc.methods の、メソッド名ごとの
+    dequeに登録されたパイプラインのメソッド）を直接書き換える。公開APIではないため、
+    Scrapyを更新するときは ItemPipelineManager の実装が変わっていないか確認する
+    （requirements.txt でバージョンを固定している）。
+    """
+    methods = crawler.engine.scraper.itemproc.methods
+    for method_name in method_names:
+        registered = methods[method_name]
+        for index, method in enumerate(registered):
+            if callable(method):
+                registered[index] = wrap(method)
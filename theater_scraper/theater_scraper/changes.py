@@ -0,0 +1,216 @@
+"""
+クロールごとの変更ログ
+
+前回までに保存した上映ごとの属性のハッシュと、このクロールで取得したアイテムを比べ、
+追加・削除・変更された上映を追記専用のJSON Linesとして書き出す。下流の処理はテーブル全体の
+ダンプを比較せず、変更ログだけを読めばよい。DynamoDBの読み込みは行わない。
+
+    <CHANGE_LOG_DIR>/
+        state.sqlite3                         上映ごとの属性のハッシュと最後の通し番号
+        <日時>-<スパイダー名>-<pid>.jsonl     クロールごとの変更ログ
+
+1行は次のいずれか（seq は全クロールを通して単調増加する通し番号）:
+
+    {"seq": 1, "op": "added", "theater_id": ..., "detail_url": ..., "film_id": ..., "fields": {...}}
+    {"seq": 2, "op": "modified", ..., "fields": {変わった属性: 新しい値}, "removed_fields": [...]}
+    {"seq": 3, "op": "removed", "theater_id": ..., "detail_url": ..., "film_id": ...}
+
+削除は、このクロールでアイテムを出力した映画館の上映のうち、今回出力されなかったものとする。
+--shards で詳細ページを複数プロセスに分けた場合は、そのプロセスが担当する詳細ページだけを判定する。
+
+クロール中の変更は一時ファイル（<変更ログ>.spool）に、出力された上映と保存するハッシュは
+SQLiteの一時テーブルに書き出し、アイテム数に比例するデータをメモリに溜めない。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from theater_scraper.feeds import encode_json
+from theater_scraper.shards import in_shard
+
+STATE_FILE = 'state.sqlite3'
+
+# 変更を記録する属性
+TRACKED_FIELDS = (
+    'title',
+    'original_title',
+    'release_year',
+    'synopsis',
+    'official_website',
+    'tmdb_id',
+    'tmdb_poster_path',
+    'poster_file',
+    'tmdb_details',
+)
+# 取得済みの場合は再取得しない属性（アイテムに無ければ前回の値のまま扱う）
+CARRIED_FIELDS = ('poster_file', 'tmdb_details')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS showings (
+    detail_url TEXT PRIMARY KEY,
+    theater_id TEXT NOT NULL,
+    film_id TEXT,
+    hashes TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS showings_theater ON showings (theater_id);
+CREATE TABLE IF NOT EXISTS sequence (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_seq INTEGER NOT NULL
+);
+'''
+
+# 1回のクロールの間だけ使う一時テーブル（接続を閉じると消える）
+_RUN_SCHEMA = '''
+CREATE TEMP TABLE seen (
+    detail_url TEXT PRIMARY KEY,
+    theater_id TEXT NOT NULL
+);
+CREATE TEMP TABLE updates (
+    detail_url TEXT PRIMARY KEY,
+    theater_id TEXT NOT NULL,
+    film_id TEXT,
+    hashes TEXT NOT NULL
+);
+'''
+
+# 削除とみなす上映（出力のあった映画館の、今回出力されなかった担当シャードの上映）
+_REMOVED_CONDITION = (
+    'theater_id IN (SELECT theater_id FROM seen)'
+    ' AND detail_url NOT IN (SELECT detail_url FROM seen)'
+    ' AND in_shard(detail_url)'
+)
+
+
+def field_hash(value):
+    """属性の値の短いハッシュ"""
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+class ChangeLog:
+    """1回のクロールの変更を集め、終了時にハッシュの保存と変更ログの書き出しを行う"""
+
+    def __init__(self, directory, spider_name='crawl', shard_index=0, shard_count=1):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # 自動コミット（クロール中に読み取りのスナップショットを保持し続けないため）
+        self.conn = sqlite3.connect(self.directory / STATE_FILE, timeout=30, isolation_level=None)
+        self.conn.create_function(
+            'in_shard', 1, lambda detail_url: in_shard(detail_url, shard_index, shard_count), deterministic=True,
+        )
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # 一時テーブルはメモリではなくファイルに置く
+        self.conn.execute('PRAGMA temp_store=FILE')
+        self.conn.executescript(_SCHEMA)
+        self.conn.executescript(_RUN_SCHEMA)
+        started = datetime.now()
+        self.path = self.directory / f"{started:%Y%m%dT%H%M%S}-{spider_name}-{os.getpid()}.jsonl"
+        self.spool_path = self.path.with_name(self.path.name + '.spool')
+        self._spool = None
+        # 種類ごとの変更数（added / modified / removed）
+        self.counts = Counter()
+
+    def _record(self, change):
+        """変更を一時ファイルに書き出す（通し番号は終了時に付ける）"""
+        if self._spool is None:
+            self._spool = open(self.spool_path, 'wb')
+        self._spool.write(encode_json(change))
+        self._spool.write(b'\n')
+        self.counts[change['op']] += 1
+
+    def observe(self, theater_id, detail_url, film_id, fields):
+        """アイテムを保存済みのハッシュと比べ、追加・変更を記録する"""
+        self.conn.execute('INSERT OR REPLACE INTO seen (detail_url, theater_id) VALUES (?, ?)',
+                          (detail_url, theater_id))
+        hashes = {name: field_hash(value) for name, value in fields.items() if value not in (None, '')}
+        row = self.conn.execute(
+            'SELECT film_id, hashes FROM main.showings WHERE detail_url = ?', (detail_url,)
+        ).fetchone()
+        record = {'theater_id': theater_id, 'detail_url': detail_url, 'film_id': film_id}
+
+        if row is None:
+            present = {name: fields[name] for name in hashes}
+            self._record({'op': 'added', **record, 'fields': present})
+        else:
+            stored_film_id, stored = row[0], json.loads(row[1])
+            for name in CARRIED_FIELDS:
+                if name not in hashes and name in stored:
+                    hashes[name] = stored[name]
+            changed = {name: fields[name] for name, digest in hashes.items() if stored.get(name) != digest}
+            removed_fields = sorted(name for name in stored if name not in hashes)
+            if not changed and not removed_fields and stored_film_id == film_id:
+                return
+            change = {'op': 'modified', **record, 'fields': changed}
+            if removed_fields:
+                change['removed_fields'] = removed_fields
+            self._record(change)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO updates (detail_url, theater_id, film_id, hashes) VALUES (?, ?, ?, ?)',
+            (detail_url, theater_id, film_id, json.dumps(hashes, sort_keys=True, separators=(',', ':'))),
+        )
+
+    def _record_removed(self):
+        """このクロールで出力されなかった上映（出力のあった映画館・担当シャードのみ）を記録し、その件数を返す"""
+        rows = self.conn.execute(
+            f'SELECT theater_id, detail_url, film_id FROM main.showings WHERE {_REMOVED_CONDITION}'
+            ' ORDER BY theater_id, detail_url'
+        )
+        count = 0
+        for theater_id, detail_url, film_id in rows:
+            self._record({'op': 'removed', 'theater_id': theater_id, 'detail_url': detail_url, 'film_id': film_id})
+            count += 1
+        return count
+
+    def commit(self, detect_removed=True):
+        """ハッシュを保存し、通し番号を付けて変更ログを書き出す（変更が無ければ書き出さない）
+
+        Returns:
+            種類ごとの変更数 {op: 件数}
+        """
+        removed = self._record_removed() if detect_removed else 0
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        total = sum(self.counts.values())
+        if not total:
+            return Counter()
+        now = time.time()
+        try:
+            with self.conn:
+                # 複数プロセスが同時に終了しても通し番号が重ならないよう、書き込みロックを取ってから採番する
+                self.conn.execute('BEGIN IMMEDIATE')
+                row = self.conn.execute('SELECT last_seq FROM sequence WHERE id = 1').fetchone()
+                first_seq = (row[0] if row else 0) + 1
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO sequence (id, last_seq) VALUES (1, ?)', (first_seq + total - 1,)
+                )
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO main.showings (detail_url, theater_id, film_id, hashes)'
+                    ' SELECT detail_url, theater_id, film_id, hashes FROM updates'
+                )
+                if removed:
+                    self.conn.execute(f'DELETE FROM main.showings WHERE {_REMOVED_CONDITION}')
+
+                tmp_path = self.path.with_name(self.path.name + '.tmp')
+                with open(self.spool_path, 'rb') as spool, open(tmp_path, 'wb') as f:
+                    for seq, line in enumerate(spool, first_seq):
+                        f.write(encode_json({'seq': seq, 'at': now, **json.loads(line)}))
+                        f.write(b'\n')
+                os.replace(tmp_path, self.path)
+        finally:
+            self.spool_path.unlink(missing_ok=True)
+        return self.counts
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+            self.spool_path.unlink(missing_ok=True)
+        self.conn.close()
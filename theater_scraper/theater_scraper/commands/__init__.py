@@ -0,0 +1,3 @@
+# This package will contain the custom scrapy commands of the project
+#
+# Commands are registered through the COMMANDS_MODULE setting.
@@ -0,0 +1,72 @@
+"""
+scrapy daemon コマンド
+
+1つのreactorを起動したまま、CRAWL_SCHEDULESに従ってクロールを繰り返す
+"""
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.reactor import install_reactor
+
+from theater_scraper.daemon import CrawlDaemon, build_schedule
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [spider ...]"
+
+    def short_desc(self):
+        return "Run scheduled crawls in a long-lived process"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--health-port", type=int, default=None,
+            help="serve run health as JSON on this port (defaults to DAEMON_HEALTH_PORT)",
+        )
+        parser.add_argument(
+            "--health-file", metavar="FILE", default=None,
+            help="write run health to FILE after each crawl (defaults to DAEMON_HEALTH_FILE)",
+        )
+        parser.add_argument(
+            "--no-initial-run", action="store_true",
+            help="wait for the first scheduled time instead of crawling immediately",
+        )
+
+    def run(self, args, opts):
+        configured = self.settings.getdict('CRAWL_SCHEDULES')
+        default_schedule = self.settings.get('CRAWL_DEFAULT_SCHEDULE')
+        available = self.crawler_process.spider_loader.list()
+        spider_names = args or sorted(configured) or sorted(available)
+        unknown = [name for name in spider_names if name not in available]
+        if unknown:
+            raise UsageError(f"Unknown spider: {', '.join(unknown)}", print_help=False)
+
+        schedules = {}
+        for name in spider_names:
+            config = configured.get(name, default_schedule)
+            if config is None:
+                raise UsageError(f"No schedule configured for spider: {name}", print_help=False)
+            try:
+                schedules[name] = build_schedule(config)
+            except ValueError as e:
+                raise UsageError(f"Invalid schedule for {name}: {e}", print_help=False)
+
+        # ヘルス用のHTTPサーバーとスケジューラがreactorを使うため、先に設定どおりのreactorを用意する
+        install_reactor(self.settings['TWISTED_REACTOR'], self.settings['ASYNCIO_EVENT_LOOP'])
+
+        daemon = CrawlDaemon(
+            self.crawler_process,
+            schedules,
+            health_file=opts.health_file or self.settings.get('DAEMON_HEALTH_FILE'),
+            run_on_start=not opts.no_initial_run,
+        )
+        health_port = opts.health_port or self.settings.getint('DAEMON_HEALTH_PORT')
+        if health_port:
+            daemon.listen_health(health_port)
+        daemon.start()
+
+        # 全クロール終了後もreactorを止めずに次のスケジュールを待つ
+        self.crawler_process.start(stop_after_crawl=False)
@@ -0,0 +1,109 @@
+"""
+scrapy jobs コマンド
+
+JOBS_DIR 配下のジョブディレクトリ（JOBDIR）を一覧・確認・削除する
+"""
+
+import json
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from theater_scraper.jobstate import describe_job
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[list | show <job> | clean (job ... | --all | --older-than DAYS)] [options]"
+
+    def short_desc(self):
+        return "Inspect and clean up saved crawl job state"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--jobs-dir", metavar="DIR", default=None,
+            help="directory holding job directories (defaults to JOBS_DIR)",
+        )
+        parser.add_argument(
+            "--older-than", type=float, metavar="DAYS", default=None,
+            help="with clean, only remove jobs not modified for DAYS days",
+        )
+        parser.add_argument(
+            "--all", action="store_true",
+            help="with clean and no job names, remove every job (including running ones)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="with clean, only print what would be removed",
+        )
+
+    def _jobs(self, jobs_dir):
+        if not jobs_dir.is_dir():
+            return []
+        return sorted(p for p in jobs_dir.iterdir() if p.is_dir())
+
+    def _job(self, jobs_dir, name):
+        """jobs_dir直下のジョブディレクトリ（.. などで jobs_dir の外を指す名前は受け付けない）"""
+        job = jobs_dir / name
+        if job.resolve().parent != jobs_dir.resolve():
+            raise UsageError(f"Job name must be a directory directly under {jobs_dir}: {name}", print_help=False)
+        return job
+
+    def run(self, args, opts):
+        jobs_dir = Path(opts.jobs_dir or self.settings.get('JOBS_DIR', 'jobs'))
+        action = args[0] if args else 'list'
+        names = args[1:]
+
+        if action == 'list':
+            jobs = self._jobs(jobs_dir)
+            if not jobs:
+                print(f"No jobs in {jobs_dir}")
+                return
+            print(f"{'JOB':<32} {'MODIFIED':<19} {'SIZE':>10} {'SEEN':>7} {'QUEUED':>7} {'ITEMS':>6} {'TMDB':>6}")
+            for job in jobs:
+                info = describe_job(job)
+                modified = datetime.fromtimestamp(info['modified_at']).strftime('%Y-%m-%d %H:%M:%S')
+                queued = '-' if info['pending_requests'] is None else info['pending_requests']
+                print(
+                    f"{job.name:<32} {modified:<19} {info['size_bytes']:>10} "
+                    f"{info['seen_requests']:>7} {queued:>7} {info['pending_items']:>6} {info['tmdb_search']:>6}"
+                )
+        elif action == 'show':
+            if len(names) != 1:
+                raise UsageError("show requires exactly one job name")
+            job = self._job(jobs_dir, names[0])
+            if not job.is_dir():
+                raise UsageError(f"No such job: {job}", print_help=False)
+            info = describe_job(job)
+            info['modified_at'] = datetime.fromtimestamp(info['modified_at']).isoformat()
+            spider_state = job / 'spider.state'
+            info['has_spider_state'] = spider_state.exists()
+            print(json.dumps(info, ensure_ascii=False, indent=2))
+        elif action == 'clean':
+            if not names and not opts.all and opts.older_than is None:
+                raise UsageError("clean requires job names, --all or --older-than")
+            jobs = [self._job(jobs_dir, name) for name in names] if names else self._jobs(jobs_dir)
+            cutoff = time.time() - opts.older_than * 86400 if opts.older_than is not None else None
+            removed = 0
+            for job in jobs:
+                if not job.is_dir():
+                    print(f"skip (not found): {job}")
+                    continue
+                info = describe_job(job)
+                if cutoff is not None and info['modified_at'] > cutoff:
+                    continue
+                print(f"{'would remove' if opts.dry_run else 'remove'}: {job} ({info['size_bytes']} bytes)")
+                if not opts.dry_run:
+                    shutil.rmtree(job)
+                removed += 1
+            print(f"{removed} job(s) {'matched' if opts.dry_run else 'removed'}")
+        else:
+            raise UsageError(f"Unknown action: {action}")
@@ -0,0 +1,129 @@
+"""
+scrapy moviecodec コマンド
+
+MovieTableの保存済みレコードの形式（MOVIE_CODEC）ごとの件数・サイズを表示し、
+レコードを指定した形式に変換して書き直す
+"""
+
+import math
+import time
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from theater_scraper import resources
+from theater_scraper.movie_codec import (
+    CODECS,
+    COMPRESSIONS,
+    decode_movie,
+    encode_movie,
+    is_compact,
+    item_size,
+)
+
+MOVIE_TABLE = 'MovieTable'
+
+
+def _scan(table):
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _units(size, unit):
+    return max(1, math.ceil(size / unit))
+
+
+class _Totals:
+    """レコードの件数・合計サイズ・書き込み（1KB）/読み込み（4KB）ユニット"""
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.write_units = 0
+        self.read_units = 0
+
+    def add(self, record):
+        size = item_size(record)
+        self.count += 1
+        self.bytes += size
+        self.write_units += _units(size, 1024)
+        self.read_units += _units(size, 4096)
+
+    def row(self, label):
+        per_item = self.bytes / self.count if self.count else 0
+        return (f"{label:<10} {self.count:>8} {self.bytes:>12} {per_item:>10.1f} "
+                f"{self.write_units:>8} {self.read_units:>8}")
+
+
+HEADER = f"{'':<10} {'ITEMS':>8} {'BYTES':>12} {'BYTES/ITEM':>10} {'WCU':>8} {'RCU':>8}"
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[stats | migrate] [options]"
+
+    def short_desc(self):
+        return "Inspect or convert the storage format of MovieTable records"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--to", choices=CODECS, default='compact',
+            help="with migrate, target format (default: compact)",
+        )
+        parser.add_argument(
+            "--compression", choices=COMPRESSIONS, default=None,
+            help="with migrate, synopsis compression (defaults to MOVIE_CODEC_COMPRESSION)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="with migrate, only report the size before and after",
+        )
+
+    def run(self, args, opts):
+        action = args[0] if args else 'stats'
+        dynamodb = resources.get_dynamodb_resource(self.settings.get('DYNAMODB_ENDPOINT'))
+        table = dynamodb.Table(MOVIE_TABLE)
+
+        if action == 'stats':
+            totals = {codec: _Totals() for codec in CODECS}
+            for record in _scan(table):
+                totals['compact' if is_compact(record) else 'plain'].add(record)
+            print(HEADER)
+            for codec in CODECS:
+                print(totals[codec].row(codec))
+        elif action == 'migrate':
+            target = opts.to
+            compression = opts.compression or self.settings.get('MOVIE_CODEC_COMPRESSION', 'zlib')
+            started = time.perf_counter()
+            before, after = _Totals(), _Totals()
+            rewritten = 0
+            # batch_writerは25件ずつBatchWriteItemで書き込む
+            with table.batch_writer() as batch:
+                for record in _scan(table):
+                    converted = decode_movie(record)
+                    if target == 'compact':
+                        converted = encode_movie(converted, compression)
+                    before.add(record)
+                    after.add(converted)
+                    if converted == record:
+                        continue
+                    rewritten += 1
+                    if not opts.dry_run:
+                        batch.put_item(Item=converted)
+            print(HEADER)
+            print(before.row('before'))
+            print(after.row('after'))
+            verb = 'would be rewritten' if opts.dry_run else 'rewritten'
+            print(f"{rewritten} of {before.count} records {verb} as {target} "
+                  f"in {time.perf_counter() - started:.2f}s")
+        else:
+            raise UsageError(f"Unknown action: {action}")
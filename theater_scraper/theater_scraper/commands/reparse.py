@@ -0,0 +1,90 @@
+"""
+scrapy reparse コマンド
+
+アーカイブしたレスポンスをネットワークを使わずにスパイダーのコールバックと
+パイプラインへ流し直す。詳細ページはシャードに分けて複数プロセスで処理する。
+"""
+
+import os
+
+from scrapy.exceptions import UsageError
+
+from theater_scraper import resources
+from theater_scraper.archive import ArchiveIndex, find_archive_files
+from theater_scraper.commands.multicrawl import Command as MulticrawlCommand
+from theater_scraper.runner import build_jobs, run_multicrawl, write_report
+
+
+def replaying_tmdb_cassette():
+    """TMDB_CASSETTE が再生モードで指定されているか（TMDbへのリクエストがネットワークへ出ないか）"""
+    resources.load_env()
+    return bool(os.getenv('TMDB_CASSETTE')) and os.getenv('TMDB_CASSETTE_MODE', 'replay') == 'replay'
+
+# オフライン再処理ではダウンロード待ちを一切行わず、TMDb APIとポスター画像の取得も行わない
+# （TMDB_CASSETTE の再生時のみTMDbを有効にする。-s TMDB_ENABLED=True で明示的に有効にもできる）
+OFFLINE_SETTINGS = {
+    'TMDB_ENABLED': False,
+    'POSTERS_ENABLED': False,
+    'ARCHIVE_ENABLED': False,
+    'ROBOTSTXT_OBEY': False,
+    'DOWNLOAD_DELAY': 0,
+    'RANDOMIZE_DOWNLOAD_DELAY': False,
+    'AUTOTHROTTLE_ENABLED': False,
+    'RETRY_ENABLED': False,
+    'HTTPCACHE_ENABLED': False,
+    'CONCURRENT_REQUESTS': 64,
+    'CONCURRENT_REQUESTS_PER_DOMAIN': 64,
+}
+
+
+class Command(MulticrawlCommand):
+
+    def syntax(self):
+        return "[options] <archive file or directory> ..."
+
+    def short_desc(self):
+        return "Re-run spider callbacks and pipelines over archived responses"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--spider", action="append", default=[], dest="spiders",
+            help="spider to re-parse (defaults to every spider found in the archive)",
+        )
+
+    def run(self, args, opts):
+        if not args:
+            raise UsageError("At least one archive file or directory is required")
+        files = find_archive_files(args)
+        if not files:
+            raise UsageError(f"No archive files found in: {', '.join(args)}", print_help=False)
+
+        index = ArchiveIndex(files)
+        spider_names = opts.spiders or index.spiders()
+        processes = opts.processes or self.settings.getint('MULTICRAWL_PROCESSES') or os.cpu_count()
+        report_file = opts.report or self.settings.get('MULTICRAWL_REPORT_FILE')
+        print(f"reparse: {len(index)} urls in {len(files)} files, spiders: {', '.join(spider_names)}")
+
+        overrides = dict(OFFLINE_SETTINGS)
+        if replaying_tmdb_cassette():
+            overrides['TMDB_ENABLED'] = True
+        overrides.update(self._settings_overrides())
+        overrides['ARCHIVE_REPLAY'] = ','.join(str(f) for f in files)
+
+        # 詳細ページをプロセス数分のシャードに分けて並列処理する
+        shard_count = opts.shards or processes
+        jobs = build_jobs(spider_names, shard_count=shard_count, spider_args=opts.spargs)
+        report = run_multicrawl(jobs, settings_overrides=overrides, processes=processes)
+        write_report(report, report_file)
+
+        stats = report['stats']
+        print(
+            f"reparse: items={stats.get('item_scraped_count', 0)} "
+            f"replayed={stats.get('archive/replay/hits', 0)} "
+            f"missing={stats.get('archive/replay/missing', 0)} "
+            f"elapsed={stats['multicrawl/elapsed_time_seconds']:.1f}s"
+        )
+        print(f"reparse: report written to {report_file}")
+
+        if report['failures']:
+            self.exitcode = 1
@@ -0,0 +1,108 @@
+"""
+scrapy searchindex コマンド
+
+全文検索インデックス（SEARCH_INDEX_DIR）をDynamoDBの保存済みデータから作り直し、
+インデックスを使って作品を検索する
+"""
+
+import time
+from pathlib import Path
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from theater_scraper import resources
+from theater_scraper.films import FILM_TABLE, SHOWING_TABLE
+from theater_scraper.movie_codec import decode_movie, projection
+from theater_scraper.search_index import (
+    DOCS_FILE,
+    FIELD_WEIGHTS,
+    INDEX_FILE,
+    DocumentStore,
+    SearchIndex,
+    write_index,
+)
+
+
+def _scan(table, projection):
+    kwargs = {'ProjectionExpression': projection}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def load_documents(dynamodb, movie_storage='legacy'):
+    """DynamoDBから {detail_url: {属性: 値}} を読み込む"""
+    fields = [name for name, _ in FIELD_WEIGHTS]
+    if movie_storage == 'legacy':
+        return {
+            record['detail_url']: {name: record.get(name) for name in fields}
+            for record in map(decode_movie, _scan(dynamodb.Table('MovieTable'), projection(['detail_url', *fields])))
+        }
+    films = {
+        record['film_id']: {name: record.get(name) for name in fields}
+        for record in _scan(dynamodb.Table(FILM_TABLE), ', '.join(['film_id', *fields]))
+    }
+    return {
+        showing['detail_url']: films[showing['film_id']]
+        for showing in _scan(dynamodb.Table(SHOWING_TABLE), 'detail_url, film_id')
+        if showing['film_id'] in films
+    }
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[build | query <text>] [options]"
+
+    def short_desc(self):
+        return "Rebuild or query the full-text search index"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--index-dir", metavar="DIR", default=None,
+            help="directory holding the search index (defaults to SEARCH_INDEX_DIR)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20,
+            help="with query, maximum number of results",
+        )
+
+    def run(self, args, opts):
+        index_dir = Path(opts.index_dir or self.settings.get('SEARCH_INDEX_DIR', 'search'))
+        action = args[0] if args else 'query'
+
+        if action == 'build':
+            started = time.perf_counter()
+            dynamodb = resources.get_dynamodb_resource(self.settings.get('DYNAMODB_ENDPOINT'))
+            documents = load_documents(dynamodb, self.settings.get('MOVIE_STORAGE', 'legacy'))
+            store = DocumentStore(index_dir / DOCS_FILE)
+            try:
+                changed = store.replace_all(documents)
+                total = write_index(index_dir / INDEX_FILE, store)
+            finally:
+                store.close()
+            print(f"{total} documents indexed ({changed} changed) in {time.perf_counter() - started:.2f}s")
+        elif action == 'query':
+            query = ' '.join(args[1:])
+            if not query:
+                raise UsageError("query requires search text")
+            index_path = index_dir / INDEX_FILE
+            if not index_path.exists():
+                raise UsageError(f"No search index: {index_path} (run 'scrapy searchindex build')",
+                                 print_help=False)
+            with SearchIndex(index_path) as index:
+                started = time.perf_counter()
+                results = index.rank(query, opts.limit)
+                elapsed = time.perf_counter() - started
+            for detail_url, score in results:
+                print(f"{score:8.2f}  {detail_url}")
+            print(f"{len(results)} results ({elapsed * 1000:.3f} ms, {len(index)} documents)")
+        else:
+            raise UsageError(f"Unknown action: {action}")
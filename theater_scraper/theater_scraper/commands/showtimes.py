@@ -0,0 +1,68 @@
+"""
+scrapy showtimes コマンド
+
+指定した時間帯に始まる上映回をShowtimeTableから検索する
+（映画館を指定した場合は映画館ごと、指定しない場合は日付ごとに1回のクエリ）
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from theater_scraper import resources
+from theater_scraper.showtimes import showtimes_between, showtimes_starting
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "List showtimes starting within a time window"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--theater", metavar="THEATER_ID", action="append", default=[],
+            help="only this theater (can be repeated; defaults to all theaters)",
+        )
+        parser.add_argument(
+            "--from", dest="start", metavar="DATETIME", default=None,
+            help="start of the window in theater local time, e.g. 2025-06-20T18:00 (defaults to now)",
+        )
+        parser.add_argument(
+            "--within", type=int, metavar="MINUTES", default=60,
+            help="length of the window in minutes (default: 60)",
+        )
+
+    def run(self, args, opts):
+        try:
+            start = datetime.fromisoformat(opts.start) if opts.start else datetime.now()
+        except ValueError:
+            raise UsageError(f"Invalid --from: {opts.start}")
+        end = start + timedelta(minutes=opts.within)
+        dynamodb = resources.get_dynamodb_resource(self.settings.get('DYNAMODB_ENDPOINT'))
+
+        started = time.perf_counter()
+        if opts.theater:
+            showtimes = [
+                showtime
+                for theater_id in opts.theater
+                for showtime in showtimes_between(dynamodb, theater_id, start, end)
+            ]
+        else:
+            showtimes = showtimes_starting(dynamodb, start, end)
+        elapsed = time.perf_counter() - started
+
+        showtimes.sort(key=lambda showtime: (showtime['starts_at'], showtime['theater_id']))
+        for showtime in showtimes:
+            ends_at = showtime.get('ends_at', '')[11:]
+            print(f"{showtime['starts_at']}-{ends_at:<5}  {showtime['theater_id']:<20} "
+                  f"{showtime.get('screen') or '':<10} {showtime.get('title') or ''}  {showtime['detail_url']}")
+        print(f"{len(showtimes)} showtimes between {start:%Y-%m-%d %H:%M} and {end:%Y-%m-%d %H:%M} "
+              f"({elapsed * 1000:.1f} ms)")
@@ -0,0 +1,268 @@
+"""
+常駐型のクロールデーモン
+
+1つのreactor上でCrawlerRunnerを使い、映画館（スパイダー）ごとに
+interval（秒）またはcron式のスケジュールでクロールを繰り返す。
+TMDbセッション・キャッシュとDynamoDB接続は resources モジュールで
+プロセス内に保持されるため、2回目以降のクロールは起動コストがかからない。
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_cron_field(field, minimum, maximum):
+    """cronの1フィールド（*, */n, a-b, a-b/n, カンマ区切り）を値の集合に変換"""
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+        if part == '*':
+            start, end = minimum, maximum
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+        if start < minimum or end > maximum or start > end or step < 1:
+            raise ValueError(f"cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """5フィールドのcron式（分 時 日 月 曜日）によるスケジュール"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression must have 5 fields: {expression}")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        # 曜日は0と7を日曜日として扱う
+        self.weekdays = {d % 7 for d in _parse_cron_field(fields[4], 0, 7)}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        # Pythonのweekday()は月曜=0、cronは日曜=0
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_run(self, now):
+        """now より後の次回実行時刻"""
+        dt = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"cron expression never matches: {self.expression}")
+
+    def __repr__(self):
+        return f"cron({self.expression})"
+
+
+class IntervalSchedule:
+    """一定間隔（秒）のスケジュール"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        self.seconds = seconds
+
+    def next_run(self, now):
+        return now + timedelta(seconds=self.seconds)
+
+    def __repr__(self):
+        return f"every {self.seconds}s"
+
+
+def build_schedule(config):
+    """CRAWL_SCHEDULESの設定値からスケジュールを作成
+
+    {"interval": 秒} または {"cron": "*/30 * * * *"} を受け付ける。
+    数値・文字列だけの場合はそれぞれintervalとcronとして扱う。
+    """
+    if isinstance(config, (int, float)):
+        return IntervalSchedule(config)
+    if isinstance(config, str):
+        return CronSchedule(config)
+    if 'cron' in config:
+        return CronSchedule(config['cron'])
+    if 'interval' in config:
+        return IntervalSchedule(float(config['interval']))
+    raise ValueError(f"invalid schedule: {config}")
+
+
+class CrawlDaemon:
+    """スケジュールに従ってクロールを繰り返す常駐プロセス"""
+
+    def __init__(self, runner, schedules, health_file=None, run_on_start=True):
+        self.runner = runner
+        self.schedules = schedules
+        self.health_file = health_file
+        self.run_on_start = run_on_start
+        self.started_at = datetime.now()
+        self.health = {
+            name: {
+                'schedule': repr(schedule),
+                'running': False,
+                'runs': 0,
+                'failures': 0,
+                'consecutive_failures': 0,
+                'skipped_overlaps': 0,
+                'last_started': None,
+                'last_finished': None,
+                'last_duration_seconds': None,
+                'last_finish_reason': None,
+                'last_item_count': None,
+                'last_error_count': None,
+                'last_error': None,
+                'next_run': None,
+            }
+            for name, schedule in schedules.items()
+        }
+
+    def start(self):
+        """全映画館のスケジュールを登録（reactorは呼び出し側で起動する）"""
+        for name in self.schedules:
+            if self.run_on_start:
+                self._call_later(name, 0)
+            else:
+                self._schedule_next(name)
+
+    def _call_later(self, name, delay):
+        from twisted.internet import reactor
+
+        self.health[name]['next_run'] = (datetime.now() + timedelta(seconds=delay)).isoformat()
+        reactor.callLater(delay, self._run, name)
+
+    def _schedule_next(self, name):
+        now = datetime.now()
+        next_run = self.schedules[name].next_run(now)
+        self._call_later(name, max(0.0, (next_run - now).total_seconds()))
+
+    def _run(self, name):
+        health = self.health[name]
+        if health['running']:
+            # 前回のクロールが終わっていない場合は重複起動しない
+            health['skipped_overlaps'] += 1
+            logger.warning(f"前回のクロールが実行中のためスキップ: {name}")
+            self._schedule_next(name)
+            return
+
+        health['running'] = True
+        health['last_started'] = datetime.now().isoformat()
+        started = time.monotonic()
+        logger.info(f"クロール開始: {name}")
+
+        crawler = None
+        try:
+            crawler = self.runner.create_crawler(name)
+            deferred = self.runner.crawl(crawler)
+        except Exception:
+            # スパイダーが読み込めない・設定が不正な場合も失敗として記録し、次回を予約する
+            from twisted.python.failure import Failure
+
+            logger.exception(f"クロールを開始できませんでした: {name}")
+            self._finished(Failure(), name, crawler, started)
+            return
+        deferred.addBoth(self._finished, name, crawler, started)
+
+    def _finished(self, result, name, crawler, started):
+        health = self.health[name]
+        stats = crawler.stats.get_stats() if crawler is not None and crawler.stats else {}
+        failed = hasattr(result, 'getErrorMessage') or stats.get('finish_reason') != 'finished'
+
+        health['running'] = False
+        health['runs'] += 1
+        health['last_finished'] = datetime.now().isoformat()
+        health['last_duration_seconds'] = round(time.monotonic() - started, 3)
+        health['last_finish_reason'] = stats.get('finish_reason')
+        health['last_item_count'] = stats.get('item_scraped_count', 0)
+        health['last_error_count'] = stats.get('log_count/ERROR', 0)
+        if failed:
+            health['failures'] += 1
+            health['consecutive_failures'] += 1
+            health['last_error'] = (
+                result.getErrorMessage() if hasattr(result, 'getErrorMessage')
+                else f"finish_reason: {stats.get('finish_reason')}"
+            )
+        else:
+            health['consecutive_failures'] = 0
+            health['last_error'] = None
+
+        logger.info(
+            f"クロール終了: {name} ({health['last_finish_reason']}, "
+            f"items={health['last_item_count']}, {health['last_duration_seconds']}s)"
+        )
+        self._schedule_next(name)
+        self.write_health()
+
+    def snapshot(self):
+        """現在のヘルス情報"""
+        return {
+            'status': 'degraded' if any(
+                h['consecutive_failures'] for h in self.health.values()
+            ) else 'ok',
+            'pid': os.getpid(),
+            'started_at': self.started_at.isoformat(),
+            'theaters': self.health,
+        }
+
+    def write_health(self):
+        """ヘルス情報をファイルに書き出す（一時ファイル経由で置き換え）"""
+        if not self.health_file:
+            return
+        path = Path(self.health_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def listen_health(self, port, interface='127.0.0.1'):
+        """ヘルス情報をHTTP（GET /health）で公開する"""
+        from twisted.internet import reactor
+        from twisted.web.resource import Resource
+        from twisted.web.server import Site
+
+        daemon = self
+
+        class HealthResource(Resource):
+            isLeaf = True
+
+            def render_GET(self, request):
+                snapshot = daemon.snapshot()
+                request.setHeader(b'content-type', b'application/json; charset=utf-8')
+                if snapshot['status'] != 'ok':
+                    request.setResponseCode(503)
+                return json.dumps(snapshot, ensure_ascii=False).encode('utf-8')
+
+        root = Resource()
+        root.putChild(b'health', HealthResource())
+        return reactor.listenTCP(port, Site(root), interface=interface)
@@ -0,0 +1,125 @@
+"""
+映画詳細ページの抽出処理
+
+XPathと正規表現はモジュール読み込み時にコンパイルしておき、
+lxmlの要素ツリーを1回走査する間にタイトル・dlの項目・公式サイト・あらすじ・
+スケジュール表を集める。dl・.module-text・.module-schedule の内側はコンパイル済みXPathで参照する。
+"""
+
+import re
+
+from lxml import etree
+
+YEAR_PATTERN = re.compile(r'(\d{4})年')
+
+# あらすじから除外するテキスト（上映期間やスタッフ情報）
+SYNOPSIS_EXCLUDE_KEYWORDS = ('上映期間:', '上映時間:', '©', '(C)')
+
+SYNOPSIS_MAX_LENGTH = 200
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_DT_BOLD_TEXT = etree.XPath('.//dt//b/text()')
+_DT_TEXT = etree.XPath('.//dt/text()')
+_DD_P_TEXT = etree.XPath('.//dd//p/text()')
+_DD_TEXT = etree.XPath('.//dd/text()')
+_OFFICIAL_HREF = etree.XPath('.//dt[contains(text(), "公式HP")]/following-sibling::dd//a/@href')
+_H1_BOLD_TEXT = etree.XPath('.//b/text()')
+_META_TEXT = etree.XPath(f"descendant-or-self::*[{_has_class('text')} and {_has_class('is-meta')}]")
+_TEXT_PARAGRAPHS = etree.XPath(f"descendant-or-self::*[{_has_class('text')}]//p")
+_PARAGRAPH_TEXT = etree.XPath('descendant-or-self::text()')
+_SCHEDULE_ROWS = etree.XPath('.//tr')
+_ROW_LABEL = etree.XPath('string(th)')
+_ROW_CELLS = etree.XPath('td')
+# 抽出対象の要素（h1, dl, .module-text, .module-schedule）を文書順に返す
+_TARGET_ELEMENTS = etree.XPath(
+    f"//h1 | //dl | //*[{_has_class('module-text')}] | //*[{_has_class('module-schedule')}]"
+)
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def _own_text(element):
+    """要素直下の最初のテキストノード（::text 相当）"""
+    if element.text is not None:
+        return element.text
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+def extract_movie_detail(root):
+    """詳細ページのlxmlツリーから映画情報を抽出
+
+    Returns:
+        title, movie_info, official_website, release_year, synopsis, showing_period,
+        schedule（[(日付のテキスト, [セルのテキスト, ...]), ...]）を持つdict
+        （タイトルが無い場合はtitleがNone）
+    """
+    bold_title = None
+    plain_title = None
+    movie_info = {}
+    official_link = None
+    synopsis_texts = []
+    schedule = []
+
+    # 対象要素を文書順に1回だけ走査する（走査自体はlxml側で行う）
+    for element in _TARGET_ELEMENTS(root):
+        tag = element.tag
+        if tag == 'h1':
+            if bold_title is None:
+                bold_title = _first(_H1_BOLD_TEXT(element))
+            if plain_title is None:
+                plain_title = _own_text(element)
+        elif tag == 'dl':
+            dt_text = _first(_DT_BOLD_TEXT(element)) or _first(_DT_TEXT(element))
+            dd_text = _first(_DD_P_TEXT(element)) or _first(_DD_TEXT(element))
+            if dt_text and dd_text:
+                movie_info[dt_text.strip()] = dd_text.strip()
+            if official_link is None:
+                official_link = _first(_OFFICIAL_HREF(element))
+        elif 'module-schedule' in (element.get('class') or '').split():
+            for row in _SCHEDULE_ROWS(element):
+                cells = [cell.text_content().strip() for cell in _ROW_CELLS(row)]
+                if cells:
+                    schedule.append((_ROW_LABEL(row).strip(), cells))
+        else:
+            # .module-text（.is-metaクラスを持つブロックはスキップ）
+            if _META_TEXT(element):
+                continue
+            for p in _TEXT_PARAGRAPHS(element):
+                # 段落内の最初のテキストノード（<span>・<a> で始まる段落も含む）
+                text = _first(_PARAGRAPH_TEXT(p))
+                if text and text.strip():
+                    if not any(keyword in text for keyword in SYNOPSIS_EXCLUDE_KEYWORDS):
+                        synopsis_texts.append(text.strip())
+
+    title = bold_title or plain_title
+
+    official_website = official_link if '公式HP' in movie_info else None
+
+    release_year = None
+    if '制作年／制作国' in movie_info:
+        year_match = YEAR_PATTERN.search(movie_info['制作年／制作国'])
+        if year_match:
+            release_year = int(year_match.group(1))
+
+    synopsis = ' '.join(synopsis_texts)
+    if len(synopsis) > SYNOPSIS_MAX_LENGTH:
+        synopsis = synopsis[:SYNOPSIS_MAX_LENGTH] + "..."
+
+    return {
+        'title': title,
+        'movie_info': movie_info,
+        'official_website': official_website,
+        'release_year': release_year,
+        'synopsis': synopsis,
+        'showing_period': movie_info.get('上映期間', ''),
+        'schedule': schedule,
+    }
@@ -0,0 +1,261 @@
+"""
+静的JSONフィード
+
+映画館ごとの上映中作品（theaters/<theater_id>.json）と、全映画館の作品一覧（films.json）を
+CDNにそのまま置ける静的ファイルとして書き出す。各ファイルはgzip（.json.gz）と、
+brotliがインストールされている場合はbrotli（.json.br）で圧縮したものも作成する。
+
+    <STATIC_FEED_DIR>/
+        manifest.json               シャードごとのSHA-256・サイズ・更新日時
+        films.json(.gz/.br)         全映画館の作品一覧（作品ごとに上映している映画館）
+        theaters/<theater_id>.json(.gz/.br)
+
+内容のSHA-256がmanifest.jsonと同じシャードは書き換えないため、書き出しの時間とCDNの
+キャッシュ無効化は変更のあった映画館の数だけに比例する。フィードにはクロールのたびに変わる
+日時を含めない。ファイルは一時ファイルに書いてから置き換える。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # orjsonはオプション
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotliはオプション
+    brotli = None
+
+from theater_scraper.films import FILM_TABLE, SHOWING_TABLE, film_id_for
+from theater_scraper.movie_codec import decode_movie
+
+MANIFEST_FILE = 'manifest.json'
+GLOBAL_SHARD = 'films'
+THEATER_SHARD_PREFIX = 'theaters/'
+
+# フィードに含める作品の属性
+FEED_FILM_ATTRIBUTES = (
+    'title',
+    'original_title',
+    'release_year',
+    'synopsis',
+    'official_website',
+    'tmdb_id',
+    'tmdb_poster_path',
+    'poster_file',
+)
+
+
+def theater_shard(theater_id):
+    return f"{THEATER_SHARD_PREFIX}{theater_id}"
+
+
+def _plain(value):
+    """DynamoDBの値（Decimal・set）をJSONに変換できる型にする"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(_plain(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def encode_json(data):
+    """キーを整列したコンパクトなJSON（orjsonがあれば使う）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def feed_film(record):
+    """FilmTable（またはMovieTable）のレコードからフィードの作品を作成"""
+    film = {
+        name: _plain(record[name])
+        for name in FEED_FILM_ATTRIBUTES
+        if record.get(name) not in (None, '')
+    }
+    if record.get('tmdb_details'):
+        film['details'] = json.loads(record['tmdb_details'])
+    return film
+
+
+def _query_theater(table, theater_id):
+    kwargs = {
+        'IndexName': 'theater_id-index',
+        'KeyConditionExpression': 'theater_id = :theater_id',
+        'ExpressionAttributeValues': {':theater_id': theater_id},
+    }
+    while True:
+        response = table.query(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _is_current(record, max_age, now):
+    """最終更新から max_age 秒以内の上映か（max_ageが0なら全て）"""
+    if not max_age:
+        return True
+    try:
+        return now - datetime.fromisoformat(record.get('updated_at')) <= timedelta(seconds=max_age)
+    except (TypeError, ValueError):
+        return False
+
+
+def load_theater_feed(dynamodb, theater_id, movie_storage='legacy', max_age=0, film_cache=None):
+    """映画館のシャードの内容をDynamoDBから作成
+
+    film_cache に {film_id: FilmTableのレコード} を渡すと、映画館をまたいで同じ作品の取得を省く。
+    """
+    now = datetime.now()
+    film_cache = {} if film_cache is None else film_cache
+    theater = dynamodb.Table('TheaterTable').get_item(Key={'theater_id': theater_id}).get('Item') or {}
+
+    films = []
+    if movie_storage == 'legacy':
+        for record in map(decode_movie, _query_theater(dynamodb.Table('MovieTable'), theater_id)):
+            if not _is_current(record, max_age, now):
+                continue
+            film = feed_film(record)
+            film['film_id'] = film_id_for(record.get('tmdb_id'), record.get('title'), record.get('release_year'))
+            film['detail_url'] = record['detail_url']
+            films.append(film)
+    else:
+        film_table = dynamodb.Table(FILM_TABLE)
+        for showing in _query_theater(dynamodb.Table(SHOWING_TABLE), theater_id):
+            if not _is_current(showing, max_age, now):
+                continue
+            film_id = showing['film_id']
+            if film_id not in film_cache:
+                film_cache[film_id] = film_table.get_item(Key={'film_id': film_id}).get('Item')
+            if film_cache[film_id] is None:
+                continue
+            film = feed_film(film_cache[film_id])
+            film['film_id'] = film_id
+            film['detail_url'] = showing['detail_url']
+            films.append(film)
+
+    films.sort(key=lambda film: (film.get('title', ''), film['detail_url']))
+    return {
+        'theater': {
+            'theater_id': theater_id,
+            'name': theater.get('name'),
+            'official_url': theater.get('official_url'),
+        },
+        'films': films,
+    }
+
+
+def build_global_feed(theater_feeds):
+    """映画館ごとのシャードから全映画館の作品一覧を作成（作品ごとに上映している映画館を持つ）"""
+    films = {}
+    for theater_id, feed in sorted(theater_feeds.items()):
+        for film in feed['films']:
+            entry = films.get(film['film_id'])
+            if entry is None:
+                entry = {name: value for name, value in film.items() if name != 'detail_url'}
+                entry['showings'] = []
+                films[film['film_id']] = entry
+            entry['showings'].append({'theater_id': theater_id, 'detail_url': film['detail_url']})
+    return {'films': sorted(films.values(), key=lambda film: (film.get('title', ''), film['film_id']))}
+
+
+class FeedWriter:
+    """内容が変わったシャードだけを書き換えるフィードの書き出し先"""
+
+    def __init__(self, directory, compress_level=9):
+        self.directory = Path(directory)
+        self.compress_level = compress_level
+        self.shards = self._load_manifest().get('shards', {})
+        self.written = []
+        self.unchanged = []
+        self.bytes_written = 0
+
+    def _load_manifest(self):
+        path = self.directory / MANIFEST_FILE
+        if not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_bytes())
+        except ValueError:
+            return {}
+
+    def shard_path(self, name):
+        return self.directory / f"{name}.json"
+
+    def theater_ids(self):
+        """書き出し済みの映画館ID"""
+        return [
+            name[len(THEATER_SHARD_PREFIX):]
+            for name in self.shards
+            if name.startswith(THEATER_SHARD_PREFIX)
+        ]
+
+    def read(self, name):
+        """書き出し済みのシャードの内容（無ければNone）"""
+        try:
+            return json.loads(self.shard_path(name).read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def write(self, name, data):
+        """シャードを書き出す（内容が変わっていなければ何もせずFalseを返す）"""
+        body = encode_json(data)
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.shard_path(name)
+        if self.shards.get(name, {}).get('sha256') == digest and path.exists():
+            self.unchanged.append(name)
+            return False
+
+        _write_atomic(path.with_name(path.name + '.gz'), gzip.compress(body, self.compress_level, mtime=0))
+        br_path = path.with_name(path.name + '.br')
+        if brotli is not None:
+            _write_atomic(br_path, brotli.compress(body, quality=11))
+        else:
+            # 古い内容の.brが残らないようにする
+            br_path.unlink(missing_ok=True)
+        _write_atomic(path, body)
+
+        self.shards[name] = {
+            'sha256': digest,
+            'bytes': len(body),
+            'updated_at': datetime.now().isoformat(),
+        }
+        self.written.append(name)
+        self.bytes_written += len(body)
+        return True
+
+    def save_manifest(self):
+        """書き換えたシャードをmanifest.jsonに反映（他のプロセスが書き出したシャードは保持する）"""
+        if not self.written:
+            return
+        shards = self._load_manifest().get('shards', {})
+        shards.update({name: self.shards[name] for name in self.written})
+        self.shards = shards
+        manifest = {
+            'updated_at': datetime.now().isoformat(),
+            'encodings': ['gzip', 'br'] if brotli is not None else ['gzip'],
+            'shards': shards,
+        }
+        _write_atomic(
+            self.directory / MANIFEST_FILE,
+            json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'),
+        )
@@ -0,0 +1,133 @@
+"""
+映画館をまたいで共有する作品レコード
+
+同じ作品を複数の映画館が上映していても、作品情報（あらすじ・公式サイト・TMDb情報）は
+FilmTableに1件だけ保存し、映画館ごとの上映はShowingTableの軽量なレコードで作品と結び付ける。
+
+- FilmTable (PK film_id): TMDbで見つかった作品は 'tmdb:<tmdb_id>'、
+  見つからない作品は 'title:<正規化したタイトル>:<製作年>'
+- ShowingTable (PK detail_url): film_id・theater_id（それぞれGSI）・tmdb_id・日時
+
+「この作品はどこで上映しているか」はShowingTableのfilm_id-indexへの1回のクエリで引ける。
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from theater_scraper.titles import title_key
+
+FILM_TABLE = 'FilmTable'
+SHOWING_TABLE = 'ShowingTable'
+
+# FilmTableに保存する作品単位の属性
+FILM_ATTRIBUTES = (
+    'title',
+    'original_title',
+    'release_year',
+    'synopsis',
+    'official_website',
+    'tmdb_id',
+    'tmdb_poster_path',
+    'poster_file',
+    'tmdb_details',
+    'tmdb_details_fetched_at',
+)
+
+# TMDb詳細情報のうち保存する出演者・画像の件数
+DETAILS_MAX_CAST = 10
+DETAILS_MAX_IMAGES = 5
+
+
+def film_id_for(tmdb_id=None, title=None, release_year=None):
+    """作品ID（TMDb IDがあればそれを、無ければ正規化タイトルと製作年を使う）"""
+    if tmdb_id:
+        return f"tmdb:{tmdb_id}"
+    return f"title:{title_key(title)}:{release_year or ''}"
+
+
+def build_film_record(adapter, film_id, now=None):
+    """MovieItemからFilmTableのレコードを作成（値の無い属性は含めない）"""
+    record = {'film_id': film_id}
+    for name in FILM_ATTRIBUTES:
+        value = adapter.get(name)
+        if value not in (None, ''):
+            record[name] = value
+    record['updated_at'] = now or datetime.now().isoformat()
+    return record
+
+
+def build_showing_record(adapter, film_id):
+    """MovieItemからShowingTableのレコードを作成"""
+    record = {
+        'detail_url': adapter.get('detail_url'),
+        'film_id': film_id,
+        'theater_id': adapter.get('theater_id'),
+        'created_at': adapter.get('created_at'),
+        'updated_at': adapter.get('updated_at'),
+    }
+    if adapter.get('tmdb_id'):
+        record['tmdb_id'] = adapter.get('tmdb_id')
+    return record
+
+
+def film_needs_update(existing, record, stale_after, now=None):
+    """保存済みの作品レコードを書き換える必要があるか
+
+    別の映画館のページから作られた同じ作品のレコードで交互に上書きしないよう、
+    保存済みレコードに無い属性が増える場合と、保存済みレコードが古くなった場合だけ書き込む。
+    """
+    if not existing:
+        return True
+    if any(name not in existing for name in record):
+        return True
+    now = now or datetime.now()
+    try:
+        return now - datetime.fromisoformat(existing.get('updated_at')) >= timedelta(seconds=stale_after)
+    except (TypeError, ValueError):
+        return True
+
+
+def compact_details(details):
+    """TMDbの詳細情報（credits・images付き）から保存する項目だけを抜き出したJSON文字列
+
+    DynamoDBは浮動小数点数をそのまま保存できないため、JSON文字列として1属性に保存する。
+    """
+    credits = details.get('credits') or {}
+    images = details.get('images') or {}
+    data = {
+        'runtime': details.get('runtime'),
+        'genres': [genre['name'] for genre in details.get('genres') or []],
+        'release_date': details.get('release_date'),
+        'original_title': details.get('original_title'),
+        'original_language': details.get('original_language'),
+        'overview': details.get('overview'),
+        'vote_average': details.get('vote_average'),
+        'imdb_id': details.get('imdb_id'),
+        'countries': [country['iso_3166_1'] for country in details.get('production_countries') or []],
+        'directors': [person['name'] for person in credits.get('crew') or [] if person.get('job') == 'Director'],
+        'cast': [
+            [person['name'], person.get('character') or '']
+            for person in (credits.get('cast') or [])[:DETAILS_MAX_CAST]
+        ],
+        'posters': [image['file_path'] for image in (images.get('posters') or [])[:DETAILS_MAX_IMAGES]],
+        'backdrops': [image['file_path'] for image in (images.get('backdrops') or [])[:DETAILS_MAX_IMAGES]],
+    }
+    data = {key: value for key, value in data.items() if value not in (None, '', [])}
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def find_showings(dynamodb, film_id):
+    """作品を上映している映画館の上映レコード一覧"""
+    table = dynamodb.Table(SHOWING_TABLE)
+    showings = []
+    kwargs = {
+        'IndexName': 'film_id-index',
+        'KeyConditionExpression': 'film_id = :film_id',
+        'ExpressionAttributeValues': {':film_id': film_id},
+    }
+    while True:
+        response = table.query(**kwargs)
+        showings.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return showings
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -28,7 +28,31 @@ class MovieItem(scrapy.Item):
     # TMDb API関連フィールド
     tmdb_id = scrapy.Field()
     tmdb_poster_path = scrapy.Field()
+    tmdb_details = scrapy.Field()  # 詳細情報（上映時間・ジャンル・出演者・画像）のJSON文字列
+    tmdb_details_fetched_at = scrapy.Field()
+    poster_file = scrapy.Field()  # ローカルに保存したポスターのファイル名（<ハッシュの先頭2文字>/<ハッシュ>.jpg）
+    
+    # 上映回
+    showtimes_parsed = scrapy.Field()  # スケジュール表から上映回を取得したか（消えた上映回の削除判定用、DBには保存しない）
     
     # タイムスタンプ
     created_at = scrapy.Field()
     updated_at = scrapy.Field()
+
+
+class ShowtimeItem(scrapy.Item):
+    """上映回アイテム（詳細ページのスケジュール表の1コマ）"""
+    theater_id = scrapy.Field()
+    detail_url = scrapy.Field()  # 上映する作品の詳細ページ
+    title = scrapy.Field()
+    starts_at = scrapy.Field()  # 開始日時（映画館の現地時刻、'YYYY-MM-DDTHH:MM'）
+    ends_at = scrapy.Field()  # 終了日時（不明な場合はNone）
+    screen = scrapy.Field()  # スクリーン名（不明な場合はNone）
+
+
+# アイテムの種類ごとの必須フィールド（空の場合は保存しない）
+REQUIRED_FIELDS = {
+    TheaterItem: ('theater_id', 'name', 'official_url'),
+    MovieItem: ('detail_url', 'theater_id', 'title'),
+    ShowtimeItem: ('detail_url', 'theater_id', 'starts_at'),
+}
@@ -0,0 +1,196 @@
+"""
+中断・再開用のジョブ状態
+
+ScrapyのJOBDIRはリクエストキューと既読フィンガープリントを保存するが、
+TMDb APIの検索結果と、スパイダーが出力してからDynamoDBへ書き込むまでの
+アイテムは保存しない。それらを JOBDIR/jobstate.sqlite3 に保存し、再開時に使う。
+"""
+
+import json
+import sqlite3
+import struct
+import time
+from pathlib import Path
+
+from itemadapter import ItemAdapter
+
+from theater_scraper import items as item_classes
+from theater_scraper.showtimes import start_key
+from theater_scraper.titles import title_key
+
+JOBSTATE_FILENAME = 'jobstate.sqlite3'
+
+# queuelibのLifoDiskQueueのヘッダー（件数）
+_LIFO_SIZE = struct.Struct('>L')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tmdb_search (
+    key TEXT PRIMARY KEY,
+    result TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_items (
+    key TEXT PRIMARY KEY,
+    item_class TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+'''
+
+_job_states = {}
+
+
+def item_key(item):
+    """アイテムを一意に識別するキー（映画はdetail_url、映画館はtheater_id、上映回は映画館と開始日時・スクリーン・detail_url）"""
+    adapter = ItemAdapter(item)
+    if isinstance(item, item_classes.ShowtimeItem):
+        key = start_key(adapter.get('starts_at'), adapter.get('screen'), adapter.get('detail_url'))
+        return f"ShowtimeItem:{adapter.get('theater_id')}:{key}"
+    return f"{type(item).__name__}:{adapter.get('detail_url') or adapter.get('theater_id')}"
+
+
+class JobState:
+    """JOBDIR内のTMDb検索結果と未完了アイテムの保存先"""
+
+    def __init__(self, jobdir):
+        self.path = Path(jobdir) / JOBSTATE_FILENAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    # TMDb検索結果
+
+    @staticmethod
+    def _search_key(title, year):
+        return json.dumps([title_key(title), year], ensure_ascii=False, separators=(',', ':'))
+
+    def get_search(self, title, year):
+        """保存済みの検索結果を (見つかったか, 結果) で返す"""
+        row = self.conn.execute(
+            'SELECT result FROM tmdb_search WHERE key = ?', (self._search_key(title, year),)
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def put_search(self, title, year, result):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO tmdb_search (key, result, fetched_at) VALUES (?, ?, ?)',
+                (self._search_key(title, year),
+                 json.dumps(result, ensure_ascii=False, separators=(',', ':')),
+                 time.time()),
+            )
+
+    # 未完了アイテム
+
+    def add_pending(self, item):
+        data = json.dumps(ItemAdapter(item).asdict(), ensure_ascii=False, separators=(',', ':'))
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pending_items (key, item_class, data, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (item_key(item), type(item).__name__, data, time.time()),
+            )
+
+    def remove_pending(self, item):
+        with self.conn:
+            self.conn.execute('DELETE FROM pending_items WHERE key = ?', (item_key(item),))
+
+    def pending_items(self):
+        """未完了アイテムを元のItemクラスで復元して返す"""
+        rows = self.conn.execute(
+            'SELECT item_class, data FROM pending_items ORDER BY created_at'
+        ).fetchall()
+        restored = []
+        for item_class, data in rows:
+            cls = getattr(item_classes, item_class, None)
+            if cls is not None:
+                restored.append(cls(**json.loads(data)))
+        return restored
+
+    def counts(self):
+        return {
+            'tmdb_search': self.conn.execute('SELECT COUNT(*) FROM tmdb_search').fetchone()[0],
+            'pending_items': self.conn.execute('SELECT COUNT(*) FROM pending_items').fetchone()[0],
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def get_job_state(jobdir):
+    """JOBDIRごとに共有のJobStateを返す（ミドルウェアとパイプラインで共有）"""
+    key = str(Path(jobdir).resolve())
+    state = _job_states.get(key)
+    if state is None:
+        state = JobState(jobdir)
+        _job_states[key] = state
+    return state
+
+
+def close_job_state(jobdir):
+    state = _job_states.pop(str(Path(jobdir).resolve()), None)
+    if state is not None:
+        state.close()
+
+
+def describe_job(jobdir):
+    """ジョブディレクトリの概要（scrapy jobs コマンド用）"""
+    jobdir = Path(jobdir)
+    files = [p for p in jobdir.rglob('*') if p.is_file()]
+    info = {
+        'path': str(jobdir),
+        'size_bytes': sum(p.stat().st_size for p in files),
+        'modified_at': max((p.stat().st_mtime for p in files), default=jobdir.stat().st_mtime),
+        'seen_requests': 0,
+        'pending_requests': None,
+        'tmdb_search': 0,
+        'pending_items': 0,
+    }
+
+    seen_file = jobdir / 'requests.seen'
+    if seen_file.exists():
+        with open(seen_file, 'rb') as f:
+            info['seen_requests'] = sum(1 for _ in f)
+
+    queue_dir = jobdir / 'requests.queue'
+    if queue_dir.is_dir():
+        info['pending_requests'] = _count_queued_requests(queue_dir)
+
+    state_file = jobdir / JOBSTATE_FILENAME
+    if state_file.exists():
+        conn = sqlite3.connect(f"file:{state_file}?mode=ro", uri=True)
+        try:
+            info['tmdb_search'] = conn.execute('SELECT COUNT(*) FROM tmdb_search').fetchone()[0]
+            info['pending_items'] = conn.execute('SELECT COUNT(*) FROM pending_items').fetchone()[0]
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    return info
+
+
+def _count_queued_requests(queue_dir):
+    """Scrapyのディスクキューに残っているリクエスト数
+
+    LIFOキュー（既定）はファイル先頭4バイトに件数を、FIFOキューは
+    ディレクトリ内のinfo.jsonに件数を保存している。
+    """
+    total = 0
+    for path in queue_dir.rglob('*'):
+        if not path.is_file() or path.name == 'active.json':
+            continue
+        try:
+            if path.name == 'info.json':
+                total += json.loads(path.read_text()).get('size', 0)
+            elif not (path.parent / 'info.json').exists():
+                with open(path, 'rb') as f:
+                    header = f.read(_LIFO_SIZE.size)
+                if len(header) == _LIFO_SIZE.size:
+                    total += _LIFO_SIZE.unpack(header)[0]
+        except (OSError, ValueError):
+            continue
+    return total
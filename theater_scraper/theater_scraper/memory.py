@@ -0,0 +1,238 @@
+"""
+使用メモリを抑えるモードと処理段階ごとのメモリ使用量レポート
+
+MEMORY_BOUNDED = True で、映画館・作品が増えてもクロールの使用メモリがほぼ一定になるようにする。
+
+- 段階間のキュー: Scrapyのスクレイパーが同時に処理するレスポンスの合計サイズ
+  （SCRAPER_SLOT_MAX_ACTIVE_SIZE）と、1レスポンスから並行して処理するアイテム数
+  （CONCURRENT_ITEMS）を小さくし、後段のパイプラインが遅い場合は詳細ページの処理を待たせる。
+- 処理済みの集合とキャッシュ: 件数に上限（MEMORY_BOUNDED_CACHE_SIZE）を設け、古いものから忘れる。
+- クロール終了時に書き出すデータ: MEMORY_BOUNDED_BATCH_SIZE 件ごとにディスクへ書き出す。
+
+処理中のアイテム自体は scrapy.Item のままで、__slots__ や配列によるコンパクトな表現にはしない
+（パイプライン・ItemAdapter・JOBDIRのジョブ状態がItemの型とフィールドに依存するため）。
+アイテム1件の大きさは変えず、同時に処理中のアイテムの件数を上の段階間のキューで抑える。
+
+MEMORY_REPORT_ENABLED = True で、スパイダーのコールバックと各パイプラインの
+process_item / close_spider の実行中に tracemalloc で計測したメモリの増加量をstatsと
+ログ（MEMORY_REPORT_FILE 指定時はJSONファイル）に出力する。tracemallocは処理を
+数倍遅くするため、調査時のみ有効にする。
+"""
+
+import json
+import time
+import tracemalloc
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from theater_scraper.callbacks import wrap_pipeline_methods, wrap_spider_callbacks
+
+# MEMORY_BOUNDED 時にアドオンが設定するScrapyの設定（コマンドラインの -s で上書きできる）
+BOUNDED_SETTINGS = {
+    'CONCURRENT_ITEMS': 16,
+    'SCRAPER_SLOT_MAX_ACTIVE_SIZE': 1_000_000,
+}
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+
+
+def bounded_cache_size(settings):
+    """MEMORY_BOUNDED 時の処理済み集合・キャッシュの上限件数（それ以外はNone）"""
+    if not settings.getbool('MEMORY_BOUNDED'):
+        return None
+    return settings.getint('MEMORY_BOUNDED_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+
+
+def bounded_batch_size(settings):
+    """MEMORY_BOUNDED 時にディスクへ書き出す件数の単位（それ以外はNone、終了時にまとめて書き出す）"""
+    if not settings.getbool('MEMORY_BOUNDED'):
+        return None
+    return settings.getint('MEMORY_BOUNDED_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+class LRUSet:
+    """件数に上限のある集合（上限を超えると最も長く参照されていない要素から忘れる）"""
+
+    __slots__ = ('maxsize', '_keys')
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+
+    def __contains__(self, key):
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+
+
+def seen_set(maxsize=None):
+    """処理済みの集合（maxsize 指定時は LRUSet）"""
+    return LRUSet(maxsize) if maxsize else set()
+
+
+class MemoryBoundedMode:
+    """MEMORY_BOUNDED = True のときに段階間のキューを小さくするアドオン（ADDONS に登録する）"""
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('MEMORY_BOUNDED'):
+            raise NotConfigured
+        return cls()
+
+    def update_settings(self, settings):
+        for name, value in BOUNDED_SETTINGS.items():
+            settings.set(name, value, priority='addon')
+
+
+class _StageStats:
+    __slots__ = ('calls', 'peak', 'retained')
+
+    def __init__(self):
+        self.calls = 0
+        # 1回の実行中に増えたメモリの最大値と、実行後も残った量の合計（バイト）
+        self.peak = 0
+        self.retained = 0
+
+
+class MemoryReport:
+    """MEMORY_REPORT_ENABLED 時に処理段階ごとのメモリ使用量を tracemalloc で計測する拡張機能
+
+    段階の実行前に tracemalloc のピークをリセットし、実行中のピークと実行前の使用量の差を
+    その段階のピークとする。Deferredを返すパイプラインは同期的に実行される部分のみを計測する。
+    """
+
+    def __init__(self, crawler, report_file=None, top=10):
+        self.crawler = crawler
+        self.report_file = Path(report_file) if report_file else None
+        self.top = top
+        self.stages = defaultdict(_StageStats)
+        self.traced_peak = 0
+        self.started_tracing = False
+        self._depth = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('MEMORY_REPORT_ENABLED'):
+            raise NotConfigured
+        ext = cls(
+            crawler,
+            report_file=crawler.settings.get('MEMORY_REPORT_FILE'),
+            top=crawler.settings.getint('MEMORY_REPORT_TOP', 10),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self._install(spider)
+
+    def _install(self, spider):
+        """スパイダーのparse*メソッドとパイプラインのprocess_item / close_spiderを計測用に差し替える"""
+        wrap_spider_callbacks(spider, lambda method: self._wrap(f"spider.{method.__name__}", method))
+
+        wrap_pipeline_methods(
+            self.crawler, ('process_item', 'close_spider'),
+            lambda method: self._wrap(getattr(method, '__qualname__', None) or repr(method), method),
+        )
+
+    def _wrap(self, stage, func):
+        report = self
+
+        def wrapper(*args, **kwargs):
+            result = report._measure(stage, func, *args, **kwargs)
+            # コールバックはジェネレータを返すため、反復の各ステップも計測する
+            if hasattr(result, '__next__') and not hasattr(result, '__anext__'):
+                return report._iterate(stage, result)
+            return result
+
+        return wrapper
+
+    def _iterate(self, stage, iterator):
+        while True:
+            try:
+                value = self._measure(stage, next, iterator)
+            except StopIteration:
+                return
+            yield value
+
+    def _measure(self, stage, func, *args, **kwargs):
+        # 入れ子になった段階は外側の段階に含める
+        if self._depth or not tracemalloc.is_tracing():
+            return func(*args, **kwargs)
+        before, peak = tracemalloc.get_traced_memory()
+        self.traced_peak = max(self.traced_peak, peak)
+        tracemalloc.reset_peak()
+        self._depth += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._depth -= 1
+            after, peak = tracemalloc.get_traced_memory()
+            self.traced_peak = max(self.traced_peak, peak)
+            stats = self.stages[stage]
+            stats.calls += 1
+            stats.peak = max(stats.peak, peak - before)
+            stats.retained += after - before
+
+    def spider_closed(self, spider):
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self.traced_peak = max(self.traced_peak, peak)
+        top_lines = [
+            (str(stat.traceback[0]), stat.size, stat.count)
+            for stat in tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+        ]
+        if self.started_tracing:
+            tracemalloc.stop()
+
+        stats = self.crawler.stats
+        stats.set_value('memory/traced_peak_bytes', self.traced_peak)
+        stats.set_value('memory/traced_current_bytes', current)
+        for stage, stage_stats in self.stages.items():
+            stats.set_value(f'memory/{stage}/peak_bytes', stage_stats.peak)
+            stats.set_value(f'memory/{stage}/retained_bytes', stage_stats.retained)
+
+        lines = [f"{'stage':<44} {'calls':>8} {'peak KB':>10} {'retained KB':>12}"]
+        for stage, stage_stats in sorted(self.stages.items(), key=lambda item: -item[1].peak):
+            lines.append(
+                f"{stage:<44} {stage_stats.calls:>8} {stage_stats.peak / 1024:>10.1f} "
+                f"{stage_stats.retained / 1024:>12.1f}"
+            )
+        lines.append(f"tracemalloc: peak {self.traced_peak / 1024 / 1024:.1f} MB / "
+                     f"終了時 {current / 1024 / 1024:.1f} MB")
+        lines.extend(f"  {size / 1024:>10.1f} KB {count:>8}  {location}" for location, size, count in top_lines)
+        spider.logger.info("処理段階ごとのメモリ使用量:\n" + '\n'.join(lines))
+
+        if self.report_file:
+            report = {
+                'spider': spider.name,
+                'finished_at': time.time(),
+                'traced_peak_bytes': self.traced_peak,
+                'traced_current_bytes': current,
+                'stages': {
+                    stage: {'calls': s.calls, 'peak_bytes': s.peak, 'retained_bytes': s.retained}
+                    for stage, s in sorted(self.stages.items())
+                },
+                'top_allocations': [
+                    {'location': location, 'bytes': size, 'blocks': count} for location, size, count in top_lines
+                ],
+            }
+            self.report_file.parent.mkdir(parents=True, exist_ok=True)
+            self.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
@@ -0,0 +1,225 @@
+"""
+クロールの処理段階ごとのメトリクス
+
+ダウンロードと各パイプラインの処理時間をヒストグラムとしてScrapyのstatsに記録し、
+クロール終了時にitems/sec・アイテムあたりのTMDb呼び出し数・キャッシュヒット率・
+DynamoDB書き込みユニットを集計する。Prometheusのテキスト形式でファイルまたは
+ローカルのHTTPエンドポイントに出力できる。
+
+ヒストグラムはバケットごとの件数（累積しない値）で保存するため、
+multicrawlで複数プロセスのstatsを合算してもそのまま使える。
+"""
+
+import functools
+import os
+import time
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+# ヒストグラムのバケット上限（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STATS_PREFIX = 'metrics/latency'
+PROMETHEUS_PREFIX = 'theater_scraper'
+
+
+def _bucket_label(bound):
+    return format(bound, 'g')
+
+
+def record_latency(stats, stage, seconds):
+    """処理時間を1件ヒストグラムに記録"""
+    if stats is None:
+        return
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            label = _bucket_label(bound)
+            break
+    else:
+        label = '+Inf'
+    stats.inc_value(f'{STATS_PREFIX}/{stage}/bucket/{label}')
+    stats.inc_value(f'{STATS_PREFIX}/{stage}/count')
+    stats.inc_value(f'{STATS_PREFIX}/{stage}/sum', seconds)
+
+
+def timed_stage(stage):
+    """パイプラインのprocess_itemの処理時間を記録するデコレータ"""
+    def decorator(process_item):
+        @functools.wraps(process_item)
+        def wrapper(self, item, spider):
+            start = time.perf_counter()
+            try:
+                return process_item(self, item, spider)
+            finally:
+                crawler = getattr(spider, 'crawler', None)
+                record_latency(crawler.stats if crawler else None, stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def summarize_stats(stats, elapsed):
+    """件数のstatsから比率系のメトリクスを計算
+
+    multicrawlでは合算後のstatsに対してもう一度計算し直す。
+    """
+    summary = {}
+    items = stats.get('item_scraped_count', 0)
+    summary['metrics/items_per_second'] = items / elapsed if elapsed > 0 else 0.0
+
+    movie_items = stats.get('tmdb/items', 0)
+    if movie_items:
+        summary['metrics/tmdb_calls_per_item'] = stats.get('tmdb/requests', 0) / movie_items
+    hits = stats.get('tmdb/cache_hits', 0)
+    lookups = hits + stats.get('tmdb/cache_misses', 0)
+    if lookups:
+        summary['metrics/tmdb_cache_hit_ratio'] = hits / lookups
+    return summary
+
+
+def stage_histograms(stats):
+    """statsからステージごとのヒストグラム {stage: (buckets, sum, count)} を復元"""
+    histograms = {}
+    prefix = STATS_PREFIX + '/'
+    for key, value in stats.items():
+        if not key.startswith(prefix):
+            continue
+        stage, _, rest = key[len(prefix):].partition('/')
+        buckets, total, count = histograms.setdefault(stage, ({}, [0.0], [0]))
+        if rest.startswith('bucket/'):
+            buckets[rest[len('bucket/'):]] = value
+        elif rest == 'sum':
+            total[0] = value
+        elif rest == 'count':
+            count[0] = value
+    return {stage: (b, t[0], c[0]) for stage, (b, t, c) in histograms.items()}
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(stats, spider_name):
+    """statsをPrometheusのテキスト形式に変換"""
+    spider = _escape_label(spider_name)
+    lines = [
+        f'# HELP {PROMETHEUS_PREFIX}_stage_latency_seconds Processing latency per crawl stage.',
+        f'# TYPE {PROMETHEUS_PREFIX}_stage_latency_seconds histogram',
+    ]
+    for stage, (buckets, total, count) in sorted(stage_histograms(stats).items()):
+        labels = f'spider="{spider}",stage="{_escape_label(stage)}"'
+        cumulative = 0
+        for bound in LATENCY_BUCKETS:
+            cumulative += buckets.get(_bucket_label(bound), 0)
+            lines.append(
+                f'{PROMETHEUS_PREFIX}_stage_latency_seconds_bucket{{{labels},le="{_bucket_label(bound)}"}} {cumulative}'
+            )
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_latency_seconds_sum{{{labels}}} {total}')
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_latency_seconds_count{{{labels}}} {count}')
+
+    gauges = (
+        ('items_per_second', 'metrics/items_per_second', 'Scraped items per second of crawl time.'),
+        ('tmdb_calls_per_item', 'metrics/tmdb_calls_per_item', 'TMDb API requests per movie item.'),
+        ('tmdb_cache_hit_ratio', 'metrics/tmdb_cache_hit_ratio', 'Share of TMDb searches served from cache.'),
+        ('dynamodb_write_units', 'dynamodb/write_units', 'DynamoDB write capacity units consumed.'),
+        ('items_scraped', 'item_scraped_count', 'Items that passed every pipeline.'),
+        ('elapsed_seconds', 'elapsed_time_seconds', 'Crawl wall-clock time.'),
+    )
+    for name, key, help_text in gauges:
+        if key in stats:
+            lines.append(f'# HELP {PROMETHEUS_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} gauge')
+            lines.append(f'{PROMETHEUS_PREFIX}_{name}{{spider="{spider}"}} {stats[key]}')
+
+    # その他の数値statsはキーをラベルにして出力する
+    lines.append(f'# HELP {PROMETHEUS_PREFIX}_stat Raw Scrapy stats value.')
+    lines.append(f'# TYPE {PROMETHEUS_PREFIX}_stat gauge')
+    for key, value in sorted(stats.items()):
+        if key.startswith(STATS_PREFIX) or isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(
+            f'{PROMETHEUS_PREFIX}_stat{{spider="{spider}",key="{_escape_label(key)}"}} {value}'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+class CrawlMetrics:
+    """ダウンロード時間の記録、終了時の集計、Prometheus形式での出力を行う拡張機能
+
+    METRICS_ENABLED = True で有効。METRICS_PROMETHEUS_FILE を指定すると終了時に
+    ファイルへ、METRICS_PROMETHEUS_PORT を指定するとクロール中も
+    http://127.0.0.1:<port>/metrics で出力する。
+    """
+
+    def __init__(self, crawler, prometheus_file=None, prometheus_port=0):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.prometheus_file = prometheus_file
+        self.prometheus_port = prometheus_port
+        self.listener = None
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED', True):
+            raise NotConfigured
+        ext = cls(
+            crawler,
+            prometheus_file=crawler.settings.get('METRICS_PROMETHEUS_FILE'),
+            prometheus_port=crawler.settings.getint('METRICS_PROMETHEUS_PORT', 0),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        if self.prometheus_port:
+            self.listener = self._listen(spider)
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            record_latency(self.stats, 'download', latency)
+
+    def spider_closed(self, spider, reason):
+        self._summarize()
+        if self.prometheus_file:
+            self.write_prometheus(spider)
+        if self.listener is not None:
+            self.listener.stopListening()
+
+    def _summarize(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        for key, value in summarize_stats(self.stats.get_stats(), elapsed).items():
+            self.stats.set_value(key, value)
+
+    def write_prometheus(self, spider):
+        """Prometheus形式のテキストをファイルに書き出す（一時ファイル経由で置き換え）"""
+        path = Path(self.prometheus_file.format(spider=spider.name))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        tmp_path.write_text(render_prometheus(self.stats.get_stats(), spider.name), encoding='utf-8')
+        os.replace(tmp_path, path)
+        spider.logger.info(f"メトリクス出力: {path}")
+
+    def _listen(self, spider):
+        from twisted.internet import reactor
+        from twisted.web.resource import Resource
+        from twisted.web.server import Site
+
+        stats = self.stats
+
+        class MetricsResource(Resource):
+            isLeaf = True
+
+            def render_GET(self, request):
+                request.setHeader(b'content-type', b'text/plain; version=0.0.4; charset=utf-8')
+                return render_prometheus(stats.get_stats(), spider.name).encode('utf-8')
+
+        root = Resource()
+        root.putChild(b'metrics', MetricsResource())
+        return reactor.listenTCP(self.prometheus_port, Site(root), interface='127.0.0.1')
@@ -3,54 +3,129 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import hashlib
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from scrapy import Request, signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.responsetypes import responsetypes
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from theater_scraper import resources
+from theater_scraper.archive import ARCHIVE_SUFFIX, ArchiveIndex, ArchiveWriter
+from theater_scraper.items import REQUIRED_FIELDS, MovieItem, ShowtimeItem, TheaterItem
+from theater_scraper.jobstate import close_job_state, get_job_state
+from theater_scraper.memory import bounded_cache_size, seen_set
+from theater_scraper.movie_state import PRIORITIES, classify, load_movie_states
+
+
+def _is_detail_request(request):
+    return getattr(request.callback, '__name__', None) == 'parse_movie_detail'
+
+
+# 重複を判定するアイテムのキー（同じ値のアイテムはクロール中に1件だけ処理する）
+_ITEM_KEYS = {
+    TheaterItem: ('theater_id',),
+    MovieItem: ('theater_id', 'detail_url'),
+    ShowtimeItem: ('theater_id', 'starts_at', 'screen', 'detail_url'),
+}
+
+
+def _fingerprint(*parts):
+    """文字列の組の8バイトのハッシュ値（URLそのものより小さい整数として集合に入れる）"""
+    data = '\x1f'.join(str(part) for part in parts).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
 
 class TheaterScraperSpiderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
+    """スパイダーの出力をTMDb・DynamoDBの処理より前に絞り込むミドルウェア
+
+    - 必須フィールド（items.REQUIRED_FIELDS）が空のアイテムを破棄する
+    - クロール全体で同じキーのアイテム（映画館・作品・上映回）を2件目以降破棄する
+    - クロール全体で同じURLの詳細ページのリクエストを2件目以降破棄する（dont_filter以外）
+
+    処理済みのキーは8バイトのハッシュ値の集合で持つ（MEMORY_BOUNDED 時は件数に上限あり）。
+    破棄した件数は early_filter/* としてstatsに記録し、終了時にログへ出力する。
+    """
+
+    def __init__(self, cache_size=None, stats=None):
+        self.seen_items = seen_set(cache_size)
+        self.seen_requests = seen_set(cache_size)
+        self.stats = stats
+        self.counts = defaultdict(int)
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        if not crawler.settings.getbool('EARLY_FILTER_ENABLED', True):
+            raise NotConfigured
+        s = cls(cache_size=bounded_cache_size(crawler.settings), stats=crawler.stats)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
-    def process_spider_input(self, response, spider):
-        # Called for each response that goes through the spider
-        # middleware and into the spider.
+    def _drop(self, reason):
+        self.counts[reason] += 1
+        if self.stats:
+            self.stats.inc_value(f'early_filter/{reason}')
 
-        # Should return None or raise an exception.
-        return None
+    def _filter(self, item_or_request, spider):
+        """出力してよければそのまま返し、破棄する場合はNoneを返す"""
+        if isinstance(item_or_request, Request):
+            if item_or_request.dont_filter or not _is_detail_request(item_or_request):
+                return item_or_request
+            key = _fingerprint(item_or_request.url)
+            if key in self.seen_requests:
+                self._drop('duplicate_requests')
+                return None
+            self.seen_requests.add(key)
+            return item_or_request
 
-    def process_spider_output(self, response, result, spider):
-        # Called with the results returned from the Spider, after
-        # it has processed the response.
+        required_fields = REQUIRED_FIELDS.get(type(item_or_request))
+        if required_fields is None:
+            return item_or_request
+        adapter = ItemAdapter(item_or_request)
+        item_type = type(item_or_request).__name__
+        for field in required_fields:
+            if not adapter.get(field):
+                spider.logger.error(f"必須フィールドが空のため破棄します: {item_type}.{field}")
+                self._drop(f'invalid/{item_type}')
+                return None
+        key = _fingerprint(item_type, *(adapter.get(field) or '' for field in _ITEM_KEYS[type(item_or_request)]))
+        if key in self.seen_items:
+            self._drop(f'duplicate/{item_type}')
+            return None
+        self.seen_items.add(key)
+        return item_or_request
 
-        # Must return an iterable of Request, or item objects.
-        for i in result:
-            yield i
-
-    def process_spider_exception(self, response, exception, spider):
-        # Called when a spider or process_spider_input() method
-        # (from other spider middleware) raises an exception.
-
-        # Should return either None or an iterable of Request or item objects.
-        pass
+    def process_spider_output(self, response, result, spider):
+        for item_or_request in result:
+            item_or_request = self._filter(item_or_request, spider)
+            if item_or_request is not None:
+                yield item_or_request
 
-    async def process_start(self, start):
-        # Called with an async iterator over the spider start() method or the
-        # maching method of an earlier spider middleware.
-        async for item_or_request in start:
-            yield item_or_request
+    async def process_spider_output_async(self, response, result, spider):
+        async for item_or_request in result:
+            item_or_request = self._filter(item_or_request, spider)
+            if item_or_request is not None:
+                yield item_or_request
 
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+    def spider_closed(self, spider):
+        if not self.counts:
+            return
+        requests = self.counts.get('duplicate_requests', 0)
+        items = sum(self.counts.values()) - requests
+        # 破棄したアイテムは全パイプライン（作品はTMDb検索・詳細取得・DynamoDB書き込み）を通らない
+        if self.stats:
+            self.stats.set_value('early_filter/items_avoided', items)
+        spider.logger.info(
+            f"早期に破棄: アイテム{items}件・詳細ページのリクエスト{requests}件 "
+            + ', '.join(f"{reason}={count}" for reason, count in sorted(self.counts.items()))
+        )
 
 
 class TheaterScraperDownloaderMiddleware:
@@ -98,3 +173,306 @@ class TheaterScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+# 本文を展開済みで保存するため、アーカイブに残さないレスポンスヘッダー
+_ARCHIVE_SKIP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+# コールバック名からアーカイブのレコード種別への対応
+_ARCHIVE_KINDS = {'parse': 'listing', 'parse_movie_detail': 'detail'}
+
+
+class ResponseArchiveMiddleware:
+    """取得した一覧・詳細ページのレスポンスを圧縮アーカイブに保存するミドルウェア
+
+    ARCHIVE_ENABLED = True で有効。HttpCompressionMiddlewareより後段（小さい番号）に
+    置き、展開済みの本文を保存する。
+    """
+
+    def __init__(self, archive_dir, compression_level=6, stats=None):
+        self.archive_dir = Path(archive_dir)
+        self.compression_level = compression_level
+        self.stats = stats
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ARCHIVE_ENABLED'):
+            raise NotConfigured
+        s = cls(
+            crawler.settings.get('ARCHIVE_DIR', 'archive'),
+            compression_level=crawler.settings.getint('ARCHIVE_COMPRESSION_LEVEL', 6),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = self.archive_dir / spider.name / f"{timestamp}-{os.getpid()}{ARCHIVE_SUFFIX}"
+        self.writer = ArchiveWriter(path, self.compression_level)
+        spider.logger.info(f"レスポンスアーカイブ: {path}")
+
+    def spider_closed(self, spider):
+        if self.writer:
+            self.writer.close()
+            spider.logger.info(
+                f"アーカイブ保存: {self.writer.records}件 "
+                f"({self.writer.raw_bytes} -> {self.writer.stored_bytes} bytes)"
+            )
+
+    def process_response(self, request, response, spider):
+        if (self.writer is None or 'archived' in response.flags or response.status != 200
+                or request.url.endswith('/robots.txt')):
+            return response
+
+        callback = request.callback or spider.parse
+        name = getattr(callback, '__name__', 'parse')
+        headers = {
+            key.decode('latin-1'): [v.decode('latin-1') for v in values]
+            for key, values in response.headers.items()
+            if key.decode('latin-1').lower() not in _ARCHIVE_SKIP_HEADERS
+        }
+        self.writer.write(
+            response.url,
+            response.body,
+            status=response.status,
+            headers=headers,
+            kind=_ARCHIVE_KINDS.get(name, name),
+            spider=spider.name,
+        )
+        if self.stats:
+            self.stats.inc_value('archive/records')
+            self.stats.set_value('archive/raw_bytes', self.writer.raw_bytes)
+            self.stats.set_value('archive/stored_bytes', self.writer.stored_bytes)
+        return response
+
+
+class ArchiveReplayMiddleware:
+    """ネットワークへ出ずにアーカイブからレスポンスを返すミドルウェア
+
+    ARCHIVE_REPLAY にアーカイブファイルまたはディレクトリを指定すると有効。
+    アーカイブに無いURLはIgnoreRequestで破棄し、件数をstatsに記録する。
+    """
+
+    def __init__(self, index, stats=None):
+        self.index = index
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        replay = crawler.settings.get('ARCHIVE_REPLAY')
+        if not replay:
+            raise NotConfigured
+        paths = replay.split(',') if isinstance(replay, str) else replay
+        until = crawler.settings.getfloat('ARCHIVE_REPLAY_UNTIL') or None
+        return cls(ArchiveIndex(paths, until=until), stats=crawler.stats)
+
+    def process_request(self, request, spider):
+        record = self.index.get(request.url)
+        if record is None:
+            if self.stats:
+                self.stats.inc_value('archive/replay/missing')
+            raise IgnoreRequest(f"Not in archive: {request.url}")
+
+        body = record.read_body()
+        headers = record.header.get('headers') or {}
+        respcls = responsetypes.from_args(headers=headers, url=record.url, body=body)
+        if self.stats:
+            self.stats.inc_value('archive/replay/hits')
+        return respcls(
+            url=record.url,
+            status=record.header.get('status', 200),
+            headers=headers,
+            body=body,
+            request=request,
+            flags=['archived'],
+        )
+
+
+class DetailPriorityMiddleware:
+    """詳細ページのリクエストに保存済みデータの状態に応じた優先度を付けるミドルウェア
+
+    未保存の作品 > TMDb情報が無い作品 > 古くなった作品 > 最近更新した作品 の順にクロールする。
+    判定結果は request.meta['budget_class'] に入れ、CrawlBudgetMiddlewareが参照する。
+    """
+
+    def __init__(self, dynamodb_endpoint, stale_after, stats=None, table_name='ShowingTable'):
+        self.dynamodb_endpoint = dynamodb_endpoint
+        self.stale_after = stale_after
+        self.stats = stats
+        self.table_name = table_name
+        self.states = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('DETAIL_PRIORITY_ENABLED', True):
+            raise NotConfigured
+        return cls(
+            crawler.settings.get('DYNAMODB_ENDPOINT', 'http://localhost:8000'),
+            crawler.settings.getfloat('CRAWL_STALE_AFTER', 24 * 60 * 60),
+            stats=crawler.stats,
+            table_name='MovieTable' if crawler.settings.get('MOVIE_STORAGE', 'legacy') == 'legacy' else 'ShowingTable',
+        )
+
+    def _movie_states(self, spider):
+        """映画館ごとの保存済み状態（初回のみDynamoDBから取得）"""
+        theater_id = getattr(spider, 'theater_id', spider.name)
+        if theater_id not in self.states:
+            try:
+                dynamodb = resources.get_dynamodb_resource(self.dynamodb_endpoint)
+                self.states[theater_id] = load_movie_states(dynamodb, theater_id, self.table_name)
+                spider.logger.info(f"保存済み映画: {len(self.states[theater_id])}件 ({theater_id})")
+            except Exception as e:
+                # 状態が取得できない場合は全て未保存として扱う
+                spider.logger.warning(f"保存済み映画の取得に失敗しました: {type(e).__name__}: {e}")
+                self.states[theater_id] = {}
+        return self.states[theater_id]
+
+    def _prioritize(self, item_or_request, spider):
+        if not (isinstance(item_or_request, Request) and _is_detail_request(item_or_request)):
+            return item_or_request
+        states = self._movie_states(spider)
+        budget_class = classify(states.get(item_or_request.url), self.stale_after)
+        item_or_request.meta['budget_class'] = budget_class
+        if self.stats:
+            self.stats.inc_value(f'budget/scheduled/{budget_class}')
+        return item_or_request.replace(priority=item_or_request.priority + PRIORITIES[budget_class])
+
+    def process_spider_output(self, response, result, spider):
+        for item_or_request in result:
+            yield self._prioritize(item_or_request, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for item_or_request in result:
+            yield self._prioritize(item_or_request, spider)
+
+
+class CrawlBudgetMiddleware:
+    """1回のクロールの時間・リクエスト数に上限を設けるミドルウェア
+
+    上限に達した後の詳細ページのリクエストはダウンロードせずに破棄し、
+    優先度クラスごとの件数とURLを budget/deferred* としてstatsに記録する。
+    破棄したリクエストの分だけキューが空になるため、クロールは通常どおり終了する。
+    """
+
+    def __init__(self, time_budget=0, request_budget=0, stats=None):
+        self.time_budget = time_budget
+        self.request_budget = request_budget
+        self.stats = stats
+        self.started = None
+        self.requests = 0
+        self.exhausted = None
+        self.deferred_urls = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        time_budget = crawler.settings.getfloat('CRAWL_TIME_BUDGET', 0)
+        request_budget = crawler.settings.getint('CRAWL_REQUEST_BUDGET', 0)
+        if not time_budget and not request_budget:
+            raise NotConfigured
+        s = cls(time_budget, request_budget, stats=crawler.stats)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+
+    def spider_closed(self, spider):
+        if self.stats and self.deferred_urls:
+            self.stats.set_value('budget/deferred_urls', list(self.deferred_urls))
+
+    def _check_budget(self):
+        if self.time_budget and time.monotonic() - self.started >= self.time_budget:
+            return 'time'
+        if self.request_budget and self.requests >= self.request_budget:
+            return 'requests'
+        return None
+
+    def process_request(self, request, spider):
+        if not _is_detail_request(request):
+            return None
+        budget_class = request.meta.get('budget_class', 'unclassified')
+
+        if self.exhausted is None:
+            self.exhausted = self._check_budget()
+            if self.exhausted:
+                spider.logger.warning(
+                    f"クロール予算（{self.exhausted}）に達したため、残りの詳細ページを次回に回します"
+                )
+                if self.stats:
+                    self.stats.set_value('budget/exhausted', self.exhausted)
+
+        if self.exhausted:
+            self.deferred_urls.append(request.url)
+            if self.stats:
+                self.stats.inc_value('budget/deferred_count')
+                self.stats.inc_value(f'budget/deferred/{budget_class}')
+            raise IgnoreRequest(f"Crawl budget exhausted ({self.exhausted}): {request.url}")
+
+        self.requests += 1
+        if self.stats:
+            self.stats.inc_value('budget/requests')
+        return None
+
+
+class JobStateMiddleware:
+    """JOBDIR指定時に、出力したアイテムを書き込み完了まで保存するミドルウェア
+
+    スパイダーが出力したアイテムをJOBDIRのジョブ状態に記録し、全パイプラインを
+    通過（item_scraped）、DropItem（item_dropped）またはパイプラインで例外（item_error）となった
+    時点で削除する（例外となるアイテムを再開のたびに出力し直さない）。
+    中断後に同じJOBDIRで再開すると、残っているアイテムを最初に出力し直す。
+    """
+
+    def __init__(self, jobdir, stats=None):
+        self.jobdir = jobdir
+        self.job_state = get_job_state(jobdir)
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        jobdir = crawler.settings.get('JOBDIR')
+        if not jobdir:
+            raise NotConfigured
+        s = cls(jobdir, stats=crawler.stats)
+        crawler.signals.connect(s.item_done, signal=signals.item_scraped)
+        crawler.signals.connect(s.item_done, signal=signals.item_dropped)
+        crawler.signals.connect(s.item_done, signal=signals.item_error)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def _track(self, item_or_request):
+        if not isinstance(item_or_request, Request):
+            self.job_state.add_pending(item_or_request)
+        return item_or_request
+
+    def process_spider_output(self, response, result, spider):
+        for item_or_request in result:
+            yield self._track(item_or_request)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for item_or_request in result:
+            yield self._track(item_or_request)
+
+    async def process_start(self, start):
+        # 前回書き込みが完了しなかったアイテムを先に処理する
+        recovered = self.job_state.pending_items()
+        if recovered and self.stats:
+            self.stats.set_value('jobstate/recovered_items', len(recovered))
+        for item in recovered:
+            yield item
+        async for item_or_request in start:
+            yield item_or_request
+
+    def item_done(self, item, spider, **kwargs):
+        self.job_state.remove_pending(item)
+
+    def spider_closed(self, spider):
+        counts = self.job_state.counts()
+        if self.stats:
+            self.stats.set_value('jobstate/pending_items', counts['pending_items'])
+            self.stats.set_value('jobstate/tmdb_search', counts['tmdb_search'])
+        close_job_state(self.jobdir)
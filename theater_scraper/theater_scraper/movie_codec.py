@@ -0,0 +1,159 @@
+"""
+MovieTableのレコードのコンパクトな保存形式
+
+MOVIE_CODEC = "compact" の場合、MovieTable（MOVIE_STORAGE = "legacy" / "both"）のレコードを
+次のように変換して保存し、アイテムサイズ（書き込み・読み込みユニットとGSIへの射影量）を減らす。
+
+- 属性名を1文字の別名にする（主キーの detail_url とGSIのキーの theater_id はそのまま）
+- created_at・updated_at をISO形式の文字列からUNIX時間（秒、整数）にする
+- あらすじを圧縮してBinary属性（z）に保存する（圧縮しても小さくならない場合は文字列のまま）
+
+読み込み側は decode_movie で従来の形式に戻す。従来の形式のレコードはそのまま返すため、
+移行中（scrapy moviecodec migrate）は両方の形式が混在していてもよい。
+"""
+
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+try:
+    import zstandard
+except ImportError:  # zstandardはオプション（無い場合はzlibで圧縮する）
+    zstandard = None
+
+CODECS = ('plain', 'compact')
+COMPRESSIONS = ('zlib', 'zstd')
+
+# 属性名の別名（主キーとGSIのキーは変更しない）
+ALIASES = {
+    'title': 't',
+    'original_title': 'o',
+    'release_year': 'y',
+    'synopsis': 's',
+    'official_website': 'w',
+    'tmdb_id': 'i',
+    'tmdb_poster_path': 'p',
+    'poster_file': 'f',
+    'created_at': 'c',
+    'updated_at': 'u',
+}
+NAMES = {alias: name for name, alias in ALIASES.items()}
+TIMESTAMP_ATTRIBUTES = ('created_at', 'updated_at')
+# 圧縮したあらすじ（先頭1バイトが圧縮方式）
+SYNOPSIS_BLOB = 'z'
+_ZLIB = b'z'
+_ZSTD = b's'
+
+# zlibはヘッダー・チェックサムを付けない（raw deflate）
+_ZLIB_WBITS = -15
+_COMPRESS_LEVEL = 9
+_ZSTD_LEVEL = 19
+
+
+def _compress(text, compression):
+    data = text.encode('utf-8')
+    if compression == 'zstd' and zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    compressor = zlib.compressobj(_COMPRESS_LEVEL, zlib.DEFLATED, _ZLIB_WBITS)
+    return _ZLIB + compressor.compress(data) + compressor.flush()
+
+
+def _decompress(blob):
+    # boto3は読み込んだBinary属性を Binary（.valueがbytes）で返す
+    blob = bytes(getattr(blob, 'value', blob))
+    method, data = blob[:1], blob[1:]
+    if method == _ZLIB:
+        return zlib.decompress(data, _ZLIB_WBITS).decode('utf-8')
+    if method == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd圧縮されたあらすじの展開にはzstandardが必要です")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    raise ValueError(f"未知の圧縮方式: {method!r}")
+
+
+def _to_epoch(value):
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return value
+
+
+def _from_epoch(value):
+    if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(int(value)).isoformat()
+    return value
+
+
+def is_compact(record):
+    """コンパクトな形式で保存されたレコードか"""
+    return SYNOPSIS_BLOB in record or any(alias in record for alias in NAMES)
+
+
+def encode_movie(record, compression='zlib'):
+    """従来の形式のMovieTableのレコードをコンパクトな形式にする"""
+    encoded = {}
+    for name, value in record.items():
+        if name in TIMESTAMP_ATTRIBUTES:
+            value = _to_epoch(value)
+        elif name == 'synopsis' and value:
+            blob = _compress(value, compression)
+            if len(blob) < len(value.encode('utf-8')):
+                encoded[SYNOPSIS_BLOB] = blob
+                continue
+        encoded[ALIASES.get(name, name)] = value
+    return encoded
+
+
+def decode_movie(record):
+    """MovieTableのレコードを従来の形式に戻す（従来の形式のレコードはそのまま返す）"""
+    if not is_compact(record):
+        return record
+    decoded = {}
+    for name, value in record.items():
+        if name == SYNOPSIS_BLOB:
+            decoded['synopsis'] = _decompress(value)
+            continue
+        name = NAMES.get(name, name)
+        if name in TIMESTAMP_ATTRIBUTES:
+            value = _from_epoch(value)
+        decoded[name] = value
+    return decoded
+
+
+def projection(names):
+    """両方の形式のレコードから names の属性を読み込むProjectionExpression"""
+    expanded = []
+    for name in names:
+        expanded.append(name)
+        if name in ALIASES:
+            expanded.append(ALIASES[name])
+        if name == 'synopsis':
+            expanded.append(SYNOPSIS_BLOB)
+    return ', '.join(expanded)
+
+
+def _value_size(value):
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (int, float, Decimal)):
+        # 有効数字2桁ごとに1バイト＋1バイト
+        digits = len(Decimal(str(value)).normalize().as_tuple().digits)
+        return (digits + 1) // 2 + 1
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if hasattr(value, 'value'):  # boto3のBinary
+        return len(value.value)
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode('utf-8')) + _value_size(item) + 1 for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(_value_size(item) + 1 for item in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(_value_size(item) for item in value)
+    return len(str(value).encode('utf-8'))
+
+
+def item_size(record):
+    """DynamoDBのアイテムサイズ（属性名＋値のバイト数）の見積もり"""
+    return sum(len(name.encode('utf-8')) + _value_size(value) for name, value in record.items())
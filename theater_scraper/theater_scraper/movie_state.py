@@ -0,0 +1,63 @@
+"""
+保存済み映画データの状態
+
+ShowingTable（MOVIE_STORAGE = "legacy" の場合はMovieTable）のtheater_id-indexから
+映画館ごとに必要な属性だけを取得し、
+詳細ページのクロール優先度（未取得 > TMDb未取得 > 再取得）を判定する。
+"""
+
+from datetime import datetime, timedelta
+
+from theater_scraper.movie_codec import decode_movie, projection
+
+# 優先度クラス（値が大きいほど先にクロールする）
+UNSEEN = 'unseen'
+MISSING_TMDB = 'missing_tmdb'
+STALE = 'stale'
+FRESH = 'fresh'
+
+PRIORITIES = {
+    UNSEEN: 30,
+    MISSING_TMDB: 20,
+    STALE: 10,
+    FRESH: 0,
+}
+
+
+def load_movie_states(dynamodb, theater_id, table_name='ShowingTable'):
+    """映画館の保存済み映画を {detail_url: {'tmdb_id', 'updated_at'}} で返す"""
+    table = dynamodb.Table(table_name)
+    states = {}
+    kwargs = {
+        'IndexName': 'theater_id-index',
+        'KeyConditionExpression': 'theater_id = :theater_id',
+        'ExpressionAttributeValues': {':theater_id': theater_id},
+        # MovieTableのコンパクトな形式のレコードは属性名が異なる
+        'ProjectionExpression': projection(['detail_url', 'tmdb_id', 'updated_at']),
+    }
+    while True:
+        response = table.query(**kwargs)
+        for item in map(decode_movie, response['Items']):
+            states[item['detail_url']] = {
+                'tmdb_id': item.get('tmdb_id'),
+                'updated_at': item.get('updated_at'),
+            }
+        if 'LastEvaluatedKey' not in response:
+            return states
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def classify(state, stale_after, now=None):
+    """保存済み状態から優先度クラスを判定"""
+    if state is None:
+        return UNSEEN
+    if not state.get('tmdb_id'):
+        return MISSING_TMDB
+    updated_at = state.get('updated_at')
+    now = now or datetime.now()
+    try:
+        if updated_at and now - datetime.fromisoformat(updated_at) < timedelta(seconds=stale_after):
+            return FRESH
+    except (TypeError, ValueError):
+        pass
+    return STALE
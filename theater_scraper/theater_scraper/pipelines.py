@@ -4,35 +4,96 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 import os
-import boto3
-from botocore.exceptions import ClientError
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
 from itemadapter import ItemAdapter
-from theater_scraper.items import TheaterItem, MovieItem
-from theater_scraper.tmdb_client import TMDbClient
-from dotenv import load_dotenv
-
-# .envファイルを読み込み
-load_dotenv()
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from theater_scraper import resources
+from theater_scraper.changes import TRACKED_FIELDS, ChangeLog
+from theater_scraper.feeds import (
+    GLOBAL_SHARD,
+    FeedWriter,
+    build_global_feed,
+    load_theater_feed,
+    theater_shard,
+)
+from theater_scraper.films import (
+    FILM_TABLE,
+    SHOWING_TABLE,
+    build_film_record,
+    build_showing_record,
+    compact_details,
+    film_id_for,
+    film_needs_update,
+)
+from theater_scraper.items import REQUIRED_FIELDS, TheaterItem, MovieItem, ShowtimeItem
+from theater_scraper.jobstate import get_job_state
+from theater_scraper.memory import bounded_batch_size, bounded_cache_size, seen_set
+from theater_scraper.metrics import record_latency, timed_stage
+from theater_scraper.movie_codec import CODECS, COMPRESSIONS, encode_movie
+from theater_scraper.posters import PosterStore
+from theater_scraper.search_index import DOCS_FILE, FIELD_WEIGHTS, INDEX_FILE, DocumentStore, write_index
+from theater_scraper.showtimes import SHOWTIME_TABLE, build_showtime_record, future_showtimes
+from theater_scraper.tmdb_cassette import CassetteMiss
+from theater_scraper.titles import search_variants
 
 
 class DynamoDBPipeline:
     """DynamoDB Local にデータを保存するパイプライン"""
     
-    def __init__(self, dynamodb_endpoint='http://localhost:8000'):
+    MOVIE_STORAGES = ('canonical', 'legacy', 'both')
+    
+    def __init__(self, dynamodb_endpoint='http://localhost:8000', movie_storage='legacy',
+                 stale_after=24 * 60 * 60, cache_size=None, movie_codec='plain', movie_compression='zlib',
+                 showtimes_enabled=False):
+        if movie_storage not in self.MOVIE_STORAGES:
+            raise ValueError(f"MOVIE_STORAGE must be one of {self.MOVIE_STORAGES}: {movie_storage}")
+        if movie_codec not in CODECS:
+            raise ValueError(f"MOVIE_CODEC must be one of {CODECS}: {movie_codec}")
+        if movie_compression not in COMPRESSIONS:
+            raise ValueError(f"MOVIE_CODEC_COMPRESSION must be one of {COMPRESSIONS}: {movie_compression}")
         self.dynamodb_endpoint = dynamodb_endpoint
-        self.dynamodb = None
+        self.movie_storage = movie_storage
+        self.movie_codec = movie_codec
+        self.movie_compression = movie_compression
+        self.stale_after = stale_after
+        self._dynamodb = None
+        # このクロールで保存済みの作品ID（cache_size 指定時は件数に上限を設ける）
+        self.saved_films = seen_set(cache_size)
+        self.showtimes_enabled = showtimes_enabled
+        # 映画館ごとの、このクロールでスケジュール表を解析した詳細ページと保存した上映回
+        # （SHOWTIMES_ENABLED時、終了時に消えた上映回を削除する）
+        self.crawled_details = defaultdict(set)
+        self.saved_showtimes = defaultdict(set)
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        """設定のDYNAMODB_ENDPOINT・MOVIE_STORAGEを使用して初期化"""
+        return cls(
+            dynamodb_endpoint=crawler.settings.get('DYNAMODB_ENDPOINT', 'http://localhost:8000'),
+            movie_storage=crawler.settings.get('MOVIE_STORAGE', 'legacy'),
+            stale_after=crawler.settings.getfloat('CRAWL_STALE_AFTER', 24 * 60 * 60),
+            cache_size=bounded_cache_size(crawler.settings),
+            movie_codec=crawler.settings.get('MOVIE_CODEC', 'plain'),
+            movie_compression=crawler.settings.get('MOVIE_CODEC_COMPRESSION', 'zlib'),
+            showtimes_enabled=crawler.settings.getbool('SHOWTIMES_ENABLED', False),
+        )
+    
+    @property
+    def dynamodb(self):
+        """DynamoDBリソース（boto3の読み込みと接続は最初の保存時に行う）"""
+        if self._dynamodb is None:
+            self._dynamodb = resources.get_dynamodb_resource(self.dynamodb_endpoint)
+        return self._dynamodb
     
     def open_spider(self, spider):
         """スパイダー開始時の初期化"""
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            endpoint_url=self.dynamodb_endpoint,
-            region_name='ap-northeast-1',
-            aws_access_key_id='dummy',
-            aws_secret_access_key='dummy'
-        )
-        spider.logger.info(f"DynamoDB接続: {self.dynamodb_endpoint}")
+        spider.logger.info(f"DynamoDB接続先: {self.dynamodb_endpoint}")
     
+    @timed_stage('dynamodb')
     def process_item(self, item, spider):
         """アイテムをDynamoDBに保存"""
         adapter = ItemAdapter(item)
@@ -41,16 +102,59 @@ class DynamoDBPipeline:
             if isinstance(item, TheaterItem):
                 self._save_theater_item(adapter, spider)
             elif isinstance(item, MovieItem):
-                self._save_movie_item(adapter, spider)
+                if self.movie_storage in ('canonical', 'both'):
+                    self._save_film_item(adapter, spider)
+                if self.movie_storage in ('legacy', 'both'):
+                    self._save_movie_item(adapter, spider)
+                if adapter.get('showtimes_parsed'):
+                    self.crawled_details[adapter.get('theater_id')].add(adapter.get('detail_url'))
+            elif isinstance(item, ShowtimeItem):
+                self._save_showtime_item(adapter, spider)
             else:
                 spider.logger.warning(f"未知のアイテムタイプ: {type(item)}")
                 
-        except ClientError as e:
-            spider.logger.error(f"DynamoDB保存エラー: {e}")
+        except Exception as e:
+            # botocoreは保存時に読み込み済み（モジュールの読み込み時には読み込まない）
+            from botocore.exceptions import ClientError
+            if isinstance(e, ClientError):
+                spider.logger.error(f"DynamoDB保存エラー: {e}")
             raise
         
         return item
     
+    def close_spider(self, spider):
+        """スケジュール表を解析した詳細ページから消えた、これから始まる上映回を削除し、まとめた書き込みをコミット"""
+        try:
+            if self.showtimes_enabled:
+                self._delete_stale_showtimes(spider)
+        finally:
+            resources.flush_dynamodb_resource(self.dynamodb_endpoint)
+    
+    def _delete_stale_showtimes(self, spider):
+        now = datetime.now()
+        for theater_id, detail_urls in self.crawled_details.items():
+            saved = self.saved_showtimes[theater_id]
+            stale = [
+                key for key, detail_url in future_showtimes(self.dynamodb, theater_id, now).items()
+                if detail_url in detail_urls and key not in saved
+            ]
+            if not stale:
+                continue
+            with self.dynamodb.Table(SHOWTIME_TABLE).batch_writer() as batch:
+                for key in stale:
+                    batch.delete_item(Key={'theater_id': theater_id, 'start_key': key})
+            spider.crawler.stats.inc_value('dynamodb/showtimes_deleted', len(stale))
+            spider.logger.info(f"上映回削除: {len(stale)}件 ({theater_id})")
+    
+    def _put_item(self, table, item_data, spider):
+        """put_itemを実行し、消費した書き込みユニットをstatsに記録"""
+        response = table.put_item(Item=item_data, ReturnConsumedCapacity='TOTAL')
+        stats = spider.crawler.stats
+        stats.inc_value('dynamodb/writes')
+        consumed = response.get('ConsumedCapacity')
+        if consumed:
+            stats.inc_value('dynamodb/write_units', float(consumed.get('CapacityUnits', 0)))
+    
     def _save_theater_item(self, adapter, spider):
         """映画館アイテムをTheaterTableに保存"""
         table = self.dynamodb.Table('TheaterTable')
@@ -62,9 +166,38 @@ class DynamoDBPipeline:
             'last_updated': adapter.get('last_updated')
         }
         
-        table.put_item(Item=item_data)
+        self._put_item(table, item_data, spider)
         spider.logger.info(f"映画館保存: {item_data['name']}")
     
+    def _save_film_item(self, adapter, spider):
+        """作品情報をFilmTableに（作品ごとに1件）、上映をShowingTableに保存"""
+        film_id = film_id_for(adapter.get('tmdb_id'), adapter.get('title'), adapter.get('release_year'))
+        stats = spider.crawler.stats
+        
+        if film_id not in self.saved_films:
+            film_table = self.dynamodb.Table(FILM_TABLE)
+            record = build_film_record(adapter, film_id)
+            existing = film_table.get_item(Key={'film_id': film_id}).get('Item')
+            if film_needs_update(existing, record, self.stale_after):
+                # put_itemは全属性を置き換えるため、保存済みの属性（詳細情報など）を引き継ぐ
+                if existing:
+                    record = {**existing, **record}
+                self._put_item(film_table, record, spider)
+                stats.inc_value('dynamodb/films_written')
+            else:
+                stats.inc_value('dynamodb/films_unchanged')
+            self.saved_films.add(film_id)
+        
+        self._put_item(self.dynamodb.Table(SHOWING_TABLE), build_showing_record(adapter, film_id), spider)
+        spider.logger.info(f"上映保存: {adapter.get('title')} -> {film_id}")
+    
+    def _save_showtime_item(self, adapter, spider):
+        """上映回をShowtimeTableに保存（映画館・開始日時の順に並ぶ）"""
+        record = build_showtime_record(adapter)
+        self._put_item(self.dynamodb.Table(SHOWTIME_TABLE), record, spider)
+        self.saved_showtimes[record['theater_id']].add(record['start_key'])
+        spider.crawler.stats.inc_value('dynamodb/showtimes_written')
+    
     def _save_movie_item(self, adapter, spider):
         """映画アイテムをMovieTableに保存 (detail_urlベースで上書き)"""
         table = self.dynamodb.Table('MovieTable')
@@ -92,27 +225,27 @@ class DynamoDBPipeline:
             item_data['tmdb_id'] = adapter.get('tmdb_id')
         if adapter.get('tmdb_poster_path'):
             item_data['tmdb_poster_path'] = adapter.get('tmdb_poster_path')
+        if adapter.get('poster_file'):
+            item_data['poster_file'] = adapter.get('poster_file')
+        
+        title = item_data['title']
+        if self.movie_codec == 'compact':
+            item_data = encode_movie(item_data, self.movie_compression)
         
         # put_itemは既存レコードを自動的に上書きする
-        table.put_item(Item=item_data)
-        spider.logger.info(f"映画保存: {item_data['title']} (year: {adapter.get('release_year')}, official: {adapter.get('official_website')})")
+        self._put_item(table, item_data, spider)
+        spider.logger.info(f"映画保存: {title} (year: {adapter.get('release_year')}, official: {adapter.get('official_website')})")
 
 
 class ValidationPipeline:
     """データ検証パイプライン"""
     
+    @timed_stage('validation')
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
         
-        if isinstance(item, TheaterItem):
-            required_fields = ['theater_id', 'name', 'official_url']
-        elif isinstance(item, MovieItem):
-            required_fields = ['detail_url', 'theater_id', 'title']
-        else:
-            return item
-        
-        # 必須フィールドチェック
-        for field in required_fields:
+        # 必須フィールドチェック（通常はTheaterScraperSpiderMiddlewareで破棄済み）
+        for field in REQUIRED_FIELDS.get(type(item), ()):
             if not adapter.get(field):
                 spider.logger.error(f"必須フィールドが空です: {field}")
                 raise ValueError(f"必須フィールドが空です: {field}")
@@ -123,28 +256,80 @@ class ValidationPipeline:
 class TMDbPipeline:
     """TMDb APIから映画のポスター画像情報を取得するパイプライン"""
     
-    def __init__(self):
-        self.tmdb_client = None
+    def __init__(self, cache_size=None):
+        self.cache_size = cache_size
+        self.access_token = None
+        self._tmdb_client = None
         self.enabled = False
+        self.job_state = None
+        self.stats = None
+    
+    @property
+    def tmdb_client(self):
+        """TMDbクライアント（最初の検索時に作成する）"""
+        if self._tmdb_client is None:
+            self._tmdb_client = resources.get_tmdb_client(self.access_token, cache_size=self.cache_size)
+        return self._tmdb_client
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('TMDB_ENABLED', True):
+            raise NotConfigured
+        return cls(cache_size=bounded_cache_size(crawler.settings))
     
     def open_spider(self, spider):
         """スパイダー開始時の初期化"""
+        self.stats = spider.crawler.stats
+        
+        # JOBDIR指定時は検索結果をジョブ状態に保存し、再開時に再検索しない
+        jobdir = spider.crawler.settings.get('JOBDIR')
+        if jobdir:
+            self.job_state = get_job_state(jobdir)
+        
         # 環境変数でTMDb機能の有効/無効を制御
+        resources.load_env()
         access_token = os.getenv('TMDB_ACCESS_TOKEN')
         spider.logger.info(f"TMDb Pipeline initialization - Token present: {bool(access_token)}")
         
         if access_token:
-            try:
-                self.tmdb_client = TMDbClient(access_token)
-                self.enabled = True
-                spider.logger.info("✓ TMDb API pipeline enabled successfully")
-            except ValueError as e:
-                spider.logger.warning(f"✗ TMDb API pipeline disabled: {e}")
-                self.enabled = False
+            self.access_token = access_token
+            self.enabled = True
+            spider.logger.info("✓ TMDb API pipeline enabled successfully")
         else:
             spider.logger.warning("✗ TMDb API pipeline disabled (TMDB_ACCESS_TOKEN not set)")
             spider.logger.info("Please set TMDB_ACCESS_TOKEN in .env file to enable TMDb integration")
     
+    def close_spider(self, spider):
+        """カセット記録時は書き出す（再生時は不足していたリクエストをログに出す）"""
+        if self._tmdb_client is not None:
+            self._tmdb_client.save_cassette()
+    
+    def _search(self, title, year=None):
+        """TMDb検索（ジョブ状態に保存済みの結果があればそれを使う）"""
+        if self.job_state:
+            found, result = self.job_state.get_search(title, year)
+            if found:
+                self.stats.inc_value('tmdb/cache_hits')
+                return result
+        
+        requests_before = self.tmdb_client.request_count
+        retries_before = self.tmdb_client.retry_count
+        hits_before = self.tmdb_client.cache_hits
+        result = self.tmdb_client.search_movie(title, year=year)
+        self.stats.inc_value('tmdb/requests', self.tmdb_client.request_count - requests_before)
+        if self.tmdb_client.retry_count > retries_before:
+            self.stats.inc_value('tmdb/retries', self.tmdb_client.retry_count - retries_before)
+        if self.tmdb_client.cache_hits > hits_before:
+            self.stats.inc_value('tmdb/cache_hits')
+        else:
+            self.stats.inc_value('tmdb/cache_misses')
+        if isinstance(self.tmdb_client.last_error, CassetteMiss):
+            self.stats.inc_value('tmdb/cassette_misses')
+        if self.job_state and self.tmdb_client.last_error is None:
+            self.job_state.put_search(title, year, result)
+        return result
+    
+    @timed_stage('tmdb')
     def process_item(self, item, spider):
         """MovieItemの場合のみTMDb APIから画像情報を取得"""
         # TMDbが無効な場合はスキップ
@@ -162,6 +347,7 @@ class TMDbPipeline:
         
         # タイトルの前処理（余分な空白を削除）
         title = title.strip()
+        self.stats.inc_value('tmdb/items')
         
         spider.logger.info(f"TMDb Pipeline processing: '{title}' (original: '{original_title}', year: {release_year})")
         
@@ -171,30 +357,37 @@ class TMDbPipeline:
             # 1. 原題と製作年での検索を優先
             if original_title and release_year:
                 spider.logger.debug(f"Searching with original title and year: '{original_title}' ({release_year})")
-                movie_data = self.tmdb_client.search_movie(original_title, year=release_year)
+                movie_data = self._search(original_title, year=release_year)
                 if movie_data:
                     spider.logger.info(f"✓ Found with original title and year")
             
             # 2. 原題のみで検索
             if not movie_data and original_title:
                 spider.logger.debug(f"Searching with original title only: '{original_title}'")
-                movie_data = self.tmdb_client.search_movie(original_title)
+                movie_data = self._search(original_title)
                 if movie_data:
                     spider.logger.info(f"✓ Found with original title")
             
+            # 日本語タイトルは表記揺れを正規化した候補（副題を除いたものを含む）で検索する
+            variants = search_variants(title) or (title,)
+            
             # 3. 日本語タイトルと製作年で検索
             if not movie_data and release_year:
-                spider.logger.debug(f"Searching with Japanese title and year: '{title}' ({release_year})")
-                movie_data = self.tmdb_client.search_movie(title, year=release_year)
-                if movie_data:
-                    spider.logger.info(f"✓ Found with Japanese title and year")
+                for variant in variants:
+                    spider.logger.debug(f"Searching with Japanese title and year: '{variant}' ({release_year})")
+                    movie_data = self._search(variant, year=release_year)
+                    if movie_data:
+                        spider.logger.info(f"✓ Found with Japanese title and year")
+                        break
             
             # 4. 日本語タイトルのみで検索（フォールバック）
             if not movie_data:
-                spider.logger.debug(f"Searching with Japanese title only: '{title}'")
-                movie_data = self.tmdb_client.search_movie(title)
-                if movie_data:
-                    spider.logger.info(f"✓ Found with Japanese title")
+                for variant in variants:
+                    spider.logger.debug(f"Searching with Japanese title only: '{variant}'")
+                    movie_data = self._search(variant)
+                    if movie_data:
+                        spider.logger.info(f"✓ Found with Japanese title")
+                        break
             
             if movie_data:
                 # TMDb情報を追加
@@ -223,3 +416,394 @@ class TMDbPipeline:
             spider.logger.debug(traceback.format_exc())
         
         return item
+
+
+class TMDbEnrichmentPipeline:
+    """TMDbで新たに見つかった作品の詳細情報（上映時間・ジャンル・出演者・画像）を取得するパイプライン
+
+    append_to_response で詳細・credits・imagesを1回のリクエストで取得し、
+    必要な項目だけを tmdb_details に保存する。FilmTableに取得済みの作品は再取得しない。
+    詳細情報はFilmTableにのみ保存するため、MOVIE_STORAGE = "legacy" の場合は無効。
+    """
+    
+    def __init__(self, dynamodb_endpoint='http://localhost:8000', append_to_response=('credits', 'images'),
+                 details_ttl=30 * 24 * 60 * 60, cache_size=None):
+        self.dynamodb_endpoint = dynamodb_endpoint
+        self.append_to_response = tuple(append_to_response)
+        self.details_ttl = details_ttl
+        self.cache_size = cache_size
+        self.access_token = None
+        self._tmdb_client = None
+        self._dynamodb = None
+        self.stats = None
+        # このクロールで取得済み・保存済みと判定したTMDb ID
+        self.known_ids = seen_set(cache_size)
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if (not settings.getbool('TMDB_ENABLED', True) or not settings.getbool('TMDB_ENRICH_ENABLED', True)
+                or settings.get('MOVIE_STORAGE', 'legacy') == 'legacy'):
+            raise NotConfigured
+        return cls(
+            dynamodb_endpoint=settings.get('DYNAMODB_ENDPOINT', 'http://localhost:8000'),
+            append_to_response=settings.getlist('TMDB_DETAILS_APPEND', ['credits', 'images']),
+            details_ttl=settings.getfloat('TMDB_DETAILS_TTL', 30 * 24 * 60 * 60),
+            cache_size=bounded_cache_size(settings),
+        )
+    
+    @property
+    def tmdb_client(self):
+        """TMDbクライアント（最初の取得時に作成する）"""
+        if self._tmdb_client is None:
+            self._tmdb_client = resources.get_tmdb_client(self.access_token, cache_size=self.cache_size)
+        return self._tmdb_client
+    
+    @property
+    def dynamodb(self):
+        """取得済みかどうかを判定するFilmTableのDynamoDBリソース（最初の判定時に作成する）"""
+        if self._dynamodb is None:
+            self._dynamodb = resources.get_dynamodb_resource(self.dynamodb_endpoint)
+        return self._dynamodb
+    
+    def open_spider(self, spider):
+        self.stats = spider.crawler.stats
+        resources.load_env()
+        self.access_token = os.getenv('TMDB_ACCESS_TOKEN') or None
+    
+    def _stored_fetched_at(self, tmdb_id, spider):
+        """FilmTableに保存済みの詳細情報の取得日時"""
+        try:
+            response = self.dynamodb.Table(FILM_TABLE).get_item(
+                Key={'film_id': film_id_for(tmdb_id)},
+                ProjectionExpression='tmdb_details_fetched_at',
+            )
+        except Exception as e:
+            spider.logger.debug(f"FilmTable lookup failed for tmdb:{tmdb_id}: {type(e).__name__}: {e}")
+            return None
+        return response.get('Item', {}).get('tmdb_details_fetched_at')
+    
+    def _is_fresh(self, fetched_at):
+        try:
+            return datetime.now() - datetime.fromisoformat(fetched_at) < timedelta(seconds=self.details_ttl)
+        except (TypeError, ValueError):
+            return False
+    
+    @timed_stage('tmdb_details')
+    def process_item(self, item, spider):
+        if self.access_token is None or not isinstance(item, MovieItem):
+            return item
+        
+        adapter = ItemAdapter(item)
+        tmdb_id = adapter.get('tmdb_id')
+        if not tmdb_id or tmdb_id in self.known_ids:
+            return item
+        
+        if self._is_fresh(self._stored_fetched_at(tmdb_id, spider)):
+            self.known_ids.add(tmdb_id)
+            self.stats.inc_value('tmdb/details_known')
+            return item
+        
+        requests_before = self.tmdb_client.request_count
+        details = self.tmdb_client.get_movie_details(tmdb_id, append_to_response=self.append_to_response)
+        self.stats.inc_value('tmdb/details_requests', self.tmdb_client.request_count - requests_before)
+        if details:
+            adapter['tmdb_details'] = compact_details(details)
+            adapter['tmdb_details_fetched_at'] = datetime.now().isoformat()
+            self.known_ids.add(tmdb_id)
+            self.stats.inc_value('tmdb/details_fetched')
+        else:
+            spider.logger.warning(f"✗ TMDb details not available for ID {tmdb_id}")
+        return item
+
+
+class PosterPipeline:
+    """TMDbのポスター画像をダウンロードしてローカルに保存するパイプライン（POSTERS_ENABLED時のみ有効）
+
+    ダウンロードと縮小版の作成はスレッドプールで並行して行い、完了を待つ間も
+    他のアイテムの処理を進める。保存したファイル名をアイテムの poster_file に入れる。
+    ポスターを取得できなくてもアイテムは破棄しない。
+    """
+    
+    def __init__(self, store_dir='posters', image_base_url=None, source_size='w780',
+                 variants=('w185', 'w342'), concurrency=8):
+        from theater_scraper.tmdb_client import TMDbClient
+        self.store_dir = store_dir
+        self.image_base_url = image_base_url or TMDbClient.IMAGE_BASE_URL
+        self.source_size = source_size
+        self.variants = tuple(variants)
+        self.concurrency = concurrency
+        self.store = None
+        self.threadpool = None
+        self.stats = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('POSTERS_ENABLED'):
+            raise NotConfigured
+        return cls(
+            store_dir=settings.get('POSTER_STORE', 'posters'),
+            image_base_url=settings.get('POSTER_BASE_URL'),
+            source_size=settings.get('POSTER_SOURCE_SIZE', 'w780'),
+            variants=settings.getlist('POSTER_VARIANTS', ['w185', 'w342']),
+            concurrency=settings.getint('POSTER_CONCURRENCY', 8),
+        )
+    
+    def open_spider(self, spider):
+        from twisted.python.threadpool import ThreadPool
+        self.stats = spider.crawler.stats
+        self.store = PosterStore(
+            self.store_dir, self.image_base_url, source_size=self.source_size, variants=self.variants,
+        )
+        self.threadpool = ThreadPool(minthreads=0, maxthreads=self.concurrency, name='posters')
+        self.threadpool.start()
+        spider.logger.info(f"ポスター保存先: {self.store_dir}（保存済み {len(self.store.index)}件）")
+    
+    def close_spider(self, spider):
+        if self.threadpool is not None:
+            self.threadpool.stop()
+        if self.store is not None:
+            for name, count in self.store.counts.items():
+                self.stats.set_value(f'posters/{name}', count)
+    
+    def process_item(self, item, spider):
+        if not isinstance(item, MovieItem):
+            return item
+        adapter = ItemAdapter(item)
+        poster_path = adapter.get('tmdb_poster_path')
+        if not poster_path:
+            return item
+        
+        poster_file = self.store.lookup(poster_path)
+        if poster_file:
+            adapter['poster_file'] = poster_file
+            self.stats.inc_value('posters/skipped')
+            return item
+        
+        from twisted.internet import reactor
+        from twisted.internet.threads import deferToThreadPool
+        started = time.perf_counter()
+        d = deferToThreadPool(reactor, self.threadpool, self.store.fetch, poster_path)
+        d.addCallbacks(
+            self._stored, self._failed,
+            callbackArgs=(adapter, started), errbackArgs=(adapter, started, spider),
+        )
+        d.addBoth(lambda _: item)
+        return d
+    
+    def _stored(self, poster_file, adapter, started):
+        adapter['poster_file'] = poster_file
+        record_latency(self.stats, 'posters', time.perf_counter() - started)
+    
+    def _failed(self, failure, adapter, started, spider):
+        record_latency(self.stats, 'posters', time.perf_counter() - started)
+        self.stats.inc_value('posters/failed')
+        spider.logger.warning(
+            f"✗ Poster download failed: {adapter.get('tmdb_poster_path')} "
+            f"({failure.type.__name__}: {failure.getErrorMessage()})"
+        )
+
+
+class FeedExportPipeline:
+    """クロール終了時に静的JSONフィードを書き出すパイプライン（STATIC_FEEDS_ENABLED時のみ有効）
+
+    このクロールでアイテムを出力した映画館のシャードをDynamoDBから作り直し、
+    いずれかが変わった場合は書き出し済みの他の映画館のシャードと合わせて全作品の一覧を作り直す。
+    """
+    
+    def __init__(self, feed_dir='feeds', dynamodb_endpoint='http://localhost:8000', movie_storage='legacy',
+                 max_age=7 * 24 * 60 * 60):
+        self.feed_dir = feed_dir
+        self.dynamodb_endpoint = dynamodb_endpoint
+        self.movie_storage = movie_storage
+        self.max_age = max_age
+        # このクロールでアイテムを出力した映画館
+        self.theater_ids = set()
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('STATIC_FEEDS_ENABLED'):
+            raise NotConfigured
+        return cls(
+            feed_dir=settings.get('STATIC_FEED_DIR', 'feeds'),
+            dynamodb_endpoint=settings.get('DYNAMODB_ENDPOINT', 'http://localhost:8000'),
+            movie_storage=settings.get('MOVIE_STORAGE', 'legacy'),
+            max_age=settings.getfloat('STATIC_FEED_MAX_AGE', 7 * 24 * 60 * 60),
+        )
+    
+    def process_item(self, item, spider):
+        theater_id = ItemAdapter(item).get('theater_id')
+        if theater_id:
+            self.theater_ids.add(theater_id)
+        return item
+    
+    def close_spider(self, spider):
+        if not self.theater_ids:
+            return
+        stats = spider.crawler.stats
+        started = time.perf_counter()
+        try:
+            writer = self._export(resources.get_dynamodb_resource(self.dynamodb_endpoint))
+        except Exception as e:
+            spider.logger.error(f"フィードの書き出しに失敗しました: {type(e).__name__}: {e}")
+            stats.inc_value('feeds/errors')
+            return
+        elapsed = time.perf_counter() - started
+        stats.set_value('feeds/written', len(writer.written))
+        stats.set_value('feeds/unchanged', len(writer.unchanged))
+        stats.set_value('feeds/bytes_written', writer.bytes_written)
+        stats.set_value('feeds/seconds', elapsed)
+        spider.logger.info(
+            f"フィード書き出し: {len(writer.written)}件更新 / {len(writer.unchanged)}件変更なし "
+            f"({elapsed:.2f}秒, {self.feed_dir})"
+        )
+    
+    def _export(self, dynamodb):
+        writer = FeedWriter(self.feed_dir)
+        feeds = {}
+        film_cache = {}
+        for theater_id in sorted(self.theater_ids):
+            feeds[theater_id] = load_theater_feed(
+                dynamodb, theater_id, self.movie_storage, max_age=self.max_age, film_cache=film_cache,
+            )
+            writer.write(theater_shard(theater_id), feeds[theater_id])
+        
+        # 映画館のシャードが変わらなければ全作品の一覧も変わらない
+        if writer.written or not writer.shard_path(GLOBAL_SHARD).exists():
+            for theater_id in writer.theater_ids():
+                if theater_id not in feeds:
+                    feed = writer.read(theater_shard(theater_id))
+                    if feed is not None:
+                        feeds[theater_id] = feed
+            writer.write(GLOBAL_SHARD, build_global_feed(feeds))
+        writer.save_manifest()
+        return writer
+
+
+class SearchIndexPipeline:
+    """クロール終了時に全文検索インデックスを更新するパイプライン（SEARCH_INDEX_ENABLED時のみ有効）
+
+    このクロールで取得した作品のタイトル・原題・あらすじを反映し、内容が変わった作品が
+    あれば検索用インデックスを作り直す。batch_size 指定時（MEMORY_BOUNDED）は、その件数ごとに
+    文書の保存先（docs.sqlite3）へ書き出してメモリに溜めない。
+    """
+    
+    def __init__(self, index_dir='search', batch_size=None):
+        self.index_dir = Path(index_dir)
+        self.batch_size = batch_size
+        self.documents = {}
+        self.store = None
+        # 内容が変わった文書の数
+        self.changed = 0
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SEARCH_INDEX_ENABLED'):
+            raise NotConfigured
+        return cls(
+            index_dir=crawler.settings.get('SEARCH_INDEX_DIR', 'search'),
+            batch_size=bounded_batch_size(crawler.settings),
+        )
+    
+    def _flush(self):
+        if self.store is None:
+            self.store = DocumentStore(self.index_dir / DOCS_FILE)
+        self.changed += self.store.update(self.documents)
+        self.documents = {}
+    
+    def process_item(self, item, spider):
+        if isinstance(item, MovieItem):
+            adapter = ItemAdapter(item)
+            self.documents[adapter.get('detail_url')] = {name: adapter.get(name) for name, _ in FIELD_WEIGHTS}
+            if self.batch_size and len(self.documents) >= self.batch_size:
+                self._flush()
+        return item
+    
+    def close_spider(self, spider):
+        if not self.documents and self.store is None:
+            return
+        stats = spider.crawler.stats
+        started = time.perf_counter()
+        try:
+            self._flush()
+            index_path = self.index_dir / INDEX_FILE
+            if self.changed or not index_path.exists():
+                total = write_index(index_path, self.store)
+            else:
+                total = self.store.count()
+        except Exception as e:
+            spider.logger.error(f"検索インデックスの更新に失敗しました: {type(e).__name__}: {e}")
+            stats.inc_value('search_index/errors')
+            return
+        finally:
+            if self.store is not None:
+                self.store.close()
+        elapsed = time.perf_counter() - started
+        stats.set_value('search_index/changed', self.changed)
+        stats.set_value('search_index/documents', total)
+        stats.set_value('search_index/seconds', elapsed)
+        spider.logger.info(f"検索インデックス更新: {self.changed}件変更 / 全{total}件 ({elapsed:.2f}秒)")
+
+
+class ChangeLogPipeline:
+    """クロールごとの変更ログ（追加・削除・変更された上映）を書き出すパイプライン（CHANGE_LOG_ENABLED時のみ有効）
+
+    DynamoDBに保存した後のアイテムを前回までのハッシュと比べる。削除の判定は
+    クロールが正常に終了し、クロール予算で詳細ページを次回に回していない場合のみ行う。
+    """
+    
+    def __init__(self, log_dir='changes', stats=None):
+        self.log_dir = log_dir
+        self.stats = stats
+        self.change_log = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CHANGE_LOG_ENABLED'):
+            raise NotConfigured
+        pipeline = cls(log_dir=crawler.settings.get('CHANGE_LOG_DIR', 'changes'), stats=crawler.stats)
+        # 終了理由が必要なため、close_spiderではなくspider_closedで書き出す
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+    
+    def open_spider(self, spider):
+        # シャード実行時は担当する詳細ページだけを削除の判定対象にする
+        self.change_log = ChangeLog(
+            self.log_dir,
+            spider.name,
+            shard_index=getattr(spider, 'shard_index', 0),
+            shard_count=getattr(spider, 'shard_count', 1),
+        )
+    
+    def process_item(self, item, spider):
+        if isinstance(item, MovieItem):
+            adapter = ItemAdapter(item)
+            film_id = film_id_for(adapter.get('tmdb_id'), adapter.get('title'), adapter.get('release_year'))
+            self.change_log.observe(
+                adapter.get('theater_id'),
+                adapter.get('detail_url'),
+                film_id,
+                {name: adapter.get(name) for name in TRACKED_FIELDS},
+            )
+        return item
+    
+    def spider_closed(self, spider, reason):
+        if self.change_log is None:
+            return
+        detect_removed = reason == 'finished' and not self.stats.get_value('budget/exhausted')
+        if not detect_removed:
+            spider.logger.info(f"変更ログ: 削除の判定を省略します（終了理由: {reason}）")
+        try:
+            changes = self.change_log.commit(detect_removed=detect_removed)
+        except Exception as e:
+            spider.logger.error(f"変更ログの書き出しに失敗しました: {type(e).__name__}: {e}")
+            self.stats.inc_value('changes/errors')
+            return
+        finally:
+            self.change_log.close()
+        for op, count in changes.items():
+            self.stats.inc_value(f"changes/{op}", count)
+        if changes:
+            spider.logger.info(f"変更ログ: {sum(changes.values())}件 -> {self.change_log.path}")
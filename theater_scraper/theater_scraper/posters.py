@@ -0,0 +1,181 @@
+"""
+ポスター画像のローカル保存
+
+TMDbのポスター画像をダウンロードし、内容のSHA-256をファイル名にして保存する。
+同じ画像は映画館・作品をまたいで1ファイルになり、保存済みの画像は再ダウンロードしない。
+元画像に加えて、幅を揃えた縮小版（TMDbの画像サイズ名と同じ w185 など）を作成する。
+
+    <POSTER_STORE>/
+        index.tsv                      poster_path とファイル名の対応（追記のみ）
+        w780/ab/ab12...ef.jpg          元画像（POSTER_SOURCE_SIZE）
+        w185/ab/ab12...ef.jpg          縮小版（POSTER_VARIANTS）
+
+ファイル名（'ab/ab12...ef.jpg'）はアイテムの poster_file に入れ、フロントエンドは
+'<サイズ>/<poster_file>' で参照する。縮小にはPillowを使い、Pillowが無い場合は
+TMDbが配信している同じ幅の画像をダウンロードする。
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+INDEX_FILE = 'index.tsv'
+
+
+def poster_file_for(body, poster_path):
+    """画像の内容から保存ファイル名（<ハッシュの先頭2文字>/<ハッシュ><拡張子>）を決める"""
+    digest = hashlib.sha256(body).hexdigest()
+    suffix = Path(poster_path).suffix.lower() or '.jpg'
+    return f"{digest[:2]}/{digest}{suffix}"
+
+
+@lru_cache(maxsize=None)
+def _pil_image():
+    """Pillowの Image モジュール（最初の縮小時に読み込む。未インストールならNone）"""
+    try:
+        from PIL import Image
+    except ImportError:  # Pillowはオプション
+        return None
+    return Image
+
+
+def _size_width(size):
+    """TMDbの画像サイズ名（'w185'）の幅"""
+    return int(size[1:])
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class PosterStore:
+    """内容のハッシュで名前を付けたポスター画像の保存先
+
+    fetch() は複数のワーカースレッドから同時に呼ばれる前提で、同じ poster_path の
+    ダウンロードは1回にまとめる。
+    """
+
+    def __init__(self, directory, image_base_url, source_size='w780', variants=('w185', 'w342'),
+                 session=None, timeout=30):
+        self.directory = Path(directory)
+        self.image_base_url = image_base_url
+        self.source_size = source_size
+        self.variants = tuple(size for size in variants if size != source_size)
+        self._session = session
+        self.timeout = timeout
+        # 件数（downloaded / deduplicated / resized / variants_downloaded / bytes）
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._path_locks = {}
+        self.index = self._load_index()
+
+    @property
+    def session(self):
+        """HTTPセッション（requestsの読み込みとセッションの作成は最初のダウンロード時に行う）"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    self._session = requests.Session()
+        return self._session
+
+    def _load_index(self):
+        index = {}
+        path = self.directory / INDEX_FILE
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    poster_path, _, poster_file = line.rstrip('\n').partition('\t')
+                    if poster_file:
+                        index[poster_path] = poster_file
+        return index
+
+    def _add_to_index(self, poster_path, poster_file):
+        with self._lock:
+            self.index[poster_path] = poster_file
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / INDEX_FILE, 'a', encoding='utf-8') as f:
+                f.write(f"{poster_path}\t{poster_file}\n")
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.counts[name] += value
+
+    def _path_lock(self, poster_path):
+        with self._lock:
+            return self._path_locks.setdefault(poster_path, threading.Lock())
+
+    def lookup(self, poster_path):
+        """元画像と全ての縮小版が保存済みならファイル名、そうでなければNone"""
+        poster_file = self.index.get(poster_path)
+        if poster_file is None:
+            return None
+        for size in (self.source_size, *self.variants):
+            if not (self.directory / size / poster_file).exists():
+                return None
+        return poster_file
+
+    def fetch(self, poster_path):
+        """ポスターをダウンロードして元画像と縮小版を保存し、ファイル名を返す"""
+        with self._path_lock(poster_path):
+            # 同じポスターを待っていた間に他のスレッドが保存済み
+            poster_file = self.lookup(poster_path)
+            if poster_file:
+                return poster_file
+
+            body = self._download(self.source_size, poster_path)
+            poster_file = poster_file_for(body, poster_path)
+            source = self.directory / self.source_size / poster_file
+            if source.exists():
+                # 別のposter_pathで同じ内容の画像を保存済み
+                self._count('deduplicated')
+            else:
+                _write_atomic(source, body)
+                self._count('downloaded')
+                self._count('bytes', len(body))
+
+            for size in self.variants:
+                target = self.directory / size / poster_file
+                if not target.exists():
+                    _write_atomic(target, self._variant(body, size, poster_path))
+
+            self._add_to_index(poster_path, poster_file)
+            return poster_file
+
+    def _download(self, size, poster_path):
+        response = self.session.get(f"{self.image_base_url}{size}{poster_path}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def _variant(self, body, size, poster_path):
+        """縮小版の画像（Pillowが無い場合はTMDbから同じサイズをダウンロード）"""
+        if _pil_image() is None:
+            self._count('variants_downloaded')
+            return self._download(size, poster_path)
+        self._count('resized')
+        return self._resize(body, _size_width(size))
+
+    @staticmethod
+    def _resize(body, width):
+        Image = _pil_image()
+        with Image.open(io.BytesIO(body)) as image:
+            if image.width <= width:
+                return body
+            image_format = image.format or 'JPEG'
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            output = io.BytesIO()
+            if image_format == 'JPEG':
+                if resized.mode not in ('RGB', 'L'):
+                    resized = resized.convert('RGB')
+                resized.save(output, format=image_format, quality=85, optimize=True)
+            else:
+                resized.save(output, format=image_format)
+            return output.getvalue()
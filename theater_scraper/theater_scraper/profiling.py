@@ -0,0 +1,273 @@
+"""
+クロールのプロファイリング
+
+PROFILE_MODE に 'cprofile'（決定的プロファイル）または 'sample'（低負荷のサンプリング）を
+指定すると、1回のクロールごとに PROFILE_DIR へ次の2ファイルを保存する。
+
+- <spider>-<日時>.prof       pstats形式（snakeviz などで表示）
+- <spider>-<日時>.collapsed  折り畳みスタック形式（flamegraph.pl / speedscope で表示）
+
+PROFILE_FOCUS = True の場合は、スパイダーのコールバック（parse*）と
+パイプラインの process_item の実行中だけを計測対象にする。
+"""
+
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from theater_scraper.callbacks import wrap_pipeline_methods, wrap_spider_callbacks
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+def _is_focus_frame(code):
+    return code.co_name == 'process_item' or code.co_name.startswith('parse')
+
+
+def _frame_label(code):
+    return f"{Path(code.co_filename).stem}:{code.co_name}"
+
+
+def _pstats_label(func):
+    filename, lineno, name = func
+    return f"{Path(filename).stem}:{name}" if filename != '~' else name
+
+
+class _FocusGate:
+    """対象メソッドの実行中だけ計測を有効にする（ネストを考慮）"""
+
+    def __init__(self, enable, disable):
+        self.enable = enable
+        self.disable = disable
+        self.depth = 0
+
+    def wrap(self, func):
+        gate = self
+
+        def wrapper(*args, **kwargs):
+            gate.depth += 1
+            if gate.depth == 1:
+                gate.enable()
+            try:
+                result = func(*args, **kwargs)
+                # コールバックはジェネレータを返すため、反復中も計測する
+                if hasattr(result, '__next__') and not hasattr(result, '__anext__'):
+                    return gate._iterate(result)
+                return result
+            finally:
+                gate.depth -= 1
+                if gate.depth == 0:
+                    gate.disable()
+
+        return wrapper
+
+    def _iterate(self, iterator):
+        while True:
+            self.depth += 1
+            if self.depth == 1:
+                self.enable()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.disable()
+            yield value
+
+
+class StackSampler:
+    """別スレッドから対象スレッドのスタックを一定間隔で採取する"""
+
+    def __init__(self, thread_id, interval=0.005, focus=False):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.focus = focus
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            if self.focus:
+                # 最も外側の対象フレームから下だけを残す
+                for index, code in enumerate(stack):
+                    if _is_focus_frame(code):
+                        stack = stack[index:]
+                        break
+                else:
+                    continue
+            self.samples[tuple(stack)] += 1
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(';'.join(_frame_label(code) for code in stack) + f" {count}\n")
+
+    def write_pstats(self, path):
+        """採取したスタックからpstats形式のファイルを作成
+
+        自己時間は最上位フレーム、累積時間はスタック中の全フレームに
+        サンプル数×間隔を加算して求める。
+        """
+        entries = {}
+
+        def entry(code):
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if key not in entries:
+                entries[key] = [0, 0, 0.0, 0.0, Counter()]
+            return key, entries[key]
+
+        for stack, count in self.samples.items():
+            seconds = count * self.interval
+            seen = set()
+            caller_key = None
+            for code in stack:
+                key, data = entry(code)
+                if key not in seen:
+                    data[3] += seconds
+                    seen.add(key)
+                if caller_key is not None:
+                    data[4][caller_key] += count
+                caller_key = key
+            _, top = entry(stack[-1])
+            top[2] += seconds
+            top[0] += count
+            top[1] += count
+
+        stats = {}
+        for key, (cc, nc, tt, ct, callers) in entries.items():
+            stats[key] = (
+                max(cc, 1), max(nc, 1), tt, ct,
+                {caller: (n, n, n * self.interval, n * self.interval) for caller, n in callers.items()},
+            )
+        with open(path, 'wb') as f:
+            marshal.dump(stats, f)
+
+
+def write_collapsed_from_pstats(stats, path, max_depth=64):
+    """cProfileの結果から折り畳みスタックを作成
+
+    cProfileは呼び出し元と呼び出し先の組しか記録しないため、各関数について
+    最も時間の長い呼び出し元を辿ったスタックに自己時間（マイクロ秒）を割り当てる近似値。
+    """
+    raw = stats.stats
+    heaviest_caller = {}
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        if callers:
+            heaviest_caller[func] = max(callers.items(), key=lambda kv: kv[1][3])[0]
+
+    lines = Counter()
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        weight = int(tt * 1_000_000)
+        if weight <= 0:
+            continue
+        stack = [func]
+        current = func
+        while current in heaviest_caller and len(stack) < max_depth:
+            current = heaviest_caller[current]
+            if current in stack:
+                break
+            stack.append(current)
+        stack.reverse()
+        lines[';'.join(_pstats_label(f) for f in stack)] += weight
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for line, weight in lines.most_common():
+            f.write(f"{line} {weight}\n")
+
+
+class CrawlProfiler:
+    """PROFILE_MODE指定時にクロールをプロファイリングする拡張機能"""
+
+    def __init__(self, crawler, mode, output_dir, focus=False, interval=0.005):
+        self.crawler = crawler
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self.focus = focus
+        self.interval = interval
+        self.profiler = None
+        self.sampler = None
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mode = crawler.settings.get('PROFILE_MODE')
+        if not mode:
+            raise NotConfigured
+        if mode not in PROFILE_MODES:
+            raise NotConfigured(f"PROFILE_MODE must be one of {PROFILE_MODES}: {mode}")
+        ext = cls(
+            crawler,
+            mode,
+            crawler.settings.get('PROFILE_DIR', 'profiles'),
+            focus=crawler.settings.getbool('PROFILE_FOCUS'),
+            interval=crawler.settings.getfloat('PROFILE_SAMPLE_INTERVAL', 0.005),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        if self.mode == 'cprofile':
+            # PROFILE_MODE 未指定のクロールでは読み込まない
+            import cProfile
+            self.profiler = cProfile.Profile()
+            if self.focus:
+                self._install_focus(spider, _FocusGate(self.profiler.enable, self.profiler.disable))
+            else:
+                self.profiler.enable()
+        else:
+            self.sampler = StackSampler(threading.get_ident(), self.interval, focus=self.focus)
+            self.sampler.start()
+        spider.logger.info(f"プロファイリング開始: {self.mode}{' (focus)' if self.focus else ''}")
+
+    def _install_focus(self, spider, gate):
+        """スパイダーのparse*メソッドとパイプラインのprocess_itemを計測用に差し替える"""
+        wrap_spider_callbacks(spider, gate.wrap)
+        wrap_pipeline_methods(self.crawler, ('process_item',), gate.wrap)
+
+    def spider_closed(self, spider):
+        base = self.output_dir / f"{spider.name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        prof_path = base.with_suffix('.prof')
+        collapsed_path = base.with_suffix('.collapsed')
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(prof_path)
+            import pstats
+            write_collapsed_from_pstats(pstats.Stats(self.profiler), collapsed_path)
+        elif self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.write_pstats(prof_path)
+            self.sampler.write_collapsed(collapsed_path)
+            self.crawler.stats.set_value('profile/samples', sum(self.sampler.samples.values()))
+
+        self.crawler.stats.set_value('profile/file', str(prof_path))
+        spider.logger.info(f"プロファイル保存: {prof_path}, {collapsed_path}")
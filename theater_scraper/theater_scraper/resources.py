@@ -0,0 +1,80 @@
+"""
+プロセス内で共有する外部サービスのクライアント
+
+スパイダーの実行ごとにクライアントを作り直さず、同じプロセス内の
+クロール間（daemonモードなど）でTMDbセッション・キャッシュと
+DynamoDB接続を使い回す。
+
+boto3・requests・python-dotenv の読み込みとクライアントの作成は最初に使うときまで
+行わない（短いクロールの起動時間の多くを占めるため）。
+
+接続先が 'sqlite:<パス>' の場合はDynamoDBの代わりに組み込みSQLite（storage.SQLiteStorage）を使う。
+"""
+
+_tmdb_clients = {}
+_dynamodb_resources = {}
+_env_loaded = False
+
+
+def load_env():
+    """.envファイルを読み込む（プロセスごとに1回）"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_tmdb_client(access_token, cache_size=None):
+    """アクセストークンごとに共有のTMDbClientを返す（cache_size は最後に指定した値を使う）"""
+    client = _tmdb_clients.get(access_token)
+    if client is None:
+        from theater_scraper.tmdb_client import TMDbClient
+        client = TMDbClient(access_token, cache_size=cache_size)
+        _tmdb_clients[access_token] = client
+    else:
+        client.cache_size = cache_size
+    return client
+
+
+def get_dynamodb_resource(endpoint):
+    """接続先ごとに共有のDynamoDBリソース（'sqlite:<パス>' の場合はSQLiteStorage）を返す"""
+    resource = _dynamodb_resources.get(endpoint)
+    if resource is None and endpoint and endpoint.startswith('sqlite:'):
+        from theater_scraper.storage import SQLiteStorage
+        resource = SQLiteStorage.from_endpoint(endpoint)
+        _dynamodb_resources[endpoint] = resource
+    elif resource is None:
+        import boto3
+        resource = boto3.resource(
+            'dynamodb',
+            endpoint_url=endpoint,
+            region_name='ap-northeast-1',
+            aws_access_key_id='dummy',
+            aws_secret_access_key='dummy'
+        )
+        _dynamodb_resources[endpoint] = resource
+    return resource
+
+
+def set_dynamodb_resource(endpoint, resource):
+    """接続先のDynamoDBリソースを差し替える（ベンチマークのインメモリ実装など）"""
+    _dynamodb_resources[endpoint] = resource
+
+
+def flush_dynamodb_resource(endpoint):
+    """まとめて書き込む保存先（SQLiteStorage）のまだコミットしていない書き込みをコミットする"""
+    flush = getattr(_dynamodb_resources.get(endpoint), 'flush', None)
+    if flush is not None:
+        flush()
+
+
+def clear():
+    """共有クライアントを破棄する"""
+    _tmdb_clients.clear()
+    for resource in _dynamodb_resources.values():
+        # SQLiteStorageは残りの書き込みをコミットして閉じる
+        close = getattr(resource, 'close', None)
+        if close is not None:
+            close()
+    _dynamodb_resources.clear()
@@ -0,0 +1,179 @@
+"""
+複数プロセスでスパイダーを並列実行するランナー
+
+1プロセス1クロール（映画館またはシャード単位）で実行し、
+TMDb APIのレート制限とDynamoDBの書き込み設定を全プロセスで共有する。
+各クロールのScrapy statsは1つの実行レポートに集計する。
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from theater_scraper.metrics import summarize_stats
+from theater_scraper.tmdb_client import SharedRateLimiter, install_shared_rate_limiter
+
+# 合算ではなく最大値を取るstatsキー
+MAX_STATS_KEYS = {'elapsed_time_seconds'}
+MAX_STATS_PREFIXES = ('memusage/',)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CrawlJob:
+    """1プロセスで実行するクロールの単位"""
+    spider: str
+    shard_index: int = 0
+    shard_count: int = 1
+    spider_args: dict = field(default_factory=dict)
+
+    @property
+    def name(self):
+        if self.shard_count <= 1:
+            return self.spider
+        return f"{self.spider}[{self.shard_index}/{self.shard_count}]"
+
+
+def build_jobs(spider_names, shard_count=1, spider_args=None):
+    """スパイダー名とシャード数からジョブ一覧を作成"""
+    jobs = []
+    for spider in spider_names:
+        for shard_index in range(shard_count):
+            args = dict(spider_args or {})
+            if shard_count > 1:
+                args.update(shard_index=shard_index, shard_count=shard_count)
+            jobs.append(CrawlJob(spider, shard_index, shard_count, args))
+    return jobs
+
+
+def _init_worker(rate_limiter):
+    """子プロセス初期化: 共有レートリミッターを登録"""
+    install_shared_rate_limiter(rate_limiter)
+
+
+def run_crawl_job(job, settings_overrides):
+    """子プロセスで1つのクロールを実行し、statsを返す"""
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.setdict(settings_overrides, priority='cmdline')
+
+    process = CrawlerProcess(settings, install_root_handler=True)
+    crawler = process.create_crawler(job.spider)
+    process.crawl(crawler, **job.spider_args)
+    process.start()
+
+    return {
+        'job': job.name,
+        'pid': os.getpid(),
+        'stats': crawler.stats.get_stats() if crawler.stats else {},
+    }
+
+
+def merge_stats(stats_list):
+    """複数クロールのstatsを1つに集計
+
+    数値は合算（経過時間・最大値系は最大値）、開始時刻は最小、
+    終了時刻は最大を取る。文字列は値ごとの件数に変換する。
+    リスト（budget/deferred_urls など）は連結し、辞書はキーごとに同じ規則で集計する。
+    それ以外の型の値は集計できないため、キーをログに出力して除外する。
+    """
+    merged = {}
+    skipped = set()
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                merged[key] = merged.get(key, False) or value
+            elif isinstance(value, datetime):
+                current = merged.get(key)
+                if current is None:
+                    merged[key] = value
+                elif key.startswith('start'):
+                    merged[key] = min(current, value)
+                else:
+                    merged[key] = max(current, value)
+            elif isinstance(value, (int, float)):
+                if (key in MAX_STATS_KEYS or key.startswith(MAX_STATS_PREFIXES)
+                        or 'max' in key.split('/')):
+                    merged[key] = max(merged.get(key, value), value)
+                else:
+                    merged[key] = merged.get(key, 0) + value
+            elif isinstance(value, str):
+                count_key = f"{key}/{value}"
+                merged[count_key] = merged.get(count_key, 0) + 1
+            elif isinstance(value, (list, tuple)):
+                merged[key] = list(merged.get(key, [])) + list(value)
+            elif isinstance(value, dict):
+                merged[key] = merge_stats([merged.get(key, {}), value])
+            else:
+                skipped.add(key)
+    if skipped:
+        logger.warning(f"集計できないstatsを除外しました: {', '.join(sorted(skipped))}")
+    return merged
+
+
+def run_multicrawl(jobs, settings_overrides=None, processes=None, tmdb_request_delay=0.1):
+    """ジョブをプロセスプールで実行し、実行レポートを返す"""
+    settings_overrides = settings_overrides or {}
+    # Twistedのreactorはfork後に再利用できないため、spawnで毎回新しいプロセスを起動する
+    context = multiprocessing.get_context('spawn')
+    rate_limiter = SharedRateLimiter(tmdb_request_delay, context=context)
+
+    started_at = datetime.now()
+    start = time.monotonic()
+    results = []
+    failures = []
+
+    with ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count(),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(rate_limiter,),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = {
+            executor.submit(run_crawl_job, job, settings_overrides): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failures.append({'job': job.name, 'error': f"{type(e).__name__}: {e}"})
+
+    elapsed = time.monotonic() - start
+    merged = merge_stats(result['stats'] for result in results)
+    merged['multicrawl/jobs'] = len(jobs)
+    merged['multicrawl/failed_jobs'] = len(failures)
+    merged['multicrawl/elapsed_time_seconds'] = elapsed
+    merged['multicrawl/items_per_second'] = (
+        merged.get('item_scraped_count', 0) / elapsed if elapsed > 0 else 0.0
+    )
+    # 比率系のメトリクスはプロセスごとの値を合算できないため、合算後の件数から計算し直す
+    merged.update(summarize_stats(merged, elapsed))
+
+    return {
+        'started_at': started_at,
+        'finished_at': datetime.now(),
+        'processes': processes or os.cpu_count(),
+        'stats': merged,
+        'jobs': sorted(results, key=lambda r: r['job']),
+        'failures': failures,
+    }
+
+
+def write_report(report, path):
+    """実行レポートをJSONで保存"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True, default=str)
@@ -0,0 +1,342 @@
+"""
+作品の全文検索インデックス（文字bigram）
+
+タイトル・原題・あらすじを2文字ずつの文字bigramに分けた転置インデックスで、
+タイトルの一部やあらすじのキーワードから detail_url を検索する
+（DynamoDBのScanとクライアント側の絞り込みを使わずに済む）。
+
+    <SEARCH_INDEX_DIR>/
+        docs.sqlite3    文書ごとのbigramと重み（内容が変わった文書だけを分割し直す）
+        search.idx      検索用インデックス（mmapで開いて配列のまま二分探索する）
+
+search.idx の構成（数値はネイティブのバイト順、各領域は8バイト境界に揃える）:
+
+    ヘッダー   magic, version, 文書数, bigram数, ポスティング数, URL領域のバイト数
+    URL        detail_url を改行区切りで並べたもの（文書IDの順）
+    terms      bigram（uint64、昇順）
+    offsets    bigramごとのポスティングの開始位置（uint32、bigram数 + 1）
+    doc_ids    文書ID（uint32、bigramごとに昇順）
+    weights    重み付き出現回数（uint16）
+
+bigramは2文字のコードポイントを1つの整数（1文字目 << 21 | 2文字目）にしたもの。
+文書には各属性の末尾の1文字（2文字目が0）も含め、1文字の検索はその文字で始まる
+bigramの連続した範囲をまとめて引く。
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+INDEX_FILE = 'search.idx'
+DOCS_FILE = 'docs.sqlite3'
+
+# 検索対象の属性と重み（タイトルの一致を優先する）
+FIELD_WEIGHTS = (
+    ('title', 3),
+    ('original_title', 2),
+    ('synopsis', 1),
+)
+
+_MAGIC = b'TSBI'
+_VERSION = 1
+_HEADER = struct.Struct('=4sHHIIII')
+_CHAR_BITS = 21
+_MAX_WEIGHT = 0xFFFF
+# 候補数のこの倍よりポスティングが長い場合は、辞書にせず候補ごとに二分探索する
+_BISECT_RATIO = 8
+# 保存済みの文書を照会するときに1回のSQLに含める件数
+_LOOKUP_CHUNK = 500
+
+# 空白・句読点・記号（bigramに含めない）
+_NON_WORD = re.compile(r'[\W_]+')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    detail_url TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    terms BLOB NOT NULL,
+    weights BLOB NOT NULL
+);
+'''
+
+
+def normalize_text(text):
+    """全角半角・大文字小文字を揃え、空白と記号を取り除く"""
+    return _NON_WORD.sub('', unicodedata.normalize('NFKC', text).casefold())
+
+
+def bigrams(text):
+    """正規化した文字列の文字bigram"""
+    codes = [ord(char) for char in normalize_text(text)]
+    return [first << _CHAR_BITS | second for first, second in zip(codes, codes[1:])]
+
+
+def document_terms(fields):
+    """文書の {bigram: 重み付き出現回数}（各属性の末尾の1文字を含む）"""
+    counts = Counter()
+    for name, weight in FIELD_WEIGHTS:
+        text = normalize_text(fields.get(name) or '')
+        if not text:
+            continue
+        codes = [ord(char) for char in text]
+        for first, second in zip(codes, codes[1:]):
+            counts[first << _CHAR_BITS | second] += weight
+        counts[codes[-1] << _CHAR_BITS] += weight
+    return counts
+
+
+def _fingerprint(fields):
+    data = json.dumps([fields.get(name) or '' for name, _ in FIELD_WEIGHTS], ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class DocumentStore:
+    """文書ごとのbigramの保存先（インデックスの再構築時に文書を分割し直さないため）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def _fingerprints(self, detail_urls):
+        """保存済みの文書のうち detail_urls の {detail_url: fingerprint}"""
+        fingerprints = {}
+        for start in range(0, len(detail_urls), _LOOKUP_CHUNK):
+            chunk = detail_urls[start:start + _LOOKUP_CHUNK]
+            fingerprints.update(self.conn.execute(
+                f"SELECT detail_url, fingerprint FROM documents WHERE detail_url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ))
+        return fingerprints
+
+    def update(self, documents):
+        """{detail_url: {属性: 値}} を保存し、内容が変わった文書の数を返す"""
+        fingerprints = self._fingerprints(list(documents))
+        rows = []
+        for detail_url, fields in documents.items():
+            fingerprint = _fingerprint(fields)
+            if fingerprints.get(detail_url) == fingerprint:
+                continue
+            counts = document_terms(fields)
+            terms = array('Q', sorted(counts))
+            weights = array('H', (min(counts[term], _MAX_WEIGHT) for term in terms))
+            rows.append((detail_url, fingerprint, terms.tobytes(), weights.tobytes()))
+        if rows:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO documents (detail_url, fingerprint, terms, weights) VALUES (?, ?, ?, ?)',
+                    rows,
+                )
+        return len(rows)
+
+    def replace_all(self, documents):
+        """保存済みの文書を documents だけに置き換える（全件の再構築用）"""
+        keep = set(documents)
+        removed = [
+            (detail_url,) for (detail_url,) in self.conn.execute('SELECT detail_url FROM documents')
+            if detail_url not in keep
+        ]
+        with self.conn:
+            self.conn.executemany('DELETE FROM documents WHERE detail_url = ?', removed)
+        return self.update(documents) + len(removed)
+
+    def iter_documents(self):
+        """detail_url順に (detail_url, bigram配列, 重み配列)"""
+        for detail_url, terms_blob, weights_blob in self.conn.execute(
+            'SELECT detail_url, terms, weights FROM documents ORDER BY detail_url'
+        ):
+            terms = array('Q')
+            terms.frombytes(terms_blob)
+            weights = array('H')
+            weights.frombytes(weights_blob)
+            yield detail_url, terms, weights
+
+
+def write_index(path, store):
+    """文書の保存先から検索用インデックスを作成し、一時ファイル経由で置き換える"""
+    postings = {}
+    urls = []
+    for doc_id, (detail_url, terms, weights) in enumerate(store.iter_documents()):
+        urls.append(detail_url)
+        for term, weight in zip(terms, weights):
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = (array('I'), array('H'))
+            entry[0].append(doc_id)
+            entry[1].append(weight)
+
+    sorted_terms = array('Q', sorted(postings))
+    offsets = array('I', [0])
+    doc_ids = array('I')
+    weights = array('H')
+    for term in sorted_terms:
+        term_docs, term_weights = postings[term]
+        doc_ids.extend(term_docs)
+        weights.extend(term_weights)
+        offsets.append(len(doc_ids))
+
+    url_bytes = '\n'.join(urls).encode('utf-8')
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, 0, len(urls), len(sorted_terms), len(doc_ids), len(url_bytes)))
+        for section in (url_bytes, sorted_terms, offsets, doc_ids, weights):
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(section if isinstance(section, bytes) else section.tobytes())
+    os.replace(tmp_path, path)
+    return len(urls)
+
+
+def update_search_index(directory, documents):
+    """クロールで取得した文書を反映し、変更があれば検索用インデックスを作り直す
+
+    Returns:
+        (内容が変わった文書数, インデックスの文書数)
+    """
+    directory = Path(directory)
+    store = DocumentStore(directory / DOCS_FILE)
+    try:
+        changed = store.update(documents)
+        index_path = directory / INDEX_FILE
+        if changed or not index_path.exists():
+            return changed, write_index(index_path, store)
+        return changed, store.count()
+    finally:
+        store.close()
+
+
+class SearchIndex:
+    """mmapで開いた検索用インデックス"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, _, doc_count, term_count, posting_count, url_length = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            view.release()
+            self._mmap.close()
+            raise ValueError(f"Not a search index: {self.path}")
+
+        offset = _HEADER.size
+        sections = []
+        for length in (url_length, 8 * term_count, 4 * (term_count + 1), 4 * posting_count, 2 * posting_count):
+            offset = _align(offset)
+            sections.append(view[offset:offset + length])
+            offset += length
+        url_view, terms, offsets, doc_ids, weights = sections
+        self.urls = bytes(url_view).decode('utf-8').split('\n') if doc_count else []
+        url_view.release()
+        self._view = view
+        self.terms = terms.cast('Q')
+        self.offsets = offsets.cast('I')
+        self.doc_ids = doc_ids.cast('I')
+        self.weights = weights.cast('H')
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for view in (self.terms, self.offsets, self.doc_ids, self.weights, self._view):
+            view.release()
+        self._mmap.close()
+
+    def _idf(self, document_frequency):
+        return math.log(1 + len(self.urls) / document_frequency)
+
+    def _posting_range(self, term):
+        index = bisect_left(self.terms, term)
+        if index == len(self.terms) or self.terms[index] != term:
+            return None
+        return self.offsets[index], self.offsets[index + 1]
+
+    def _postings(self, start, end, idf):
+        """ポスティングの範囲を {文書ID: 重み × idf} にする"""
+        return dict(zip(
+            self.doc_ids[start:end].tolist(),
+            [weight * idf for weight in self.weights[start:end].tolist()],
+        ))
+
+    def _score_char(self, code):
+        """1文字の検索: その文字で始まる全てのbigramのスコアを合算"""
+        first = bisect_left(self.terms, code << _CHAR_BITS)
+        last = bisect_left(self.terms, (code + 1) << _CHAR_BITS)
+        scores = Counter()
+        for index in range(first, last):
+            start, end = self.offsets[index], self.offsets[index + 1]
+            scores.update(self._postings(start, end, self._idf(end - start)))
+        return scores
+
+    def _score_terms(self, terms):
+        """全てのbigramを含む文書のスコア（ポスティングの短いbigramから絞り込む）"""
+        ranges = []
+        for term in set(terms):
+            posting_range = self._posting_range(term)
+            if posting_range is None:
+                return {}
+            ranges.append(posting_range)
+        ranges.sort(key=lambda item: item[1] - item[0])
+
+        start, end = ranges[0]
+        scores = self._postings(start, end, self._idf(end - start))
+        for start, end in ranges[1:]:
+            idf = self._idf(end - start)
+            if len(scores) * _BISECT_RATIO < end - start:
+                # 候補が少なければポスティングを二分探索する
+                matched = {}
+                for doc_id, score in scores.items():
+                    index = bisect_left(self.doc_ids, doc_id, start, end)
+                    if index < end and self.doc_ids[index] == doc_id:
+                        matched[doc_id] = score + self.weights[index] * idf
+            else:
+                postings = self._postings(start, end, idf)
+                matched = {doc_id: scores[doc_id] + postings[doc_id] for doc_id in scores.keys() & postings.keys()}
+            if not matched:
+                return {}
+            scores = matched
+        return scores
+
+    def rank(self, query, limit=20):
+        """スコアの高い順に (detail_url, スコア) を返す"""
+        text = normalize_text(query)
+        if not text:
+            return []
+        scores = self._score_char(ord(text)) if len(text) == 1 else self._score_terms(bigrams(text))
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.urls[doc_id], score) for doc_id, score in top]
+
+    def search(self, query, limit=20):
+        """スコアの高い順の detail_url"""
+        return [detail_url for detail_url, _ in self.rank(query, limit)]
@@ -12,7 +12,13 @@ BOT_NAME = "theater_scraper"
 SPIDER_MODULES = ["theater_scraper.spiders"]
 NEWSPIDER_MODULE = "theater_scraper.spiders"
 
-ADDONS = {}
+# プロジェクト独自のコマンド (scrapy multicrawl など)
+COMMANDS_MODULE = "theater_scraper.commands"
+
+ADDONS = {
+    # MEMORY_BOUNDED=True の場合のみ有効（段階間のキューを小さくする）
+    "theater_scraper.memory.MemoryBoundedMode": 0,
+}
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -48,28 +54,50 @@ RANDOMIZE_DOWNLOAD_DELAY = True
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "theater_scraper.middlewares.TheaterScraperSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    # JOBDIR指定時のみ有効（未完了アイテムの保存と再開時の再出力）
+    "theater_scraper.middlewares.JobStateMiddleware": 500,
+    "theater_scraper.middlewares.DetailPriorityMiddleware": 550,
+    # EARLY_FILTER_ENABLED時のみ有効（スパイダーの直後で不正・重複のアイテムと詳細ページのリクエストを破棄）
+    "theater_scraper.middlewares.TheaterScraperSpiderMiddleware": 600,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "theater_scraper.middlewares.TheaterScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # CRAWL_TIME_BUDGET / CRAWL_REQUEST_BUDGET指定時のみ有効
+    "theater_scraper.middlewares.CrawlBudgetMiddleware": 40,
+    # ARCHIVE_REPLAY指定時のみ有効（robots.txtより前でネットワークを使わずに応答）
+    "theater_scraper.middlewares.ArchiveReplayMiddleware": 50,
+    # ARCHIVE_ENABLED時のみ有効（HttpCompressionMiddleware(590)で展開後の本文を保存）
+    "theater_scraper.middlewares.ResponseArchiveMiddleware": 580,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "theater_scraper.metrics.CrawlMetrics": 500,
+    # PROFILE_MODE指定時のみ有効
+    "theater_scraper.profiling.CrawlProfiler": 510,
+    # MEMORY_REPORT_ENABLED=True の場合のみ有効
+    "theater_scraper.memory.MemoryReport": 520,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     "theater_scraper.pipelines.ValidationPipeline": 100,
     "theater_scraper.pipelines.TMDbPipeline": 200,
+    "theater_scraper.pipelines.TMDbEnrichmentPipeline": 250,
+    # POSTERS_ENABLED時のみ有効
+    "theater_scraper.pipelines.PosterPipeline": 260,
     "theater_scraper.pipelines.DynamoDBPipeline": 300,
+    # STATIC_FEEDS_ENABLED時のみ有効
+    "theater_scraper.pipelines.FeedExportPipeline": 400,
+    # SEARCH_INDEX_ENABLED時のみ有効
+    "theater_scraper.pipelines.SearchIndexPipeline": 410,
+    # CHANGE_LOG_ENABLED時のみ有効
+    "theater_scraper.pipelines.ChangeLogPipeline": 420,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
@@ -96,6 +124,163 @@ AUTOTHROTTLE_DEBUG = True
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
 
+# DynamoDB設定
+# multicrawlで起動する全プロセスがこの接続先に書き込む
+# "sqlite:<パス>"（例: "sqlite:data/theater.sqlite3"）の場合はDynamoDBの代わりに組み込みSQLiteに保存する
+# （DynamoDB Local不要、テーブルは自動的に作成）
+DYNAMODB_ENDPOINT = "http://localhost:8000"
+# 作品の保存先
+# "legacy": 従来どおりMovieTableにdetail_url単位で保存
+# "both": MovieTableに加えてFilmTable・ShowingTableにも保存（移行期間用）
+# "canonical": 作品情報はFilmTableに1件、映画館ごとの上映はShowingTableに保存（MovieTableには書き込まない）
+# "both" / "canonical" にする前に create_tables.py でFilmTable・ShowingTableを作成する（README参照）
+MOVIE_STORAGE = "legacy"
+# MovieTableの保存形式
+# "plain": 属性名・ISO形式の日時・あらすじをそのまま保存
+# "compact": 短い属性名・UNIX時間・圧縮したあらすじ（Binary）で保存（読み込み時は自動的に戻す）
+# 保存済みのレコードは scrapy moviecodec migrate で変換する
+MOVIE_CODEC = "plain"
+# あらすじの圧縮方式（"zlib" または "zstd"、zstandardが無い場合はzlib）
+MOVIE_CODEC_COMPRESSION = "zlib"
+
+# 上映回設定
+# 詳細ページのスケジュール表から上映回（開始・終了日時とスクリーン）を取得し、
+# ShowtimeTableに映画館・開始日時の順で保存する（scrapy showtimes で時間帯を指定して検索）
+# 有効にする前に create_tables.py でShowtimeTableを作成する
+SHOWTIMES_ENABLED = False
+
+# multicrawl設定
+# 同時に起動するクロールプロセス数（Noneの場合はCPUコア数）
+MULTICRAWL_PROCESSES = None
+# 1スパイダーあたりのシャード数
+MULTICRAWL_SHARDS = 1
+# 全プロセスで共有するTMDb APIのリクエスト間隔（秒）
+MULTICRAWL_TMDB_REQUEST_DELAY = 0.1
+# 集計したstatsの出力先
+MULTICRAWL_REPORT_FILE = "multicrawl_report.json"
+
+# TMDb API設定
+# False の場合はTMDbの検索と詳細情報の取得を行わない
+# （scrapy reparse はTMDB_CASSETTEの再生時以外は無効にしてネットワークへ出ない）
+TMDB_ENABLED = True
+
+# TMDb詳細情報の取得設定
+# 新たに見つかった作品のみ、詳細と以下の追加情報を1回のリクエストで取得してFilmTableに保存する
+TMDB_ENRICH_ENABLED = True
+TMDB_DETAILS_APPEND = ["credits", "images"]
+# 保存済みの詳細情報を再取得するまでの秒数
+TMDB_DETAILS_TTL = 30 * 24 * 60 * 60
+
+# ポスター画像設定
+# TMDbのポスターを並行してダウンロードし、内容のハッシュをファイル名にしてPOSTER_STOREに保存する
+POSTERS_ENABLED = False
+POSTER_STORE = "posters"
+# ダウンロードする元画像と、作成する縮小版のサイズ（TMDbの画像サイズ名）
+# 縮小にはPillowを使い、Pillowが無い場合はTMDbから同じサイズの画像をダウンロードする
+POSTER_SOURCE_SIZE = "w780"
+POSTER_VARIANTS = ["w185", "w342"]
+# 同時にダウンロードする数
+POSTER_CONCURRENCY = 8
+# 画像の配信元（Noneの場合はTMDbの画像サーバー）
+POSTER_BASE_URL = None
+
+# 静的フィード設定
+# クロール終了時に映画館ごと・全映画館の上映中作品のJSON（gzip・brotli圧縮版付き）をSTATIC_FEED_DIRに書き出す
+# 内容が変わったファイルだけを書き換える
+STATIC_FEEDS_ENABLED = False
+STATIC_FEED_DIR = "feeds"
+# 最終更新からこの秒数を過ぎた上映はフィードに含めない（0で全て）
+STATIC_FEED_MAX_AGE = 7 * 24 * 60 * 60
+
+# 全文検索インデックス設定
+# クロール終了時にタイトル・原題・あらすじの文字bigramインデックスをSEARCH_INDEX_DIRに更新する
+# 検索: scrapy searchindex query "夏の"
+SEARCH_INDEX_ENABLED = False
+SEARCH_INDEX_DIR = "search"
+
+# 変更ログ設定
+# クロールごとに追加・削除・変更された上映を CHANGE_LOG_DIR/<日時>-<スパイダー名>-<pid>.jsonl に書き出す
+# 各行の seq は全クロールを通した通し番号
+CHANGE_LOG_ENABLED = False
+CHANGE_LOG_DIR = "changes"
+
+# 使用メモリを抑えるモード
+# 映画館・作品数が増えても使用メモリがほぼ一定になるよう、段階間のキュー（CONCURRENT_ITEMS・
+# SCRAPER_SLOT_MAX_ACTIVE_SIZE）を小さくし、処理済みの集合とTMDbのキャッシュの件数に上限を設け、
+# 検索インデックスの文書をMEMORY_BOUNDED_BATCH_SIZE件ごとにディスクへ書き出す
+MEMORY_BOUNDED = False
+MEMORY_BOUNDED_CACHE_SIZE = 10000
+MEMORY_BOUNDED_BATCH_SIZE = 500
+# 処理段階ごとのメモリ使用量をtracemallocで計測してstatsとログに出力する（処理が遅くなるため調査時のみ）
+MEMORY_REPORT_ENABLED = False
+# レポートのJSONの書き出し先（Noneで書き出さない）
+MEMORY_REPORT_FILE = None
+# ログとレポートに出力するメモリ確保の多い行の数
+MEMORY_REPORT_TOP = 10
+
+# daemon設定
+# 映画館（スパイダー）ごとのクロール間隔
+# {"interval": 秒} または {"cron": "分 時 日 月 曜日"} で指定する
+CRAWL_SCHEDULES = {
+    "cinema_qualite": {"interval": 3 * 60 * 60},
+}
+# CRAWL_SCHEDULESに無いスパイダーのスケジュール
+CRAWL_DEFAULT_SCHEDULE = None
+# ヘルス情報を公開するポート（0で無効）
+DAEMON_HEALTH_PORT = 6080
+# ヘルス情報の書き出し先（Noneで無効）
+DAEMON_HEALTH_FILE = None
+
+# クロール予算設定
+# 1回のクロールで使える時間（秒）と詳細ページのリクエスト数（0で無制限）
+# 上限に達すると残りの詳細ページは次回に回し、statsのbudget/deferred*に記録する
+CRAWL_TIME_BUDGET = 0
+CRAWL_REQUEST_BUDGET = 0
+# 詳細ページを 未保存 > TMDb未取得 > 古い > 最近更新 の順にクロールする
+DETAIL_PRIORITY_ENABLED = True
+# 最終更新からこの秒数を過ぎた作品を再取得の対象とする
+CRAWL_STALE_AFTER = 24 * 60 * 60
+
+# 早期の絞り込み設定
+# 必須フィールドが空のアイテム、クロール中に既に出力したアイテム（映画館・作品・上映回）と
+# 詳細ページのリクエストを、TMDb・DynamoDBのパイプラインに渡す前に破棄する（statsのearly_filter/*）
+EARLY_FILTER_ENABLED = True
+
+# 中断・再開設定
+# scrapy crawl cinema_qualite -s JOBDIR=jobs/cinema_qualite-1 のように指定すると
+# リクエストキュー・既読URL・TMDb検索結果・未完了アイテムを保存して再開できる
+# scrapy jobs コマンドが参照するジョブディレクトリの親ディレクトリ
+JOBS_DIR = "jobs"
+
+# メトリクス設定
+# ダウンロード・各パイプラインの処理時間ヒストグラム、items/sec、TMDb呼び出し数、
+# キャッシュヒット率、DynamoDB書き込みユニットをstatsに記録する
+METRICS_ENABLED = True
+# Prometheusテキスト形式の出力先（{spider}はスパイダー名に置換、Noneで無効）
+METRICS_PROMETHEUS_FILE = None
+# クロール中に http://127.0.0.1:<port>/metrics で公開するポート（0で無効）
+METRICS_PROMETHEUS_PORT = 0
+
+# プロファイリング設定
+# 'cprofile'（決定的）または 'sample'（低負荷のサンプリング）、Noneで無効
+# 例: scrapy crawl cinema_qualite -s PROFILE_MODE=sample -s PROFILE_FOCUS=True
+PROFILE_MODE = None
+PROFILE_DIR = "profiles"
+# スパイダーのparse*とパイプラインのprocess_itemの実行中だけを計測する
+PROFILE_FOCUS = False
+# サンプリング間隔（秒）
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# レスポンスアーカイブ設定
+# 一覧・詳細ページのレスポンスを ARCHIVE_DIR/<spider>/<日時>-<pid>.arc に保存する
+ARCHIVE_ENABLED = False
+ARCHIVE_DIR = "archive"
+ARCHIVE_COMPRESSION_LEVEL = 6
+# アーカイブから再生する場合のファイルまたはディレクトリ（scrapy reparseが設定する）
+ARCHIVE_REPLAY = None
+# 指定した時刻（UNIX時間）以前に取得したレコードのみ再生する
+ARCHIVE_REPLAY_UNTIL = None
+
 # TMDb API設定
 # 環境変数から読み込むため、ここでは設定しない
 # TMDB_ACCESS_TOKENを.envファイルに設定してください
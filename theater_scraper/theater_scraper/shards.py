@@ -0,0 +1,17 @@
+"""
+詳細ページ単位のシャード分割
+
+multicrawl / reparse の --shards で1つの映画館を複数プロセスに分けるとき、
+詳細ページのURLのCRC32で担当するシャードを決める。スパイダーとクロール結果を
+シャード単位で比較する処理（変更ログの削除判定など）で同じ規則を使う。
+"""
+
+import zlib
+
+
+def in_shard(detail_url, shard_index=0, shard_count=1):
+    """詳細ページURLが shard_index 番目のシャードの担当かどうか"""
+    shard_count = int(shard_count)
+    if shard_count <= 1:
+        return True
+    return zlib.crc32(detail_url.encode('utf-8')) % shard_count == int(shard_index)
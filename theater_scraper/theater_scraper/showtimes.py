@@ -0,0 +1,188 @@
+"""
+上映スケジュール（上映回）
+
+詳細ページのスケジュール表（日付の行と開始時刻のセル）を上映回ごとの開始・終了日時と
+スクリーンに変換し、ShowtimeTableに映画館・開始日時の順に並べて保存する。
+
+- ShowtimeTable (PK theater_id, SK start_key): start_key は '<開始日時>#<スクリーン>#<detail_url>'。
+  開始日時は映画館の現地時刻の 'YYYY-MM-DDTHH:MM' のため、文字列の順序が時刻の順序になる
+- show_date-index (PK show_date, SK start_key): 全映画館の上映回を日付ごとに引く
+- expires_at: 終了から EXPIRE_AFTER 秒後（DynamoDBのTTL）
+
+「この映画館で1時間以内に始まる上映」は start_key の範囲を指定した1回のクエリで引ける
+（showtimes_between）。日付・時刻は正規表現1回と整数の計算だけで解析し、
+年の無い日付はクロールした日に最も近い年とみなす。
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+SHOWTIME_TABLE = 'ShowtimeTable'
+DATE_INDEX = 'show_date-index'
+
+# 終了後もこの秒数はテーブルに残す（その後はTTLで削除される）
+EXPIRE_AFTER = 24 * 60 * 60
+
+# 6/20(金)・2025/6/20・6月20日
+_DATE = re.compile(r'(?:(\d{4})\s*[/年.\-]\s*)?(\d{1,2})\s*[/月]\s*(\d{1,2})')
+# 10:00・10:00～11:58・25:30（深夜は翌日）
+_TIME_RANGE = re.compile(r'(\d{1,2})[:：](\d{2})(?:\s*[~～〜\-－–]\s*(\d{1,2})[:：](\d{2}))?')
+_SCREEN = re.compile(r'(?:シアター|スクリーン|screen|theater)\s*[0-9０-９A-Za-z]+|[0-9A-Z]スクリーン', re.IGNORECASE)
+_RUNTIME = re.compile(r'(\d+)\s*分')
+
+
+def resolve_date(text, today):
+    """日付のテキストをdateにする（年が無ければ today に最も近い年、解析できなければNone）"""
+    match = _DATE.search(text)
+    if match is None:
+        return None
+    year, month, day = match.groups()
+    month, day = int(month), int(day)
+    if year:
+        try:
+            return date(int(year), month, day)
+        except ValueError:
+            return None
+    candidates = []
+    for candidate_year in (today.year - 1, today.year, today.year + 1):
+        try:
+            candidates.append(date(candidate_year, month, day))
+        except ValueError:  # 2/29・存在しない日付
+            continue
+    if not candidates:
+        return None
+    return min(candidates, key=lambda candidate: abs((candidate - today).days))
+
+
+def parse_runtime(text):
+    """'118分' を分の整数にする（無ければNone）"""
+    match = _RUNTIME.search(text or '')
+    return int(match.group(1)) if match else None
+
+
+def parse_cell(text, show_date, runtime=None):
+    """開始時刻のセルを (開始, 終了, スクリーン) にする（時刻が無ければNone）
+
+    終了時刻がセルに無ければ開始時刻に上映時間（分）を足す（上映時間も不明ならNone）。
+    """
+    match = _TIME_RANGE.search(text)
+    if match is None:
+        return None
+    start_hour, start_minute, end_hour, end_minute = match.groups()
+    midnight = datetime(show_date.year, show_date.month, show_date.day)
+    starts_at = midnight + timedelta(hours=int(start_hour), minutes=int(start_minute))
+    if end_hour is not None:
+        ends_at = midnight + timedelta(hours=int(end_hour), minutes=int(end_minute))
+        if ends_at <= starts_at:  # 日付をまたぐ
+            ends_at += timedelta(days=1)
+    elif runtime:
+        ends_at = starts_at + timedelta(minutes=runtime)
+    else:
+        ends_at = None
+    screen = _SCREEN.search(text)
+    return starts_at, ends_at, screen.group(0) if screen else None
+
+
+def parse_schedule(rows, runtime=None, today=None):
+    """スケジュール表の行 [(日付のテキスト, [セルのテキスト, ...]), ...] を上映回の一覧にする
+
+    Returns:
+        開始日時の順に並べた [(開始, 終了, スクリーン), ...]（同じ上映回は1件にまとめる）
+    """
+    today = today or date.today()
+    showtimes = set()
+    for label, cells in rows:
+        show_date = resolve_date(label, today)
+        if show_date is None:
+            continue
+        for cell in cells:
+            showtime = parse_cell(cell, show_date, runtime)
+            if showtime is not None:
+                showtimes.add(showtime)
+    return sorted(showtimes, key=lambda showtime: (showtime[0], showtime[2] or ''))
+
+
+def format_time(value):
+    """ShowtimeTableに保存する日時の形式（分まで）"""
+    return value.strftime('%Y-%m-%dT%H:%M')
+
+
+def start_key(starts_at, screen, detail_url):
+    """ShowtimeTableのソートキー"""
+    return f"{starts_at}#{screen or ''}#{detail_url}"
+
+
+def build_showtime_record(adapter, now=None):
+    """ShowtimeItemからShowtimeTableのレコードを作成"""
+    starts_at = adapter.get('starts_at')
+    ends_at = adapter.get('ends_at')
+    record = {
+        'theater_id': adapter.get('theater_id'),
+        'start_key': start_key(starts_at, adapter.get('screen'), adapter.get('detail_url')),
+        'show_date': starts_at[:10],
+        'starts_at': starts_at,
+        'detail_url': adapter.get('detail_url'),
+        'title': adapter.get('title'),
+        'expires_at': int(datetime.fromisoformat(ends_at or starts_at).timestamp()) + EXPIRE_AFTER,
+        'updated_at': now or datetime.now().isoformat(),
+    }
+    if ends_at:
+        record['ends_at'] = ends_at
+    if adapter.get('screen'):
+        record['screen'] = adapter.get('screen')
+    return record
+
+
+def _query(table, **kwargs):
+    while True:
+        response = table.query(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def showtimes_between(dynamodb, theater_id, start, end):
+    """映画館の start 以降 end より前に始まる上映回（開始日時の順）"""
+    return list(_query(
+        dynamodb.Table(SHOWTIME_TABLE),
+        KeyConditionExpression='theater_id = :theater_id AND start_key BETWEEN :start AND :end',
+        ExpressionAttributeValues={
+            ':theater_id': theater_id,
+            ':start': format_time(start),
+            ':end': format_time(end),
+        },
+    ))
+
+
+def showtimes_starting(dynamodb, start, end):
+    """全映画館の start 以降 end より前に始まる上映回（日付ごとに show_date-index を1回ずつ引く）"""
+    table = dynamodb.Table(SHOWTIME_TABLE)
+    showtimes = []
+    day = start.date()
+    while day <= end.date():
+        showtimes.extend(_query(
+            table,
+            IndexName=DATE_INDEX,
+            KeyConditionExpression='show_date = :show_date AND start_key BETWEEN :start AND :end',
+            ExpressionAttributeValues={
+                ':show_date': day.isoformat(),
+                ':start': format_time(start),
+                ':end': format_time(end),
+            },
+        ))
+        day += timedelta(days=1)
+    return showtimes
+
+
+def future_showtimes(dynamodb, theater_id, now):
+    """映画館の now 以降に始まる上映回の {start_key: detail_url}"""
+    return {
+        item['start_key']: item['detail_url']
+        for item in _query(
+            dynamodb.Table(SHOWTIME_TABLE),
+            KeyConditionExpression='theater_id = :theater_id AND start_key >= :now',
+            ExpressionAttributeValues={':theater_id': theater_id, ':now': format_time(now)},
+            ProjectionExpression='start_key, detail_url',
+        )
+    }
@@ -1,6 +1,9 @@
 import scrapy
 from datetime import datetime
-from theater_scraper.items import TheaterItem, MovieItem
+from theater_scraper.extractors import extract_movie_detail
+from theater_scraper.items import TheaterItem, MovieItem, ShowtimeItem
+from theater_scraper.shards import in_shard
+from theater_scraper.showtimes import format_time, parse_runtime, parse_schedule
 
 
 class CinemaQualiteSpider(scrapy.Spider):
@@ -10,17 +13,26 @@ class CinemaQualiteSpider(scrapy.Spider):
     
     theater_id = "cinema_qualite"
     theater_name = "新宿シネマカリテ"
+    
+    # シャード指定（multicrawlから -a shard_index=0 -a shard_count=4 のように渡される）
+    shard_index = 0
+    shard_count = 1
+    
+    def _in_shard(self, detail_url):
+        """詳細ページURLがこのシャードの担当かどうか"""
+        return in_shard(detail_url, self.shard_index, self.shard_count)
 
     def parse(self, response):
         """映画館情報と作品一覧をスクレイピング"""
         
-        # 映画館情報を生成
-        theater_item = TheaterItem()
-        theater_item['theater_id'] = self.theater_id
-        theater_item['name'] = self.theater_name
-        theater_item['official_url'] = "https://qualite.musashino-k.jp/"
-        theater_item['last_updated'] = datetime.now().isoformat()
-        yield theater_item
+        # 映画館情報を生成（シャード実行時は先頭シャードのみ）
+        if int(self.shard_index) == 0:
+            theater_item = TheaterItem()
+            theater_item['theater_id'] = self.theater_id
+            theater_item['name'] = self.theater_name
+            theater_item['official_url'] = "https://qualite.musashino-k.jp/"
+            theater_item['last_updated'] = datetime.now().isoformat()
+            yield theater_item
         
         # 上映中の作品情報を取得
         # 全ての/movies/リンクから映画情報を取得
@@ -45,74 +57,26 @@ class CinemaQualiteSpider(scrapy.Spider):
                 
                 if detail_url not in processed_urls:
                     processed_urls.add(detail_url)
+                    if not self._in_shard(detail_url):
+                        continue
                     # 詳細ページをリクエスト
                     yield scrapy.Request(detail_url, callback=self.parse_movie_detail)
     
     def parse_movie_detail(self, response):
         """映画詳細ページから情報を抽出"""
         try:
-            # タイトル
-            title = response.css('h1 b::text').get()
-            if not title:
-                title = response.css('h1::text').get()
+            detail = extract_movie_detail(response.selector.root)
             
+            title = detail['title']
             if not title:
                 self.logger.warning(f"タイトルが取得できませんでした: {response.url}")
                 return
             
             title = title.strip()
-            
-            # 映画情報をdlリストから取得
-            movie_info = {}
-            for dl in response.css('dl'):
-                dt_text = dl.css('dt b::text').get()
-                if not dt_text:
-                    dt_text = dl.css('dt::text').get()
-                
-                dd_text = dl.css('dd p::text').get()
-                if not dd_text:
-                    dd_text = dl.css('dd::text').get()
-                
-                if dt_text and dd_text:
-                    movie_info[dt_text.strip()] = dd_text.strip()
-            
-            # 公式サイトURL
-            official_website = None
-            if '公式HP' in movie_info:
-                # URLを含むaタグから取得
-                official_link = response.xpath('//dt[contains(text(), "公式HP")]/following-sibling::dd//a/@href').get()
-                if official_link:
-                    official_website = official_link
-            
-            # 製作年を抽出
-            release_year = None
-            if '制作年／制作国' in movie_info:
-                import re
-                year_match = re.search(r'(\d{4})年', movie_info['制作年／制作国'])
-                if year_match:
-                    release_year = int(year_match.group(1))
-            
-            # あらすじ
-            synopsis_texts = []
-            # メインのテキストコンテナから取得（.is-metaクラスを除外）
-            for text_block in response.css('.module-text'):
-                # .is-metaクラスを持つ要素をスキップ
-                if text_block.css('.text.is-meta'):
-                    continue
-                # テキストを含むpタグを取得
-                for p in text_block.css('.text p'):
-                    text = p.css('::text').get()
-                    if text and text.strip():
-                        # 上映期間やスタッフ情報を除外
-                        if not any(keyword in text for keyword in ['上映期間:', '上映時間:', '©', '(C)']):
-                            synopsis_texts.append(text.strip())
-            
-            synopsis = ' '.join(synopsis_texts)
-            if len(synopsis) > 200:
-                synopsis = synopsis[:200] + "..."
-            
-            # 上映期間
-            showing_period = movie_info.get('上映期間', '')
+            release_year = detail['release_year']
+            official_website = detail['official_website']
+            synopsis = detail['synopsis']
+            showing_period = detail['showing_period']
             
             # MovieItemを作成
             movie_item = MovieItem()
@@ -126,10 +90,31 @@ class CinemaQualiteSpider(scrapy.Spider):
             movie_item['created_at'] = datetime.now().isoformat()
             movie_item['updated_at'] = datetime.now().isoformat()
             
+            # スケジュール表の上映回（SHOWTIMES_ENABLED時のみ）
+            showtimes = []
+            if self.settings.getbool('SHOWTIMES_ENABLED', False) and detail['schedule']:
+                runtime = parse_runtime(detail['movie_info'].get('上映時間'))
+                showtimes = parse_schedule(detail['schedule'], runtime)
+                # 上映回を1件も解析できなかった場合（セルの書式の変更など）は、
+                # 保存済みの上映回を消えたものとして削除しないよう解析済みにしない
+                if showtimes:
+                    movie_item['showtimes_parsed'] = True
+            
             self.logger.info(f"映画詳細取得: {title} ({release_year}) - {official_website}")
             
             yield movie_item
             
+            if showtimes:
+                for starts_at, ends_at, screen in showtimes:
+                    showtime_item = ShowtimeItem()
+                    showtime_item['theater_id'] = self.theater_id
+                    showtime_item['detail_url'] = response.url
+                    showtime_item['title'] = title
+                    showtime_item['starts_at'] = format_time(starts_at)
+                    showtime_item['ends_at'] = format_time(ends_at) if ends_at else None
+                    showtime_item['screen'] = screen
+                    yield showtime_item
+            
         except Exception as e:
             self.logger.error(f"詳細ページ解析エラー ({response.url}): {e}")
     
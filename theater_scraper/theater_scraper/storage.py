@@ -0,0 +1,324 @@
+"""
+保存先（DynamoDB / 組み込みSQLite）
+
+パイプライン・ミドルウェア・コマンドは resources.get_dynamodb_resource(DYNAMODB_ENDPOINT) で
+得たオブジェクトの Table(name) に対して、boto3のTableの次の操作だけを使う。
+
+- put_item(Item=..., ReturnConsumedCapacity=...) / get_item(Key=..., ProjectionExpression=...)
+- delete_item(Key=...) / batch_writer()（put_item・delete_item）
+- query(KeyConditionExpression=..., ExpressionAttributeValues=..., IndexName=..., ProjectionExpression=...)
+  キー条件はパーティションキーの等価条件と、ソートキーの BETWEEN・比較のみ
+- scan(ProjectionExpression=..., ExclusiveStartKey=...)
+
+DYNAMODB_ENDPOINT が 'sqlite:<パス>'（例: 'sqlite:data/theater.sqlite3'、'sqlite::memory:'）の場合は、
+同じ操作をSQLiteで実装した SQLiteStorage を使い、DynamoDB Localなどの外部サービス無しで
+同じプロセス内で動かす。
+
+- 各テーブルはキーとGSIのキーの列、レコード全体（JSON）の列を持つSQLiteのテーブルにし、
+  GSI（theater_id-index など）と同じ列にインデックスを作る
+- WALモードで、書き込みは COMMIT_EVERY 件または COMMIT_INTERVAL 秒ごとにまとめてコミットする
+  （同じ接続からはコミット前の書き込みも読める。flush() / close() で残りをコミットする）。
+  COMMIT_INTERVAL 秒の時点で次の書き込みが無くてもタイマーでコミットするため、ダウンロード待ちの間に
+  書き込みロックを持ち続けず、同じファイルに書き込む他のプロセス（multicrawlのシャード・reparse・daemon）を待たせない
+- 数値はboto3と同じくDecimalで、Binaryはbytesで返す
+- TTL属性（expires_at）を過ぎたレコードは開いたときに削除する
+"""
+
+import atexit
+import base64
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+
+from theater_scraper.movie_codec import item_size
+
+SQLITE_SCHEME = 'sqlite:'
+
+# テーブル名 -> (キー, {インデックス名: キー}, TTL属性)
+# キーはパーティションキー、または (パーティションキー, ソートキー)。create_tables.py と同じ構成
+TABLES = {
+    'TheaterTable': ('theater_id', {}, None),
+    'MovieTable': ('detail_url', {'theater_id-index': 'theater_id'}, None),
+    'FilmTable': ('film_id', {}, None),
+    'ShowingTable': ('detail_url', {'film_id-index': 'film_id', 'theater_id-index': 'theater_id'}, None),
+    'ShowtimeTable': (
+        ('theater_id', 'start_key'), {'show_date-index': ('show_date', 'start_key')}, 'expires_at',
+    ),
+}
+
+# まとめてコミットする書き込み件数と間隔（秒）
+COMMIT_EVERY = 500
+COMMIT_INTERVAL = 1.0
+# scan の1ページの件数
+SCAN_PAGE_SIZE = 1000
+
+_KEY_CONDITION = re.compile(
+    r'^\s*(\w+)\s*=\s*(:\w+)'
+    r'(?:\s+AND\s+(\w+)\s*(?:BETWEEN\s+(:\w+)\s+AND\s+(:\w+)|(=|<=|<|>=|>)\s*(:\w+)))?\s*$',
+    re.IGNORECASE,
+)
+
+
+def is_sqlite_endpoint(endpoint):
+    return bool(endpoint) and endpoint.startswith(SQLITE_SCHEME)
+
+
+def _key_names(key):
+    return key if isinstance(key, tuple) else (key,)
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return {'$b': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (set, frozenset)):
+        # 要素のDecimal・bytesはjson.dumpsがこの関数で変換する
+        return {'$s': sorted(value)}
+    if hasattr(value, 'value') and isinstance(value.value, bytes):  # boto3のBinary
+        return {'$b': base64.b64encode(value.value).decode('ascii')}
+    raise TypeError(f"Unsupported type: {type(value).__name__}")
+
+
+def _decode_object(data):
+    if len(data) == 1:
+        if '$b' in data:
+            return base64.b64decode(data['$b'])
+        if '$s' in data:
+            return set(data['$s'])
+    return data
+
+
+def encode_item(item):
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'), default=_encode_value)
+
+
+def decode_item(text):
+    # boto3と同じく数値はDecimalで返す
+    return json.loads(text, parse_int=Decimal, parse_float=Decimal, object_hook=_decode_object)
+
+
+def _column(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _project(item, projection):
+    if not projection:
+        return item
+    names = [name.strip() for name in projection.split(',')]
+    return {name: item[name] for name in names if name in item}
+
+
+class SQLiteTable:
+    """boto3のTable互換（storageモジュールの docstring の操作のみ）のSQLiteテーブル"""
+
+    def __init__(self, storage, name, key, indexes, ttl_attribute=None):
+        self.storage = storage
+        self.name = name
+        self.key_names = _key_names(key)
+        self.indexes = {index: _key_names(index_key) for index, index_key in indexes.items()}
+        self.ttl_attribute = ttl_attribute
+        # キー・GSIのキー・TTLの列
+        self.columns = list(self.key_names)
+        for index_key in self.indexes.values():
+            self.columns.extend(name for name in index_key if name not in self.columns)
+        if ttl_attribute:
+            self.columns.append(ttl_attribute)
+        self._table = _column(name)
+        column_list = ', '.join(map(_column, self.columns))
+        placeholders = ', '.join('?' for _ in range(len(self.columns) + 1))
+        updates = ', '.join(
+            f"{_column(column)} = excluded.{_column(column)}"
+            for column in [*self.columns[len(self.key_names):], 'item']
+        )
+        # 既存の行はrowidを保ったまま更新する（scan中の書き換えで同じ行を再び返さない）
+        self._upsert = (
+            f"INSERT INTO {self._table} ({column_list}, item) VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(map(_column, self.key_names))}) DO UPDATE SET {updates}"
+        )
+        self._key_where = ' AND '.join(f"{_column(name)} = ?" for name in self.key_names)
+
+    def create(self, connection):
+        definitions = ', '.join(f"{_column(column)}" for column in self.columns)
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} ({definitions}, item TEXT NOT NULL, "
+            f"PRIMARY KEY ({', '.join(map(_column, self.key_names))}))"
+        )
+        for index, index_key in self.indexes.items():
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {_column(f'{self.name}.{index}')} "
+                f"ON {self._table} ({', '.join(map(_column, index_key))})"
+            )
+        if self.ttl_attribute:
+            connection.execute(
+                f"DELETE FROM {self._table} WHERE {_column(self.ttl_attribute)} < ?", (int(time.time()),)
+            )
+
+    def _key_values(self, key):
+        return [key[name] for name in self.key_names]
+
+    def put_item(self, Item, ReturnConsumedCapacity='NONE', **kwargs):
+        # DynamoDBと同じくキー属性の無いアイテムは保存しない（ValidationException相当）
+        missing = [name for name in self.key_names if Item.get(name) is None]
+        if missing:
+            raise ValueError(f"Missing the key {', '.join(missing)} in the item for {self.name}")
+        values = [Item.get(column) for column in self.columns]
+        if self.ttl_attribute and values[-1] is not None:
+            values[-1] = int(values[-1])
+        self.storage._write(self._upsert, (*values, encode_item(Item)))
+        response = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+        if ReturnConsumedCapacity != 'NONE':
+            units = max(1, math.ceil(item_size(Item) / 1024))
+            response['ConsumedCapacity'] = {'TableName': self.name, 'CapacityUnits': float(units)}
+        return response
+
+    def delete_item(self, Key, **kwargs):
+        self.storage._write(f"DELETE FROM {self._table} WHERE {self._key_where}", self._key_values(Key))
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    @contextmanager
+    def batch_writer(self):
+        """batch_writer互換（書き込みは通常どおり COMMIT_EVERY 件・COMMIT_INTERVAL 秒ごとにコミットし、抜けるときに残りをコミットする）"""
+        yield self
+        self.storage.flush()
+
+    def get_item(self, Key, ProjectionExpression=None, **kwargs):
+        rows = self.storage._read(
+            f"SELECT item FROM {self._table} WHERE {self._key_where}", self._key_values(Key)
+        )
+        if not rows:
+            return {}
+        return {'Item': _project(decode_item(rows[0][0]), ProjectionExpression)}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              ProjectionExpression=None, ScanIndexForward=True, **kwargs):
+        match = _KEY_CONDITION.match(KeyConditionExpression)
+        if match is None:
+            raise NotImplementedError(f"Unsupported KeyConditionExpression: {KeyConditionExpression}")
+        attribute, placeholder, sort_attribute, low, high, operator, operand = match.groups()
+        key_names = self.indexes[IndexName] if IndexName else self.key_names
+        if attribute != key_names[0]:
+            raise ValueError(f"{attribute} is not the partition key of {IndexName or self.name}")
+        if sort_attribute and sort_attribute not in key_names[1:]:
+            raise ValueError(f"{sort_attribute} is not the sort key of {IndexName or self.name}")
+
+        sql = f"SELECT item FROM {self._table} WHERE {_column(attribute)} = ?"
+        params = [ExpressionAttributeValues[placeholder]]
+        if sort_attribute and low:
+            sql += f" AND {_column(sort_attribute)} BETWEEN ? AND ?"
+            params += [ExpressionAttributeValues[low], ExpressionAttributeValues[high]]
+        elif sort_attribute:
+            sql += f" AND {_column(sort_attribute)} {operator} ?"
+            params.append(ExpressionAttributeValues[operand])
+        if len(key_names) > 1:
+            sql += f" ORDER BY {_column(key_names[1])} {'ASC' if ScanIndexForward else 'DESC'}"
+        items = [_project(decode_item(text), ProjectionExpression) for text, in self.storage._read(sql, params)]
+        return {'Items': items, 'Count': len(items)}
+
+    def scan(self, ProjectionExpression=None, ExclusiveStartKey=None, **kwargs):
+        """rowidの順に SCAN_PAGE_SIZE 件ずつ返す（LastEvaluatedKey は次のページの開始位置）"""
+        after = ExclusiveStartKey['rowid'] if ExclusiveStartKey else 0
+        rows = self.storage._read(
+            f"SELECT rowid, item FROM {self._table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after, SCAN_PAGE_SIZE),
+        )
+        response = {
+            'Items': [_project(decode_item(text), ProjectionExpression) for _, text in rows],
+            'Count': len(rows),
+        }
+        if len(rows) == SCAN_PAGE_SIZE:
+            response['LastEvaluatedKey'] = {'rowid': rows[-1][0]}
+        return response
+
+
+class SQLiteStorage:
+    """boto3のDynamoDBリソース互換（Tableのみ）の組み込みSQLite"""
+
+    def __init__(self, path, tables=None, commit_every=COMMIT_EVERY, commit_interval=COMMIT_INTERVAL):
+        self.path = str(path)
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # パイプラインのスレッドからも使うため、接続は1つにしてロックで直列化する
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False, timeout=30,
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._pending = 0
+        self._first_pending_at = 0.0
+        self._commit_timer = None
+        self.tables = {
+            name: SQLiteTable(self, name, key, indexes, ttl_attribute)
+            for name, (key, indexes, ttl_attribute) in (tables or TABLES).items()
+        }
+        with self._lock:
+            for table in self.tables.values():
+                table.create(self._connection)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_endpoint(cls, endpoint):
+        return cls(endpoint[len(SQLITE_SCHEME):])
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def _write(self, sql, params):
+        with self._lock:
+            if not self._pending:
+                self._connection.execute('BEGIN IMMEDIATE')
+                self._first_pending_at = time.monotonic()
+                # 次の書き込みが来なくても COMMIT_INTERVAL 秒後にコミットしてロックを手放す
+                self._commit_timer = threading.Timer(self.commit_interval, self.flush)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+            try:
+                self._connection.execute(sql, params)
+            except Exception:
+                # バッチの最初の書き込みで失敗したらトランザクションを開いたままにしない
+                # （以降の BEGIN が失敗し、書き込みロックも持ち続けるため）
+                if not self._pending:
+                    self._connection.execute('ROLLBACK')
+                    self._commit_timer.cancel()
+                    self._commit_timer = None
+                raise
+            self._pending += 1
+            if (self._pending >= self.commit_every
+                    or time.monotonic() - self._first_pending_at >= self.commit_interval):
+                self._commit()
+
+    def _read(self, sql, params):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def _commit(self):
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        if self._pending:
+            self._connection.execute('COMMIT')
+            self._pending = 0
+
+    def flush(self):
+        """まだコミットしていない書き込みをコミットする"""
+        with self._lock:
+            if self._connection is not None:
+                self._commit()
+
+    def close(self):
+        with self._lock:
+            if self._connection is None:
+                return
+            self._commit()
+            self._connection.close()
+            self._connection = None
+        atexit.unregister(self.close)
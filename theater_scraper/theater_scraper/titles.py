@@ -0,0 +1,128 @@
+"""
+作品タイトルの正規化
+
+映画館ごとに同じ作品のタイトル表記が揺れる（全角半角、「」と『』、～や―の後の副題、
+【字幕版】・4Kリマスターなどの上映形態の表記）ため、そのままではキャッシュや重複判定の
+キーが一致せず、TMDb検索もヒットしないことがある。
+
+- normalize_title: 表記を揃え、上映形態の表記を取り除いたタイトル
+- title_key: キャッシュ・重複判定・作品IDに使う照合用キー
+- search_variants: TMDb検索に使うタイトル候補（優先順）
+
+変換はstr.translateの変換表とコンパイル済みの正規表現で行う。
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# 全角英数記号 -> 半角、各種ダッシュ・波ダッシュ・全角スペースの統一
+_FOLD_TABLE = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+_FOLD_TABLE.update({
+    0x3000: ' ',     # 全角スペース
+    0x00A0: ' ',     # NBSP
+    0x301C: '~',     # 〜 波ダッシュ
+    0x2053: '~',     # ⁓
+    0x2015: '―',     # ― 水平線（副題の区切り）
+    0x2014: '―',     # — EMダッシュ
+    0x2500: '―',     # ─ 罫線
+    0x2010: '-',     # ‐
+    0x2013: '-',     # –
+    0x2212: '-',     # −
+    0x201C: '"',     # “
+    0x201D: '"',     # ”
+    0x2018: "'",     # ‘
+    0x2019: "'",     # ’
+    0x300E: '「',    # 『
+    0x300F: '」',    # 』
+})
+
+# 変換表の対象文字を含むかどうか（含まないタイトルはtranslateを省く）
+_FOLD_NEEDED = re.compile('[' + re.escape(''.join(map(chr, _FOLD_TABLE))) + ']')
+
+# 照合用キーで取り除く記号（空白・括弧・引用符・句読点・中黒など）
+# 数字の前の - と数字の間の . は意味を持つため残す（ゴジラ-1.0 と ゴジラ10 を区別する）
+_KEY_PUNCTUATION = re.compile(
+    r'[\s!-,/:-@\[-`{-~「」【】〈〉《》〔〕・、。…‥―☆★♪]+|-(?!\d)|(?<!\d)\.|\.(?!\d)'
+)
+
+# 上映形態・版の表記
+_TAG_WORDS = (
+    r'(?:日本語)?字幕(?:版|上映)?|(?:日本語)?吹(?:き)?替(?:え)?(?:版|上映)?'
+    r'|(?:4K|2K|HD)?(?:デジタル)?リマスター(?:版)?|(?:4K|2K)(?:版|上映)?'
+    r'|IMAX(?:版|上映)?|(?:3D|2D)(?:版|上映)?|ドルビーシネマ(?:版)?'
+    r'|完全版|特別版|劇場公開版|ディレクターズ・?カット(?:版)?|(?:応援|爆音|発声|特別|先行|極)上映'
+)
+# 上映形態の表記・括弧表記を含むかどうかの事前判定（含まないタイトルは正規表現による除去を省く）
+_TAG_HINT = re.compile(r'[【\[〔(~]|字幕|吹|リマスター|[24]K|IMAX|[23]D|ドルビー|版|カット|上映')
+# (字幕版)・【字幕版】・～4Kリマスター～ のように上映形態の語を含む括弧・波ダッシュ区切り
+# （【推しの子】のようにタイトルの一部の括弧は残す）
+_ENCLOSED_TAG = re.compile(
+    rf'\([^()]*?(?:{_TAG_WORDS})[^()]*\)|【[^【】]*?(?:{_TAG_WORDS})[^【】]*】'
+    rf'|\[[^\[\]]*?(?:{_TAG_WORDS})[^\[\]]*\]|〔[^〔〕]*?(?:{_TAG_WORDS})[^〔〕]*〕'
+    rf'|~[^~]*?(?:{_TAG_WORDS})[^~]*(?:~|$)'
+)
+# 先頭・末尾の単語が上映形態の語かどうか
+_TAG = re.compile(_TAG_WORDS)
+# 副題の区切り（～副題～、― 副題、 - 副題）
+_SUBTITLE = re.compile(r'\s*(?:~|―| - ).*$')
+# タイトル全体を囲む括弧・引用符（TMDb検索では外す）
+_ENCLOSING = re.compile(r'「([^「」]+)」|"([^"]+)"')
+# 半角カタカナ（濁点の合成が必要なためNFKCで変換する）
+_HALFWIDTH_KANA = re.compile('[｡-ﾟ]')
+
+
+def _strip_tags(text):
+    """上映形態の表記を取り除く（空白は1つに揃えた状態で返す）"""
+    text = _ENCLOSED_TAG.sub(' ', text)
+    words = text.split()
+    while words and _TAG.fullmatch(words[0]):
+        del words[0]
+    while words and _TAG.fullmatch(words[-1]):
+        del words[-1]
+    return ' '.join(words)
+
+
+def normalize_title(title):
+    """表記を揃え、上映形態の表記を取り除いたタイトル"""
+    if not title:
+        return ''
+    text = title.translate(_FOLD_TABLE) if _FOLD_NEEDED.search(title) else title
+    if _HALFWIDTH_KANA.search(text):
+        text = unicodedata.normalize('NFKC', text)
+    if _TAG_HINT.search(text):
+        stripped = _strip_tags(text)
+        # 表記を取り除くと空になる場合（タイトル自体が「4K」など）は元に戻す
+        if stripped:
+            return stripped
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=65536)
+def title_key(title):
+    """キャッシュ・重複判定に使う照合用キー
+
+    表記を揃えた上で大文字小文字を区別せず、空白・括弧・記号を取り除く。
+    """
+    return _KEY_PUNCTUATION.sub('', normalize_title(title).casefold())
+
+
+@lru_cache(maxsize=65536)
+def search_variants(title):
+    """TMDb検索に使うタイトル候補（優先順）
+
+    表記を揃えたタイトル（全体を囲む「」・引用符は外す）と、副題を除いたタイトル。
+    照合用キーが同じ候補は同じ検索とみなす（検索結果のキャッシュもキーで共有する）ため1つにまとめる。
+    """
+    normalized = normalize_title(title)
+    enclosed = _ENCLOSING.fullmatch(normalized)
+    if enclosed:
+        normalized = (enclosed.group(1) or enclosed.group(2)).strip()
+    variants = []
+    seen = set()
+    for variant in (normalized, _SUBTITLE.sub('', normalized)):
+        key = title_key(variant)
+        if variant and key not in seen:
+            seen.add(key)
+            variants.append(variant)
+    return tuple(variants)
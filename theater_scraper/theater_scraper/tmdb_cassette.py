@@ -0,0 +1,126 @@
+"""
+Record/replay cassette for TMDb API traffic
+"""
+
+import gzip
+import json
+import os
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+CASSETTE_MODES = ('record', 'replay')
+
+
+class CassetteMiss(LookupError):
+    """The replayed cassette has no response for the request"""
+
+
+def cassette_key(endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Normalized request key: endpoint plus sorted parameters
+
+    パラメータ名は小文字、値はNFC正規化して空白を詰める（Noneの値は除外）。
+    """
+    items = sorted(
+        (str(name).lower(), ' '.join(unicodedata.normalize('NFC', str(value)).split()))
+        for name, value in (params or {}).items()
+        if value is not None
+    )
+    return f"{endpoint.rstrip('/')}?{urlencode(items)}"
+
+
+class Cassette:
+    """
+    Request/response pairs stored in a gzip-compressed JSON Lines file
+
+    1行は {"k": キー, "s": ステータス, "b": レスポンスボディ}。
+    record モードでは実際のレスポンスを記録して save() で書き出し、
+    replay モードではネットワークへ出ずに記録済みのレスポンスを返す。
+    """
+
+    def __init__(self, path, mode: str = 'replay', latency: float = 0.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Cassette mode must be one of {CASSETTE_MODES}: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self.entries: Dict[str, Tuple[int, Any]] = {}
+        self.hits = 0
+        self.recorded = 0
+        # カセットに無かったリクエスト {キー: 回数}
+        self.missing: Counter = Counter()
+        if self.path.exists():
+            self.entries = self._load(self.path)
+        elif self.replaying:
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+
+    @classmethod
+    def from_env(cls) -> Optional['Cassette']:
+        """Build a cassette from TMDB_CASSETTE / TMDB_CASSETTE_MODE / TMDB_CASSETTE_LATENCY"""
+        path = os.getenv('TMDB_CASSETTE')
+        if not path:
+            return None
+        return cls(
+            path,
+            mode=os.getenv('TMDB_CASSETTE_MODE', 'replay'),
+            latency=float(os.getenv('TMDB_CASSETTE_LATENCY', 0)),
+        )
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    @staticmethod
+    def _load(path) -> Dict[str, Tuple[int, Any]]:
+        entries = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    entries[record['k']] = (record['s'], record['b'])
+        return entries
+
+    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Tuple[int, Any]]:
+        """Recorded (status, body) for the request, or None if the cassette does not contain it"""
+        if self.latency:
+            time.sleep(self.latency)
+        key = cassette_key(endpoint, params)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.missing[key] += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def record(self, endpoint: str, params: Optional[Dict[str, Any]], status: int, body: Any):
+        self.entries[cassette_key(endpoint, params)] = (status, body)
+        self.recorded += 1
+
+    def save(self):
+        """Write all entries (merged with the file on disk) via a temporary file"""
+        if not self.recorded:
+            return
+        entries = self._load(self.path) if self.path.exists() else {}
+        entries.update(self.entries)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for key, (status, body) in sorted(entries.items()):
+                f.write(json.dumps({'k': key, 's': status, 'b': body}, ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+        os.replace(tmp_path, self.path)
+        self.entries = entries
+        self.recorded = 0
+
+    def missing_report(self, limit: int = 20) -> str:
+        """Human-readable summary of requests that were not in the cassette"""
+        lines = [f"{len(self.missing)} requests not in cassette {self.path}:"]
+        for key, count in self.missing.most_common(limit):
+            lines.append(f"  {count:5d}  {key}")
+        if len(self.missing) > limit:
+            lines.append(f"  ... and {len(self.missing) - limit} more")
+        return '\n'.join(lines)
@@ -4,33 +4,188 @@ TMDb API client for fetching movie poster information
 
 import os
 import time
+import atexit
 import logging
 import json
-import requests
-from typing import Optional, Dict, Any
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional, Dict, Any, Sequence
 from pathlib import Path
 
-# TMDb API専用ロガーの設定
+from theater_scraper.tmdb_cassette import Cassette, CassetteMiss, cassette_key
+from theater_scraper.titles import title_key
+
+# TMDb API専用ロガー
 logger = logging.getLogger('tmdb_api')
-logger.setLevel(logging.DEBUG)
-
-# ファイルハンドラーの設定（TMDb APIログを別ファイルに出力）
-if not logger.handlers:
-    # プロジェクトルートディレクトリに固定してログを出力
-    log_file_path = Path(__file__).parent.parent.parent / 'tmdb_api.log'
-    fh = logging.FileHandler(log_file_path, encoding='utf-8')
-    fh.setLevel(logging.DEBUG)
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
+
+# プロジェクトルートディレクトリに固定してログを出力
+DEFAULT_LOG_FILE = Path(__file__).parent.parent.parent / 'tmdb_api.log'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# レスポンスボディをログに残す割合と最大文字数
+DEFAULT_BODY_SAMPLE_RATE = 0.1
+BODY_LOG_LIMIT = 2000
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Hand records to the listener thread without formatting them on the caller's thread"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # 同一プロセス内のキューなのでpickle用の整形は不要（メッセージの組み立てはリスナー側で行う）
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # キューが溢れた場合はクロールを止めずに破棄する
+            self.dropped += 1
+
+
+class _LazyJSON:
+    """JSON dump that is only built when the log record is formatted"""
+    
+    __slots__ = ('data', 'limit')
+    
+    def __init__(self, data, limit: Optional[int] = None):
+        self.data = data
+        self.limit = limit
+    
+    def __str__(self):
+        text = json.dumps(self.data, ensure_ascii=False, indent=2)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}... (truncated)"
+        return text
+
+
+_queue_handler: Optional[_DeferredQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_body_sample_rate = DEFAULT_BODY_SAMPLE_RATE
+# configure_logging() を呼んだかどうか（最初のクライアントの作成時に既定の設定で呼ぶ）
+_logging_configured = False
+
+
+def configure_logging(log_file=None, level=None, console_level=logging.INFO,
+                      max_bytes=None, backup_count=None, body_sample_rate=None,
+                      propagate=None, queue_size: int = 10000):
+    """
+    Route TMDb API logs through a queue to a background thread
+    
+    The caller only enqueues the record; formatting, rotation and disk writes
+    happen on the listener thread. Unspecified arguments are read from the
+    TMDB_LOG_FILE (empty disables the file), TMDB_LOG_LEVEL, TMDB_LOG_MAX_BYTES,
+    TMDB_LOG_BACKUP_COUNT, TMDB_LOG_BODY_SAMPLE_RATE and TMDB_LOG_PROPAGATE
+    environment variables.
+    """
+    global _queue_handler, _listener, _body_sample_rate, _logging_configured
+    shutdown_logging()
+    if not _logging_configured:
+        atexit.register(shutdown_logging)
+    _logging_configured = True
+    
+    if log_file is None:
+        log_file = os.getenv('TMDB_LOG_FILE', str(DEFAULT_LOG_FILE))
+    level = logging.getLevelName(level or os.getenv('TMDB_LOG_LEVEL', 'DEBUG').upper())
+    if max_bytes is None:
+        max_bytes = int(os.getenv('TMDB_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    if backup_count is None:
+        backup_count = int(os.getenv('TMDB_LOG_BACKUP_COUNT', 5))
+    if body_sample_rate is None:
+        body_sample_rate = float(os.getenv('TMDB_LOG_BODY_SAMPLE_RATE', DEFAULT_BODY_SAMPLE_RATE))
+    _body_sample_rate = body_sample_rate
+    if propagate is None:
+        propagate = os.getenv('TMDB_LOG_PROPAGATE', 'true').lower() not in ('0', 'false', 'no', 'off')
+    
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        fh = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                 encoding='utf-8', delay=True)
+        fh.setLevel(level)
+        fh.setFormatter(formatter)
+        handlers.append(fh)
     
     # コンソールハンドラーも追加（INFO以上）
     ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
+    ch.setLevel(console_level)
     ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    handlers.append(ch)
+    
+    _queue_handler = _DeferredQueueHandler(queue.Queue(maxsize=queue_size))
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(_queue_handler)
+    # ルートロガー（Scrapyのログ出力）へも伝播する（従来どおり）。伝播先のハンドラーは
+    # 呼び出し側のスレッドで整形・出力するため、TMDB_LOG_PROPAGATE=false で止められる
+    logger.propagate = propagate
+    # 出力先のない詳細ログは呼び出し側で組み立てないよう、ロガーのレベルを合わせる
+    logger.setLevel(min(level if log_file else console_level, console_level))
+
+
+def shutdown_logging():
+    """Stop the listener thread after writing out queued records"""
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        logger.removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def dropped_log_records() -> int:
+    """Number of records discarded because the log queue was full"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def ensure_logging():
+    """Configure logging with the defaults unless configure_logging() was already called
+
+    Importing the module does not start the listener thread or touch the log
+    file; the first TMDbClient does, so runs that never call TMDb skip both.
+    """
+    if not _logging_configured:
+        configure_logging()
+
+
+def _sample_body() -> bool:
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < _body_sample_rate
+
+
+class SharedRateLimiter:
+    """Rate limiter shared between processes (one TMDb budget per host)"""
+    
+    def __init__(self, request_delay: float = 0.1, context=None):
+        import multiprocessing
+        ctx = context or multiprocessing.get_context()
+        self.request_delay = request_delay
+        self._lock = ctx.Lock()
+        self._next_slot = ctx.Value('d', 0.0, lock=False)
+    
+    def wait(self):
+        """Reserve the next request slot and sleep until it arrives"""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.request_delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# プロセス内の全クライアントで共有するレートリミッター（multicrawlの子プロセスで設定）
+_shared_rate_limiter: Optional[SharedRateLimiter] = None
+
+
+def install_shared_rate_limiter(limiter: Optional[SharedRateLimiter]):
+    """Use the given limiter for every TMDbClient in this process"""
+    global _shared_rate_limiter
+    _shared_rate_limiter = limiter
 
 
 class TMDbClient:
@@ -38,22 +193,72 @@ class TMDbClient:
     
     BASE_URL = "https://api.themoviedb.org/3"
     IMAGE_BASE_URL = "https://image.tmdb.org/t/p/"
+    # 429 (Too Many Requests) を受けたときの再試行回数
+    MAX_RETRIES = 3
     
-    def __init__(self, access_token: Optional[str] = None):
-        """Initialize TMDb client with Bearer token"""
+    def __init__(self, access_token: Optional[str] = None, cache_ttl: float = 6 * 60 * 60,
+                 base_url: Optional[str] = None, cassette: Optional[Cassette] = None,
+                 cache_size: Optional[int] = None):
+        """Initialize TMDb client with Bearer token
+
+        cache_size caps the entries kept in each cache (oldest first out);
+        None keeps every entry until it expires.
+        """
+        # requestsの読み込み（数十ms）はクライアントを作るまで行わない
+        import requests
+        ensure_logging()
         self.access_token = access_token or os.getenv('TMDB_ACCESS_TOKEN')
         if not self.access_token:
             raise ValueError("TMDB_ACCESS_TOKEN environment variable is not set")
         
+        # ベンチマークのモックサーバーなど、接続先を環境変数で差し替えられる
+        self.base_url = (base_url or os.getenv('TMDB_API_BASE_URL') or self.BASE_URL).rstrip('/')
+        
         self.headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json;charset=utf-8"
         }
         self.last_request_time = 0
         self.request_delay = 0.1  # 100ms delay between requests
+        
+        # Keep-Alive接続を使い回すセッション
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        
+        # 検索結果キャッシュ {(照合用キー, year): (取得時刻, 結果)}
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._search_cache: Dict[tuple, tuple] = {}
+        # 詳細情報キャッシュ {(movie_id, append_to_response): (取得時刻, 結果)}
+        self._details_cache: Dict[tuple, tuple] = {}
+        # 直近のリクエストで発生したエラー（エラー時の結果はキャッシュしない）
+        self.last_error: Optional[Exception] = None
+        
+        # メトリクス用のカウンタ
+        self.request_count = 0
+        self.retry_count = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # 記録・再生用のカセット（未指定時は環境変数 TMDB_CASSETTE から）
+        self.cassette = cassette if cassette is not None else Cassette.from_env()
+        if self.cassette is not None:
+            logger.info("TMDb cassette: %s (%s)", self.cassette.path, self.cassette.mode)
+    
+    def _cache_put(self, cache: Dict[tuple, tuple], key: tuple, value):
+        """Store a result, dropping the oldest entries beyond cache_size"""
+        cache.pop(key, None)
+        cache[key] = (time.time(), value)
+        if self.cache_size is not None:
+            while len(cache) > self.cache_size:
+                del cache[next(iter(cache))]
     
     def _rate_limit(self):
         """Implement rate limiting (10 requests per second)"""
+        if _shared_rate_limiter is not None:
+            _shared_rate_limiter.wait()
+            return
+        
         current_time = time.time()
         time_since_last_request = current_time - self.last_request_time
         if time_since_last_request < self.request_delay:
@@ -62,44 +267,103 @@ class TMDbClient:
     
     def _make_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Make API request with error handling"""
+        import requests
+        if self.cassette is not None and self.cassette.replaying:
+            return self._replay_request(endpoint, params)
+        
         self._rate_limit()
         
-        url = f"{self.BASE_URL}{endpoint}"
+        url = f"{self.base_url}{endpoint}"
+        self.last_error = None
+        self.request_count += 1
         
-        # リクエスト情報をログ出力
-        logger.debug(f"=== TMDb API Request ===")
-        logger.debug(f"URL: {url}")
-        logger.debug(f"Params: {json.dumps(params, ensure_ascii=False, indent=2)}")
-        logger.debug(f"Headers: {json.dumps({k: v if k != 'Authorization' else 'Bearer ***' for k, v in self.headers.items()}, indent=2)}")
+        # リクエスト情報をログ出力（DEBUG有効時のみ組み立てる）
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("=== TMDb API Request ===")
+            logger.debug("URL: %s", url)
+            logger.debug("Params: %s", _LazyJSON(params))
+            logger.debug("Headers: %s", _LazyJSON(
+                {k: v if k != 'Authorization' else 'Bearer ***' for k, v in self.headers.items()}
+            ))
         
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            response = self.session.get(url, params=params, timeout=10)
+            for attempt in range(self.MAX_RETRIES):
+                if response.status_code != 429:
+                    break
+                wait = self._retry_after(response, attempt)
+                logger.warning("Rate limited by TMDb (429), retrying in %.2fs", wait)
+                self.retry_count += 1
+                time.sleep(wait)
+                self._rate_limit()
+                response = self.session.get(url, params=params, timeout=10)
             
             # レスポンス情報をログ出力
-            logger.debug(f"=== TMDb API Response ===")
-            logger.debug(f"Status Code: {response.status_code}")
-            logger.debug(f"Response Headers: {dict(response.headers)}")
+            if debug:
+                logger.debug("=== TMDb API Response ===")
+                logger.debug("Status Code: %s", response.status_code)
+                logger.debug("Response Headers: %s", response.headers)
             
             response.raise_for_status()
             response_data = response.json()
+            if self.cassette is not None:
+                self.cassette.record(endpoint, params, response.status_code, response_data)
             
-            # レスポンスボディをログ出力（大きい場合は一部のみ）
-            response_str = json.dumps(response_data, ensure_ascii=False, indent=2)
-            if len(response_str) > 2000:
-                logger.debug(f"Response Body (truncated): {response_str[:2000]}...")
-            else:
-                logger.debug(f"Response Body: {response_str}")
+            # レスポンスボディは一部のリクエストのみログ出力（大きい場合は先頭のみ）
+            if _sample_body():
+                logger.debug("Response Body: %s", _LazyJSON(response_data, BODY_LOG_LIMIT))
             
             return response_data
             
         except requests.exceptions.RequestException as e:
-            logger.error(f"=== TMDb API Error ===")
-            logger.error(f"Error Type: {type(e).__name__}")
-            logger.error(f"Error Message: {e}")
+            self.last_error = e
+            logger.error("=== TMDb API Error ===")
+            logger.error("Error Type: %s", type(e).__name__)
+            logger.error("Error Message: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response Status: {e.response.status_code}")
-                logger.error(f"Response Body: {e.response.text}")
+                if self.cassette is not None and e.response.status_code == 404:
+                    self.cassette.record(endpoint, params, 404, None)
+                logger.error("Response Status: %s", e.response.status_code)
+                logger.error("Response Body: %s", e.response.text[:BODY_LOG_LIMIT])
+            return None
+    
+    def _replay_request(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Answer a request from the cassette instead of the network"""
+        self.last_error = None
+        self.request_count += 1
+        entry = self.cassette.get(endpoint, params)
+        if entry is None:
+            key = cassette_key(endpoint, params)
+            self.last_error = CassetteMiss(key)
+            logger.warning("Request not in cassette: %s", key)
+            return None
+        
+        status, body = entry
+        if status >= 400:
+            import requests
+            self.last_error = requests.exceptions.HTTPError(f"{status} Error (replayed from cassette)")
             return None
+        return body
+    
+    def save_cassette(self):
+        """Write recorded traffic to the cassette, or log requests the replayed cassette lacked"""
+        if self.cassette is None:
+            return
+        if self.cassette.replaying:
+            if self.cassette.missing:
+                logger.warning(self.cassette.missing_report())
+        else:
+            self.cassette.save()
+            logger.info("TMDb cassette saved: %s (%d entries)", self.cassette.path, len(self.cassette.entries))
+    
+    def _retry_after(self, response, attempt: int) -> float:
+        """Seconds to wait before retrying a 429 response"""
+        backoff = self.request_delay * (2 ** attempt)
+        try:
+            return max(float(response.headers.get('Retry-After', 0)), backoff)
+        except ValueError:
+            return backoff
     
     def search_movie(self, title: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
@@ -112,7 +376,23 @@ class TMDbClient:
         Returns:
             First matching movie data or None if not found
         """
-        logger.info(f"=== Searching movie: '{title}' (year: {year or 'any'}) ===")
+        # 表記揺れ（全角半角・括弧・上映形態の表記）が違うだけの検索は同じキーにする
+        cache_key = (title_key(title), year)
+        cached = self._search_cache.get(cache_key)
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            logger.debug("Cache hit: '%s' (year: %s)", title, year or 'any')
+            self.cache_hits += 1
+            return cached[1]
+        
+        self.cache_misses += 1
+        movie = self._search_movie(title, year)
+        if self.last_error is None:
+            self._cache_put(self._search_cache, cache_key, movie)
+        return movie
+    
+    def _search_movie(self, title: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Search TMDb without consulting the cache"""
+        logger.info("=== Searching movie: '%s' (year: %s) ===", title, year or 'any')
         
         params = {
             "query": title,
@@ -129,45 +409,63 @@ class TMDbClient:
             total_results = result.get("total_results", 0)
             results = result.get("results", [])
             
-            logger.info(f"Search results: {total_results} movies found")
+            logger.info("Search results: %s movies found", total_results)
             
             if results:
                 # 最初の5件の結果をログ出力
-                logger.debug("Top search results:")
-                for i, movie in enumerate(results[:5]):
-                    logger.debug(
-                        f"  {i+1}. '{movie.get('title')}' "
-                        f"(original: '{movie.get('original_title')}', "
-                        f"year: {movie.get('release_date', '').split('-')[0] if movie.get('release_date') else 'N/A'}, "
-                        f"ID: {movie.get('id')}, "
-                        f"poster: {movie.get('poster_path', 'None')})"
-                    )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Top search results:")
+                    for i, movie in enumerate(results[:5]):
+                        logger.debug(
+                            "  %d. '%s' (original: '%s', year: %s, ID: %s, poster: %s)",
+                            i + 1, movie.get('title'), movie.get('original_title'),
+                            movie.get('release_date', '').split('-')[0] if movie.get('release_date') else 'N/A',
+                            movie.get('id'), movie.get('poster_path', 'None'),
+                        )
                 
                 # Return the first match
                 movie = results[0]
                 logger.info(
-                    f"Selected movie: '{movie.get('title')}' "
-                    f"(ID: {movie.get('id')}, poster: {movie.get('poster_path', 'None')})"
+                    "Selected movie: '%s' (ID: %s, poster: %s)",
+                    movie.get('title'), movie.get('id'), movie.get('poster_path', 'None'),
                 )
                 return movie
             else:
-                logger.warning(f"No results in response for '{title}'")
+                logger.warning("No results in response for '%s'", title)
         else:
-            logger.warning(f"No response from TMDb API for '{title}'")
+            logger.warning("No response from TMDb API for '%s'", title)
         
         return None
     
-    def get_movie_details(self, movie_id: int) -> Optional[Dict[str, Any]]:
+    def get_movie_details(self, movie_id: int, append_to_response: Sequence[str] = ()) -> Optional[Dict[str, Any]]:
         """
         Get detailed movie information
         
         Args:
             movie_id: TMDb movie ID
+            append_to_response: Sub-resources to fetch in the same request
+                (e.g. ("credits", "images"))
             
         Returns:
             Movie details or None if not found
         """
-        return self._make_request(f"/movie/{movie_id}", {"language": "ja-JP"})
+        append = ','.join(append_to_response)
+        cache_key = (movie_id, append)
+        cached = self._details_cache.get(cache_key)
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            self.cache_hits += 1
+            return cached[1]
+        
+        params = {"language": "ja-JP"}
+        if append:
+            params["append_to_response"] = append
+            if 'images' in append_to_response:
+                # 画像は日本語・英語・言語なしのものを対象にする
+                params["include_image_language"] = "ja,en,null"
+        details = self._make_request(f"/movie/{movie_id}", params)
+        if self.last_error is None:
+            self._cache_put(self._details_cache, cache_key, details)
+        return details
     
     @staticmethod
     def get_poster_url(poster_path: str, size: str = "w300") -> str: